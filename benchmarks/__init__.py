@@ -0,0 +1,3 @@
+"""
+Benchmark suite for django_baseline, see README.md in this directory.
+"""
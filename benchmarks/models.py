@@ -0,0 +1,87 @@
+from __future__ import unicode_literals
+
+import uuid
+
+from django.conf import settings
+from django.db import models
+
+from django_baseline.models import ContentTypeInheritanceBase
+
+
+class Category(models.Model):
+    name = models.CharField(max_length=100)
+
+    def __str__(self):
+        return self.name
+
+
+class Product(models.Model):
+    name = models.CharField(max_length=100)
+    category = models.ForeignKey(Category)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    quantity = models.IntegerField()
+
+    def __str__(self):
+        return self.name
+
+
+class Tag(models.Model):
+    name = models.CharField(max_length=100)
+
+    def __str__(self):
+        return self.name
+
+
+class Order(models.Model):
+    name = models.CharField(max_length=100)
+    # Edited with a model formset.
+    tags = models.ManyToManyField(Tag, blank=True)
+    # Edited with an inline formset of the through model.
+    products = models.ManyToManyField(Product, through='OrderLine', blank=True)
+
+    def __str__(self):
+        return self.name
+
+
+class OrderLine(models.Model):
+    order = models.ForeignKey(Order)
+    product = models.ForeignKey(Product)
+    quantity = models.IntegerField()
+
+
+class Animal(ContentTypeInheritanceBase):
+    name = models.CharField(max_length=100)
+
+
+class Dog(Animal):
+    barks = models.BooleanField(default=True)
+
+
+class Cat(Animal):
+    lives = models.IntegerField(default=9)
+
+
+class VisibleManager(models.Manager):
+    def get_queryset(self):
+        return super(VisibleManager, self).get_queryset().filter(visible=True)
+
+
+class Bird(Animal):
+    visible = models.BooleanField(default=True)
+
+    # Hides rows, for get_child() and get_children().
+    objects = VisibleManager()
+
+
+class Note(models.Model):
+    # Owner, for AssertUserIsOwnerMixin.
+    user = models.ForeignKey(settings.AUTH_USER_MODEL)
+    text = models.CharField(max_length=100)
+
+
+# Django >= 1.8
+if hasattr(models, 'UUIDField'):
+    class Document(models.Model):
+        # Non-integer primary key, for the keyset pagination cursors.
+        id = models.UUIDField(primary_key=True, default=uuid.uuid4)
+        title = models.CharField(max_length=100)
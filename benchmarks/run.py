@@ -0,0 +1,498 @@
+"""
+Run the django_baseline benchmark suite.
+
+    python -m benchmarks.run                 # run and compare to baseline.json
+    python -m benchmarks.run --save          # store the results as new baseline
+    python -m benchmarks.run --check         # exit with 1 on regressions
+    python -m benchmarks.run list_view_1k    # run selected benchmarks only
+
+Every benchmark reports the best time of --repeat runs, the number of SQL
+queries and the peak memory allocated during one run (Python 3 only).
+A failing benchmark is reported as FAILED and the others still run.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import traceback
+from decimal import Decimal
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2
+    tracemalloc = None
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+import django
+if hasattr(django, 'setup'):
+    django.setup()
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+from django.db import transaction
+from django.template import Context, Template
+from django.test.client import RequestFactory
+
+from django_baseline import views
+from django_baseline.querycount import QueryRecorder
+
+from benchmarks.models import Category, Product, Tag, Order, OrderLine, Animal, Dog, Cat
+
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# A benchmark regresses if it is this much slower than the baseline.
+DEFAULT_TOLERANCE = 0.25
+
+BENCHMARKS = []
+
+factory = RequestFactory()
+
+
+def benchmark(name, django_version=None):
+    """
+    Register a benchmark. It is skipped on Django versions older than
+    django_version.
+    """
+
+    def decorator(func):
+        if django_version is None or django.VERSION[:2] >= django_version:
+            BENCHMARKS.append((name, func))
+        return func
+    return decorator
+
+
+############
+# Fixtures #
+############
+
+
+def create_tables():
+    if django.VERSION < (1, 7):
+        call_command('syncdb', interactive=False, verbosity=0)
+    else:
+        call_command('migrate', run_syncdb=True, interactive=False, verbosity=0)
+
+
+def create_fixtures():
+    categories = Category.objects.bulk_create(
+        [Category(name='Category {0}'.format(i)) for i in range(20)])
+    categories = list(Category.objects.all())
+
+    Product.objects.bulk_create([
+        Product(name='Product {0}'.format(i), category=categories[i % len(categories)],
+                price=Decimal(i % 100) + Decimal('0.99'), quantity=i % 7)
+        for i in range(10000)])
+
+    Tag.objects.bulk_create([Tag(name='Tag {0}'.format(i)) for i in range(50)])
+
+    order = Order.objects.create(name='Order')
+    order.tags.add(*Tag.objects.all()[:20])
+    products = list(Product.objects.all()[:50])
+    OrderLine.objects.bulk_create([OrderLine(order=order, product=product, quantity=1)
+                                   for product in products])
+
+    # save() sets the content type, so no bulk_create.
+    for i in range(600):
+        cls = (Animal, Dog, Cat)[i % 3]
+        cls(name='Animal {0}'.format(i)).save()
+
+
+###########
+# Helpers #
+###########
+
+
+def request(method, path, data=None):
+    req = getattr(factory, method)(path, data or {})
+    req.user = AnonymousUser()
+    return req
+
+
+def render(response):
+    if hasattr(response, 'render') and not response.is_rendered:
+        response.render()
+    return response
+
+
+def formset_post_data(formset, new_rows):
+    """
+    POST data for a formset: the existing forms unchanged, plus new_rows.
+    """
+
+    initial = formset.initial_form_count()
+    data = {
+        formset.prefix + '-TOTAL_FORMS': initial + len(new_rows),
+        formset.prefix + '-INITIAL_FORMS': initial,
+        formset.prefix + '-MAX_NUM_FORMS': 1000,
+    }
+
+    for form in formset.forms[:initial]:
+        for name, field in form.fields.items():
+            value = form.initial.get(name, field.initial)
+            if value is not None:
+                data[form.add_prefix(name)] = getattr(value, 'pk', value)
+
+    for index, row in enumerate(new_rows, initial):
+        for name, value in row.items():
+            data['{0}-{1}-{2}'.format(formset.prefix, index, name)] = value
+
+    return data
+
+
+def order_post_data(view, path, kwargs, rows):
+    response = view(request('get', path), **kwargs)
+    context = response.context_data
+
+    data = {'name': 'Benchmark order'}
+    products = list(Product.objects.values_list('pk', flat=True)[:rows])
+    for name, formset in context['fieldsets']:
+        if name == 'tags':
+            new_rows = [{'name': 'New tag {0}'.format(i)} for i in range(rows)]
+        else:
+            new_rows = [{'product': pk, 'quantity': 2} for pk in products]
+        data.update(formset_post_data(formset, new_rows))
+    return data
+
+
+def rolled_back(func):
+    """
+    Run func in a transaction which is rolled back, so POST benchmarks do
+    not change the fixtures.
+    """
+
+    def wrapper():
+        with transaction.atomic():
+            sid = transaction.savepoint()
+            try:
+                func()
+            finally:
+                transaction.savepoint_rollback(sid)
+    return wrapper
+
+
+##############
+# Benchmarks #
+##############
+
+
+def list_view(rows):
+    queryset = Product.objects.order_by('pk')[:rows]
+    view = views.ListView.as_view(
+        model=Product, queryset=queryset, template_name='generics/list_table.html',
+        extra_context={'editable': True, 'update_uri': 'product_update',
+                       'delete_uri': 'product_delete'})
+
+    def run():
+        render(view(request('get', '/products/')))
+    return run
+
+
+@benchmark('list_view_1k')
+def bench_list_view_1k():
+    return list_view(1000)
+
+
+@benchmark('list_view_10k')
+def bench_list_view_10k():
+    return list_view(10000)
+
+
+@benchmark('list_view_keyset_page')
+def bench_list_view_keyset_page():
+    view = views.ListView.as_view(
+        model=Product, keyset_paginate_by=100, keyset_count='estimate',
+        template_name='generics/list_table.html')
+
+    def run():
+        render(view(request('get', '/products/')))
+    return run
+
+
+# Expressions in annotate() need Django 1.8.
+@benchmark('list_view_totals_10k', django_version=(1, 8))
+def bench_list_view_totals():
+    from django.db.models import F, Sum
+
+    view = views.ListView.as_view(
+        model=Product, keyset_paginate_by=100,
+        template_name='generics/list_table.html',
+        computed_columns={'total': F('price') * F('quantity')},
+        column_totals={'quantity': 'sum', 'total': Sum('total')},
+        table_columns=['name', 'price', 'quantity', 'total'])
+
+    def run():
+        render(view(request('get', '/products/')))
+    return run
+
+
+ORDER_CREATE_PATH = '/orders/add/'
+ORDER_SUCCESS_URL = '/orders/'
+INLINE_ROWS = 50
+
+
+def order_create_view():
+    from benchmarks.urls import ORDER_FORMSET_ARGS
+    return views.FormSetCreateView.as_view(model=Order, extra=INLINE_ROWS,
+                                           factory_extra_args=ORDER_FORMSET_ARGS,
+                                           success_url=ORDER_SUCCESS_URL)
+
+
+def order_update_view():
+    from benchmarks.urls import ORDER_FORMSET_ARGS
+    return views.FormSetUpdateView.as_view(model=Order,
+                                           factory_extra_args=ORDER_FORMSET_ARGS,
+                                           success_url=ORDER_SUCCESS_URL)
+
+
+@benchmark('formset_create_get')
+def bench_formset_create_get():
+    view = order_create_view()
+
+    def run():
+        render(view(request('get', ORDER_CREATE_PATH)))
+    return run
+
+
+@benchmark('formset_create_post')
+def bench_formset_create_post():
+    view = order_create_view()
+    data = order_post_data(view, ORDER_CREATE_PATH, {}, INLINE_ROWS)
+
+    def run():
+        response = render(view(request('post', ORDER_CREATE_PATH, data)))
+        assert response.status_code == 302, 'Invalid POST data'
+    return rolled_back(run)
+
+
+@benchmark('formset_update_get')
+def bench_formset_update_get():
+    view = order_update_view()
+    order = Order.objects.get()
+
+    def run():
+        render(view(request('get', '/orders/{0}/'.format(order.pk)), pk=order.pk))
+    return run
+
+
+@benchmark('formset_update_post')
+def bench_formset_update_post():
+    view = order_update_view()
+    order = Order.objects.get()
+    path = '/orders/{0}/'.format(order.pk)
+    data = order_post_data(view, path, {'pk': order.pk}, INLINE_ROWS)
+
+    def run():
+        response = render(view(request('post', path, data), pk=order.pk))
+        assert response.status_code == 302, 'Invalid POST data'
+    return rolled_back(run)
+
+
+@benchmark('get_child_mixed_600')
+def bench_get_child():
+    def run():
+        [animal.get_child() for animal in Animal.objects.all()]
+    return run
+
+
+@benchmark('as_children_mixed_600')
+def bench_as_children():
+    def run():
+        list(Animal.objects.as_children())
+    return run
+
+
+@benchmark('tag_table_10k')
+def bench_tag_table():
+    template = Template('{% load helpers %}{% table rows %}')
+    rows = [(i, 'Name {0}'.format(i), i * 1.5) for i in range(10000)]
+
+    def run():
+        template.render(Context({'rows': rows}))
+    return run
+
+
+@benchmark('tag_link_1k')
+def bench_tag_link():
+    template = Template('{% load helpers %}{% for pk in pks %}'
+                        '{% link "product_update" "Edit" url_pk=pk %}{% endfor %}')
+    pks = list(range(1, 1001))
+
+    def run():
+        template.render(Context({'pks': pks}))
+    return run
+
+
+@benchmark('filters_arithmetic_10k')
+def bench_filters():
+    template = Template('{% load helpers %}{% for v in values %}'
+                        '{{ v|sub:1 }}{{ v|mul:"2" }}{{ v|div:3 }}{{ v|mod:4 }}{% endfor %}')
+    values = [Decimal(i) for i in range(1, 10001)]
+
+    def run():
+        template.render(Context({'values': values}))
+    return run
+
+
+def measure_import_time(module):
+    code = ('import time; start = time.time(); import {0}; '
+            'print(time.time() - start)').format(module)
+    output = subprocess.check_output([sys.executable, '-c', code])
+    return float(output.decode('ascii').strip())
+
+
+#############
+# Reporting #
+#############
+
+
+def measure(func, repeat):
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+
+    # Queries and memory are measured in a separate run, so their overhead
+    # does not count as time.
+    recorder = QueryRecorder()
+    if tracemalloc is not None:
+        tracemalloc.start()
+    recorder.start()
+    try:
+        func()
+    finally:
+        recorder.stop()
+        peak = None
+        if tracemalloc is not None:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    return {'time': min(times), 'queries': len(recorder.queries), 'peak_memory': peak}
+
+
+def compare(name, result, baseline, tolerance):
+    """
+    Return a list of regression messages.
+    """
+
+    old = baseline.get(name)
+    if not old:
+        return []
+
+    messages = []
+    if result['time'] > old['time'] * (1 + tolerance):
+        messages.append('time {0:.4f}s -> {1:.4f}s'.format(old['time'], result['time']))
+    if old.get('queries') is not None and result['queries'] > old['queries']:
+        messages.append('queries {0} -> {1}'.format(old['queries'], result['queries']))
+    return messages
+
+
+def get_environment():
+    return {
+        'django': django.get_version(),
+        'python': platform.python_version(),
+    }
+
+
+def format_memory(value):
+    if value is None:
+        return '-'
+    return '{0:.1f} KiB'.format(value / 1024.0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='django_baseline benchmarks')
+    parser.add_argument('names', nargs='*', help='benchmarks to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--save', action='store_true', help='store results as baseline')
+    parser.add_argument('--check', action='store_true', help='exit with 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    environment = get_environment()
+    baseline_environment = baseline.pop('environment', None)
+    if baseline_environment and baseline_environment != environment:
+        print('Warning: the baseline was recorded with Django {django} on Python {python}, '
+              'times are not comparable.'.format(**baseline_environment))
+
+    create_tables()
+    create_fixtures()
+
+    results = {}
+    regressions = []
+    failures = []
+
+    print('{0:<26} {1:>10} {2:>8} {3:>14}'.format('benchmark', 'time', 'queries', 'peak memory'))
+
+    for name, setup in BENCHMARKS:
+        if args.names and name not in args.names:
+            continue
+
+        try:
+            result = measure(setup(), args.repeat)
+        except Exception as e:
+            failures.append(name)
+            print('{0:<26} FAILED: {1!r}'.format(name, e))
+            traceback.print_exc()
+            continue
+
+        results[name] = result
+        messages = compare(name, result, baseline, args.tolerance)
+        regressions += [(name, message) for message in messages]
+
+        print('{0:<26} {1:>9.4f}s {2:>8} {3:>14}{4}'.format(
+            name, result['time'], result['queries'], format_memory(result['peak_memory']),
+            '  REGRESSION' if messages else ''))
+
+    for module in ('django_baseline', 'django_baseline.views'):
+        name = 'import_' + module
+        if args.names and name not in args.names:
+            continue
+
+        import_time = min(measure_import_time(module) for i in range(args.repeat))
+        result = results[name] = {'time': import_time, 'queries': None, 'peak_memory': None}
+        messages = compare(name, result, baseline, args.tolerance)
+        regressions += [(name, message) for message in messages]
+        print('{0:<26} {1:>9.4f}s {2:>8} {3:>14}{4}'.format(
+            name, import_time, '-', '-', '  REGRESSION' if messages else ''))
+
+    if regressions:
+        print('\nRegressions against {0}:'.format(args.baseline))
+        for name, message in regressions:
+            print('  {0}: {1}'.format(name, message))
+
+    if failures:
+        print('\nFailed: {0}'.format(', '.join(failures)))
+
+    if args.save:
+        if baseline_environment != environment:
+            # Results of another environment can not be compared.
+            baseline = {}
+        baseline.update(results)
+        baseline['environment'] = environment
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print('\nBaseline saved to {0}'.format(args.baseline))
+
+    if args.check and (regressions or failures):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+"""
+Settings for the benchmark suite: in-memory SQLite and no middleware.
+"""
+
+import os
+
+import django
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SECRET_KEY = 'benchmarks'
+DEBUG = False
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.messages',
+    'crispy_forms',
+    'django_baseline',
+    'benchmarks',
+]
+
+# django_baseline ships South migrations, which Django >= 1.7 can not load.
+# Django < 1.9 does not accept None, a missing module marks the app as
+# unmigrated there.
+if django.VERSION >= (1, 9):
+    MIGRATION_MODULES = {'django_baseline': None}
+else:
+    MIGRATION_MODULES = {'django_baseline': 'django_baseline.no_migrations'}
+
+ROOT_URLCONF = 'benchmarks.urls'
+
+TEMPLATE_DIRS = [os.path.join(BASE_DIR, 'templates')]
+TEMPLATES = [{
+    'BACKEND': 'django.template.backends.django.DjangoTemplates',
+    'DIRS': TEMPLATE_DIRS,
+    'APP_DIRS': True,
+}]
+
+STATIC_URL = '/static/'
+
+# Needed by django-crispy-forms < 1.5.
+CRISPY_TEMPLATE_PACK = 'bootstrap'
+
+MIDDLEWARE_CLASSES = []
+MIDDLEWARE = []
+
+# Measure the code, not the instrumentation.
+BASELINE_QUERY_INSTRUMENTATION = False
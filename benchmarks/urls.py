@@ -0,0 +1,28 @@
+from __future__ import unicode_literals
+
+from django import forms
+from django.conf.urls import url
+
+from django_baseline import views
+
+from .models import Order, Product
+
+
+# Explicit formset fields, required by newer Django versions. The product
+# is entered by id, like raw_id_fields in the admin: rendering a select
+# with all 10000 products in every row would dominate the benchmarks.
+ORDER_FORMSET_ARGS = {
+    'tags': {'fields': ['name']},
+    'products': {'fields': ['product', 'quantity'],
+                 'widgets': {'product': forms.TextInput}},
+}
+
+urlpatterns = [
+    url(r'^products/$', views.ListView.as_view(model=Product), name='product_list'),
+    url(r'^products/(?P<pk>\d+)/$', views.UpdateView.as_view(model=Product), name='product_update'),
+    url(r'^products/(?P<pk>\d+)/delete/$', views.DeleteView.as_view(model=Product), name='product_delete'),
+    url(r'^orders/add/$', views.FormSetCreateView.as_view(
+        model=Order, factory_extra_args=ORDER_FORMSET_ARGS), name='order_create'),
+    url(r'^orders/(?P<pk>\d+)/$', views.FormSetUpdateView.as_view(
+        model=Order, factory_extra_args=ORDER_FORMSET_ARGS), name='order_update'),
+]
@@ -4,15 +4,20 @@ from __future__ import unicode_literals
 
 __version__ = "0.2.2"
 
+# Django >= 1.7, see apps.py.
+default_app_config = 'django_baseline.apps.BaselineConfig'
 
-from django.utils.functional import lazy
-from django.core.urlresolvers import reverse, reverse_lazy
-from django.contrib.auth.models import Group
-from django.conf import settings
-from django.middleware import csrf
+# Django modules are imported inside the helpers, so importing the package
+# (eg. for html or models) stays cheap.
+
+
+# Fully qualified class path -> class, see resolve_class().
+_class_registry = {}
 
 
 def get_or_create_csrf_token(request):
+    from django.middleware import csrf
+
     token = request.META.get('CSRF_COOKIE', None)
     if token is None:
         token = csrf._get_new_csrf_key()
@@ -30,34 +35,94 @@ def get_config(key, default=None):
 
     ADMIN_EMAIL = get_config('ADMIN_EMAIL', 'default@email.com')
     """
+    from django.conf import settings
     return getattr(settings, key, default)
 
 
 def get_group(name):
     """
     Get a django.contrib.auth group model object by group name.
+    Cached, see groups.py.
     """
-    return Group.objects.filter(name=name).first()
+    from .groups import get_group
+    return get_group(name)
 
 
 def user_has_group(user, group, superuser_skip=True):
     """
     Check if a user is in a certaing group.
     By default, the check is skipped for superusers.
+    Membership is cached, see groups.py.
     """
+    from .groups import user_has_group
+    return user_has_group(user, group, superuser_skip)
+
 
-    if user.is_superuser and superuser_skip:
-        return True
+def _deprecated_name(name, module):
+    import warnings
+    warnings.warn('django_baseline.{0} is deprecated and will be removed in 0.4, '
+                  'use {1}.{0}.'.format(name, module), DeprecationWarning, stacklevel=3)
 
-    return user.groups.filter(name=group).exists()
+
+def lazy(func, *resultclasses):
+    """
+    Deprecated alias of django.utils.functional.lazy.
+    """
+    _deprecated_name('lazy', 'django.utils.functional')
+    from django.utils.functional import lazy
+    return lazy(func, *resultclasses)
+
+
+def reverse(*args, **kwargs):
+    """
+    Deprecated alias of django.core.urlresolvers.reverse.
+    """
+    _deprecated_name('reverse', 'django.core.urlresolvers')
+    from django.core.urlresolvers import reverse
+    return reverse(*args, **kwargs)
+
+
+def reverse_lazy(*args, **kwargs):
+    """
+    Deprecated alias of django.core.urlresolvers.reverse_lazy.
+    """
+    _deprecated_name('reverse_lazy', 'django.core.urlresolvers')
+    from django.core.urlresolvers import reverse_lazy
+    return reverse_lazy(*args, **kwargs)
 
 
 def resolve_class(class_path):
     """
     Load a class by a fully qualified class_path,
     eg. myapp.models.ModelName
+
+    Resolved classes are memoized.
     """
 
+    try:
+        return _class_registry[class_path]
+    except KeyError:
+        pass
+
     modulepath, classname = class_path.rsplit('.', 1)
     module = __import__(modulepath, fromlist=[classname])
-    return getattr(module, classname)
+    cls = _class_registry[class_path] = getattr(module, classname)
+    return cls
+
+
+def warm_class_registry(class_paths=None):
+    """
+    Resolve a list of class paths ahead of time, eg. in a long running
+    worker before it handles requests.
+    Defaults to the BASELINE_PRELOAD_CLASSES setting.
+    """
+
+    if class_paths is None:
+        class_paths = get_config('BASELINE_PRELOAD_CLASSES', [])
+
+    for class_path in class_paths:
+        resolve_class(class_path)
+
+
+def clear_class_registry():
+    _class_registry.clear()
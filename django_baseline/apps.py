@@ -0,0 +1,17 @@
+"""
+App config of django_baseline (Django >= 1.7).
+"""
+
+from __future__ import unicode_literals
+
+from django.apps import AppConfig
+
+
+class BaselineConfig(AppConfig):
+    name = 'django_baseline'
+    verbose_name = 'Baseline'
+
+    def ready(self):
+        # The user model is known once all models are loaded.
+        from . import groups
+        groups.connect_signals()
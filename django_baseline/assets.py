@@ -0,0 +1,139 @@
+"""
+Render-scoped collection of script and stylesheet tags.
+
+Inside an {% assets %} ... {% endassets %} block, jsfile and cssfile do not
+output their tags. The files are recorded instead, each one once, and
+emitted where the placeholders are:
+
+    {% load helpers %}
+    {% assets %}
+    <html>
+    <head>
+      {% assets_css %}
+      {% assets_preload %}
+    </head>
+    <body>
+      {% block content %}{% endblock %}
+      {% assets_js %}
+    </body>
+    </html>
+    {% endassets %}
+
+assets_css emits the stylesheets, assets_js the scripts with the defer
+attribute (use {% assets_js "nodefer" %} for inline scripts which need them
+right away), and the optional assets_preload emits <link rel="preload">
+hints for the scripts, so the browser fetches them early.
+
+The collector is bound to the current thread while the block renders, so
+files requested by includes, inclusion tags and render_template() are
+collected too.
+"""
+
+from __future__ import unicode_literals
+
+import threading
+from collections import OrderedDict
+
+from django_baseline import bundles
+
+
+_local = threading.local()
+
+# Replaced with the collected tags after the block is rendered.
+CSS_PLACEHOLDER = '<!--baseline-assets:css-->'
+JS_PLACEHOLDER = '<!--baseline-assets:js-->'
+JS_NODEFER_PLACEHOLDER = '<!--baseline-assets:js-nodefer-->'
+PRELOAD_PLACEHOLDER = '<!--baseline-assets:preload-->'
+
+
+class AssetCollector(object):
+    """
+    Ordered sets of stylesheet and script urls.
+    """
+
+    def __init__(self):
+        self.css = OrderedDict()
+        self.js = OrderedDict()
+
+
+    def add_css(self, url):
+        for src in bundles.static_urls(url):
+            self.css[src] = True
+
+
+    def add_js(self, url):
+        for src in bundles.static_urls(url):
+            self.js[src] = True
+
+
+    def render_css(self):
+        return ''.join('<link href="{0}" rel="stylesheet">'.format(url)
+                       for url in self.css)
+
+
+    def render_js(self, defer=True):
+        attr = ' defer' if defer else ''
+        return ''.join('<script type="text/javascript" src="{0}"{1}></script>'.format(url, attr)
+                       for url in self.js)
+
+
+    def render_preload(self):
+        return ''.join('<link rel="preload" href="{0}" as="script">'.format(url)
+                       for url in self.js)
+
+
+    def replace_placeholders(self, output):
+        return (output
+            .replace(CSS_PLACEHOLDER, self.render_css())
+            .replace(JS_PLACEHOLDER, self.render_js())
+            .replace(JS_NODEFER_PLACEHOLDER, self.render_js(defer=False))
+            .replace(PRELOAD_PLACEHOLDER, self.render_preload()))
+
+
+def get_collector():
+    """
+    Return the collector of the {% assets %} block being rendered, or None.
+    """
+
+    return getattr(_local, 'collector', None)
+
+
+def render_collected(render):
+    """
+    Call render() with a collector bound, and return its output with the
+    placeholders replaced. Nested calls share the outer collector.
+    """
+
+    if get_collector() is not None:
+        return render()
+
+    collector = _local.collector = AssetCollector()
+    try:
+        output = render()
+    finally:
+        _local.collector = None
+    return collector.replace_placeholders(output)
+
+
+def collect_css(kwargs):
+    """
+    collect hook of the cssfile tag, see template.compiled_tag().
+    """
+
+    collector = get_collector()
+    if collector is None:
+        return False
+    collector.add_css(kwargs['url'])
+    return True
+
+
+def collect_js(kwargs):
+    """
+    collect hook of the jsfile tag, see template.compiled_tag().
+    """
+
+    collector = get_collector()
+    if collector is None:
+        return False
+    collector.add_js(kwargs['url'])
+    return True
@@ -0,0 +1,214 @@
+"""
+Content hashed static bundles.
+
+The build_bundles management command concatenates and minifies the files
+of each bundle into BASELINE_BUNDLE_DIR (default: STATIC_ROOT), with the
+content hash in the filename, and writes a manifest mapping the bundle
+names to the files:
+
+    python manage.py collectstatic
+    python manage.py build_bundles
+
+jsfile and cssfile resolve bundle names through the manifest, so
+{% jsfile "baseline.js" %} points to eg. bundles/baseline.3f9a0c1d2e4b.js.
+The filenames change with the content, so the web server can serve
+STATIC_URL/bundles/ with far-future cache headers. Without a manifest,
+eg. in development, bundle names are replaced with the files of the
+bundle, and other names are used unchanged.
+
+BASELINE_BUNDLES maps bundle names to lists of static file paths and
+replaces DEFAULT_BUNDLES. Bundles are minified with rjsmin and rcssmin if
+they are installed, and only concatenated otherwise.
+"""
+
+from __future__ import unicode_literals
+
+import hashlib
+import io
+import json
+import os
+
+from django.conf import settings
+from django.utils.encoding import force_text
+
+from django_baseline import get_config
+
+try:
+    from django.core.signals import setting_changed
+except ImportError:
+    # Django < 1.8
+    from django.test.signals import setting_changed
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+
+DEFAULT_BUNDLES = {
+    'baseline.js': [
+        'baseline/baseline.js',
+        'baseline/js/jquery.serializeobject.js',
+        'baseline/js/django-ajax.js',
+    ],
+    # Separate, it needs window.utils and only pages with countdowns use it.
+    'baseline-countdown.js': [
+        'baseline/js/countdown.js',
+    ],
+    'baseline.css': [
+        'baseline/baseline.css',
+    ],
+}
+
+# Subdirectory of the bundle dir (and STATIC_URL) holding the bundles.
+BUNDLE_PATH = 'bundles'
+MANIFEST_NAME = 'baseline-bundles.json'
+
+# None until loaded, {} if there is no manifest.
+_manifest = None
+
+
+def get_bundles():
+    return get_config('BASELINE_BUNDLES', DEFAULT_BUNDLES)
+
+
+def get_bundle_dir():
+    bundle_dir = get_config('BASELINE_BUNDLE_DIR', None) or settings.STATIC_ROOT
+    if not bundle_dir:
+        raise ValueError('Set STATIC_ROOT or BASELINE_BUNDLE_DIR to build bundles.')
+    return bundle_dir
+
+
+def get_manifest():
+    """
+    Return the bundle name -> static path mapping of the manifest.
+    Loaded once per process.
+    """
+
+    global _manifest
+
+    if _manifest is None:
+        manifest = {}
+        try:
+            path = os.path.join(get_bundle_dir(), MANIFEST_NAME)
+            with io.open(path, encoding='utf-8') as f:
+                manifest = json.load(f)['bundles']
+        except (ValueError, IOError, OSError, KeyError):
+            pass
+        _manifest = manifest
+    return _manifest
+
+
+def clear_manifest_cache():
+    global _manifest
+    _manifest = None
+
+
+def _setting_changed(sender, setting, **kwargs):
+    if setting in ('STATIC_ROOT', 'BASELINE_BUNDLE_DIR'):
+        clear_manifest_cache()
+
+setting_changed.connect(_setting_changed,
+                        dispatch_uid='baseline_clear_manifest_cache')
+
+
+def resolve(name):
+    """
+    Return the static paths of the bundle name: the built bundle, or its
+    files if the bundles are not built. [name] if it is no bundle.
+    """
+
+    manifest = get_manifest()
+    if name in manifest:
+        return [manifest[name]]
+    return list(get_bundles().get(name, [name]))
+
+
+def static_urls(url):
+    """
+    Return the urls of a static file or bundle. Relative paths are resolved
+    with resolve() and prefixed with STATIC_URL.
+    """
+
+    if url.startswith(('http://', 'https://')) or url[:1] == '/':
+        return [url]
+    return [settings.STATIC_URL + path for path in resolve(url)]
+
+
+def minify_css(source):
+    # A regular expression based minifier breaks valid css (eg. strings and
+    # calc()), so without rcssmin the files are only concatenated.
+    return rcssmin.cssmin(source) if rcssmin is not None else source
+
+
+def minify_js(source):
+    return rjsmin.jsmin(source) if rjsmin is not None else source
+
+
+def build_bundle(name, paths, minify=True):
+    """
+    Return the content of the bundle name, made of the static files paths.
+    """
+
+    from django.contrib.staticfiles import finders
+
+    parts = []
+    for path in paths:
+        source_path = finders.find(path)
+        if not source_path:
+            raise ValueError('Static file {0} of bundle {1} not found.'.format(path, name))
+        with io.open(source_path, encoding='utf-8') as f:
+            parts.append(f.read())
+
+    if name.endswith('.css'):
+        content = '\n'.join(parts)
+        return minify_css(content) if minify else content
+
+    # Separate the files, in case one lacks the final semicolon.
+    content = '\n;\n'.join(parts)
+    return minify_js(content) if minify else content
+
+
+def hashed_name(name, content):
+    digest = hashlib.sha256(content.encode('utf-8')).hexdigest()[:12]
+    base, ext = os.path.splitext(name)
+    return '{0}.{1}{2}'.format(base, digest, ext)
+
+
+def build(minify=True):
+    """
+    Build all bundles and write the manifest. Returns the manifest.
+    """
+
+    bundle_dir = get_bundle_dir()
+    target_dir = os.path.join(bundle_dir, BUNDLE_PATH)
+    if not os.path.isdir(target_dir):
+        os.makedirs(target_dir)
+
+    manifest = {}
+    for name, paths in sorted(get_bundles().items()):
+        content = build_bundle(name, paths, minify)
+        filename = hashed_name(name, content)
+        with io.open(os.path.join(target_dir, filename), 'w', encoding='utf-8') as f:
+            f.write(content)
+        manifest[name] = BUNDLE_PATH + '/' + filename
+
+    # Written last and replaced atomically, so readers never see bundles
+    # which are not written yet.
+    path = os.path.join(bundle_dir, MANIFEST_NAME)
+    with io.open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(force_text(json.dumps({'version': 1, 'bundles': manifest},
+                                      indent=2, sort_keys=True)))
+    # os.replace overwrites on all platforms (Python 3).
+    getattr(os, 'replace', os.rename)(path + '.tmp', path)
+
+    clear_manifest_cache()
+    # Tags with literal names stored the old urls.
+    from django_baseline.template import clear_tag_cache
+    clear_tag_cache()
+    return manifest
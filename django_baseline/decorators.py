@@ -4,6 +4,9 @@ from django.contrib.auth import REDIRECT_FIELD_NAME
 from django.core.exceptions import PermissionDenied
 from django.contrib.auth.decorators import login_required
 
+from .groups import user_has_group
+
+
 def group_required(group,
                    login_url=None,
                    redirect_field_name=REDIRECT_FIELD_NAME,
@@ -16,9 +19,8 @@ def group_required(group,
                         login_url=login_url)
         def _wrapped_view(request, *args, **kwargs):
 
-            if not (request.user.is_superuser and skip_superuser):
-                if request.user.groups.filter(name=group).count() == 0:
-                    raise PermissionDenied
+            if not user_has_group(request.user, group, skip_superuser):
+                raise PermissionDenied
 
             return view_func(request, *args, **kwargs)
         return _wrapped_view
@@ -0,0 +1,164 @@
+"""
+Cache for the rendered html of unbound crispy forms.
+
+Unbound forms render to the same markup for every visitor, except for the
+CSRF token. The html is rendered once with a placeholder token, cached,
+and the real token of the request is inserted when it is served.
+
+The cache key covers the form class, prefix, language, template pack, the
+field definitions and their per instance state (required, disabled,
+label suffix, ...) and the initial data. Forms are not cached if they are
+bound, changed or replaced form.helper, have callable initial values or
+ModelChoiceFields (their choices come from the database, set
+cache_model_choices = True on the form class to cache them anyway).
+
+By default the html is cached per process, so deploying changed form
+classes or templates starts with an empty cache. Set BASELINE_FORM_CACHE
+to a cache alias to use Django's cache framework instead, and change
+BASELINE_FORM_CACHE_VERSION to invalidate it.
+"""
+
+from __future__ import unicode_literals
+
+import hashlib
+
+from django import forms
+from django.conf import settings
+from django.template import Context
+from django.utils.encoding import force_text
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+
+from crispy_forms.templatetags.crispy_forms_tags import CrispyFormNode
+
+from .forms import SharedHelperMixin
+
+try:
+    from django.core.signals import setting_changed
+except ImportError:
+    # Django < 1.8
+    from django.test.signals import setting_changed
+
+
+CSRF_PLACEHOLDER = 'BASELINECSRFTOKENPLACEHOLDER'
+
+# Maximum number of forms in the process cache, it is emptied when exceeded.
+MAX_ENTRIES = 1000
+
+_local_cache = {}
+
+
+def clear_form_cache():
+    _local_cache.clear()
+
+
+def _setting_changed(sender, setting, **kwargs):
+    if setting.startswith('TEMPLATE') or setting.startswith('CRISPY_') or \
+            setting.startswith('BASELINE_FORM_CACHE'):
+        clear_form_cache()
+
+setting_changed.connect(_setting_changed,
+                        dispatch_uid='baseline_clear_form_cache')
+
+
+def get_cache():
+    alias = getattr(settings, 'BASELINE_FORM_CACHE', None)
+    if alias is None:
+        return None
+    try:
+        from django.core.cache import caches
+    except ImportError:
+        # Django < 1.7
+        from django.core.cache import get_cache
+        return get_cache(alias)
+    return caches[alias]
+
+
+def get_cache_key(form):
+    """
+    Return the cache key for a form, or None if it can not be cached.
+    """
+
+    if form.is_bound:
+        return None
+
+    # Only the shared per-class helper is fully described by the class.
+    if isinstance(form, SharedHelperMixin):
+        if form.has_own_helper():
+            return None
+    elif getattr(form, 'helper', None) is not None:
+        return None
+
+    cache_model_choices = getattr(form, 'cache_model_choices', False)
+
+    parts = [
+        type(form).__module__, type(form).__name__, form.prefix, form.auto_id,
+        get_language(), getattr(settings, 'CRISPY_TEMPLATE_PACK', 'bootstrap'),
+        getattr(settings, 'BASELINE_FORM_CACHE_VERSION', 1),
+        form.label_suffix, getattr(form, 'error_css_class', None),
+        getattr(form, 'required_css_class', None),
+    ]
+
+    for name, field in form.fields.items():
+        if isinstance(field, forms.ModelChoiceField) and not cache_model_choices:
+            return None
+
+        initial = form.initial.get(name, field.initial)
+        if callable(initial):
+            return None
+
+        parts += [name, type(field).__name__, type(field.widget).__name__,
+                  field.label, field.required, field.help_text,
+                  repr(initial), repr(sorted(field.widget.attrs.items())),
+                  # Markup relevant state, often changed per instance.
+                  # disabled and label_suffix are missing on older Django
+                  # versions.
+                  getattr(field, 'disabled', False), getattr(field, 'label_suffix', None),
+                  field.localize, field.show_hidden_initial, field.widget.is_required]
+        if isinstance(field, forms.ChoiceField) and \
+                not isinstance(field, forms.ModelChoiceField):
+            # Choices may be set per instance.
+            parts.append(repr(list(field.choices)))
+
+    signature = '\x00'.join(force_text(part) for part in parts)
+    return 'baseline:form:' + hashlib.md5(signature.encode('utf-8')).hexdigest()
+
+
+def _render(form, context):
+    if isinstance(form, SharedHelperMixin) and not form.has_own_helper():
+        # Unchanged, render with the shared helper instead of a copy.
+        context.update({'baseline_form': form,
+                        'baseline_helper': type(form).get_shared_helper()})
+        node = CrispyFormNode('baseline_form', 'baseline_helper')
+    else:
+        context.update({'baseline_form': form})
+        node = CrispyFormNode('baseline_form', None)
+    try:
+        return node.render(context)
+    finally:
+        context.pop()
+
+
+def render_form(form, context):
+    """
+    Render a form like {% crispy form %}, from the cache if possible.
+    """
+
+    token = context.get('csrf_token')
+    key = get_cache_key(form) if token else None
+    if key is None:
+        return mark_safe(_render(form, context))
+
+    cache = get_cache()
+    html = _local_cache.get(key) if cache is None else cache.get(key)
+
+    if html is None:
+        html = _render(form, Context({'csrf_token': CSRF_PLACEHOLDER}))
+        if cache is None:
+            if len(_local_cache) >= MAX_ENTRIES:
+                _local_cache.clear()
+            _local_cache[key] = html
+        else:
+            cache.set(key, html)
+
+    return mark_safe(html.replace(CSRF_PLACEHOLDER, force_text(token)))
@@ -1,12 +1,260 @@
 from __future__ import unicode_literals
 
+import copy
+
 from django import forms
+from django.utils import six
+from django.utils.functional import Promise
 
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Submit
 
 
-class CrispyFormMixin(object):
+# Values returned from the shared helper as they are, they can not be
+# changed in place.
+IMMUTABLE_TYPES = six.string_types + six.integer_types + (
+    float, type(None), tuple, frozenset, Promise)
+
+# Generated proxy classes, see proxy_class().
+_proxy_classes = {}
+
+
+def proxy_class(proxy, cls):
+    """
+    Return a subclass of proxy and cls, so proxies pass isinstance() checks
+    for the class of the object they stand in for.
+    """
+
+    key = (proxy, cls)
+    if key not in _proxy_classes:
+        _proxy_classes[key] = type(str('Shared' + cls.__name__), (proxy, cls), {})
+    return _proxy_classes[key]
+
+
+def unpickle_proxy(obj):
+    """
+    Proxies are pickled as the copy of their object, see SharedProxy.
+    """
+
+    return obj
+
+
+class SharedProxy(object):
+    """
+    Stands in for an object of a shared helper until it is changed.
+
+    Immutable values and the methods in _proxy_read_only are read from the
+    shared object. Setting or deleting attributes, item access and reading
+    anything else (other methods, lists, dicts, layout objects) switch to
+    a copy of the helper owned by the form, see SharedHelperMixin.
+    """
+
+    _proxy_read_only = ()
+
+    def _proxy_target(self, copy=False):
+        """
+        Return the object and whether it is shared. With copy, the object of
+        the own helper of the form, which is created if needed.
+        """
+
+        raise NotImplementedError()
+
+    def _proxy_wrap(self, name, value):
+        return None
+
+    def _proxy_copy(self):
+        """
+        Return a copy of the current object, which is not bound to the form.
+        copy, deepcopy and pickle use it.
+        """
+
+        raise NotImplementedError()
+
+    def __getattribute__(self, name):
+        if name.startswith('__') or name.startswith('_proxy_'):
+            return object.__getattribute__(self, name)
+
+        obj, shared = self._proxy_target()
+        value = getattr(obj, name)
+        if not shared or name in self._proxy_read_only:
+            return value
+
+        wrapped = self._proxy_wrap(name, value)
+        if wrapped is not None:
+            return wrapped
+        if isinstance(value, IMMUTABLE_TYPES):
+            return value
+        return getattr(self._proxy_target(copy=True)[0], name)
+
+    def __setattr__(self, name, value):
+        setattr(self._proxy_target(copy=True)[0], name, value)
+
+    def __delattr__(self, name):
+        delattr(self._proxy_target(copy=True)[0], name)
+
+    def __len__(self):
+        return len(self._proxy_target()[0])
+
+    def __getitem__(self, key):
+        return self._proxy_target(copy=True)[0][key]
+
+    def __setitem__(self, key, value):
+        self._proxy_target(copy=True)[0][key] = value
+
+    def __delitem__(self, key):
+        del self._proxy_target(copy=True)[0][key]
+
+    def __copy__(self):
+        return self._proxy_copy()
+
+    def __deepcopy__(self, memo):
+        return self._proxy_copy()
+
+    def __reduce__(self):
+        return unpickle_proxy, (self._proxy_copy(),)
+
+    def __reduce_ex__(self, protocol):
+        return self.__reduce__()
+
+
+class SharedHelperProxy(SharedProxy):
+    """
+    form.helper of a form which did not change its helper.
+    Rendering with {% crispy %} only reads it.
+    """
+
+    _proxy_read_only = ('render_layout', 'get_attributes')
+
+    def __init__(self, form):
+        object.__setattr__(self, '_proxy_form', form)
+
+    def _proxy_target(self, copy=False):
+        form = object.__getattribute__(self, '_proxy_form')
+        if copy:
+            return form.get_own_helper(), False
+        helper = form.__dict__.get('_helper')
+        if helper is not None:
+            return helper, False
+        return type(form).get_shared_helper(), True
+
+    def _proxy_wrap(self, name, value):
+        if name == 'layout' and value is not None:
+            return proxy_class(SharedLayoutProxy, type(value))(self)
+        return None
+
+    def _proxy_copy(self):
+        form = object.__getattribute__(self, '_proxy_form')
+        return form.copy_helper(self._proxy_target()[0])
+
+
+class SharedLayoutProxy(SharedProxy):
+    """
+    form.helper.layout of a form which did not change its helper.
+    """
+
+    _proxy_read_only = ('render', 'get_field_names', 'get_layout_objects',
+                        'get_rendered_fields', 'get_template_name')
+
+    def __init__(self, helper_proxy):
+        object.__setattr__(self, '_proxy_helper', helper_proxy)
+
+    def _proxy_target(self, copy=False):
+        helper_proxy = object.__getattribute__(self, '_proxy_helper')
+        helper, shared = helper_proxy._proxy_target(copy)
+        return helper.layout, shared
+
+    def _proxy_copy(self):
+        return copy.deepcopy(self._proxy_target()[0])
+
+
+class SharedHelperMixin(object):
+    """
+    A mixin for forms with a Crispy forms FormHelper object which is built
+    once per form class, with build_helper().
+
+    Until an instance changes its helper, form.helper stands in for the
+    shared helper, so rendering the form does not copy it. Setting an
+    attribute, calling a method like add_input() or changing the layout
+    copies the shared helper first, so the change only affects that
+    instance. The copy is shallow, except for the layout and the lists and
+    dicts of the helper. Assigning form.helper replaces the helper of the
+    instance.
+    """
+
+    @classmethod
+    def build_helper(cls):
+        """
+        Build the helper shared by all instances of the form class.
+        Override it to configure the helper, the default is a plain
+        FormHelper.
+        """
+
+        return FormHelper()
+
+
+    @classmethod
+    def get_shared_helper(cls):
+        """
+        The shared helper. It must not be modified, use form.helper to
+        change the helper of an instance.
+        """
+
+        helper = cls.__dict__.get('_shared_helper')
+        if helper is None:
+            helper = cls._shared_helper = cls.build_helper()
+        return helper
+
+
+    @staticmethod
+    def copy_helper(helper):
+        helper = copy.copy(helper)
+        for name, value in list(vars(helper).items()):
+            if isinstance(value, (list, dict)):
+                setattr(helper, name, copy.copy(value))
+        if getattr(helper, 'layout', None) is not None:
+            helper.layout = copy.deepcopy(helper.layout)
+        return helper
+
+
+    def has_own_helper(self):
+        """
+        Whether the instance has changed or assigned form.helper, so its
+        helper may differ from the shared one.
+        """
+
+        return self.__dict__.get('_helper') is not None
+
+
+    def get_own_helper(self):
+        """
+        Return the helper of the instance, a copy of the shared helper
+        unless one was assigned.
+        """
+
+        helper = self.__dict__.get('_helper')
+        if helper is None:
+            helper = self.__dict__['_helper'] = self.copy_helper(type(self).get_shared_helper())
+        return helper
+
+
+    def _get_helper(self):
+        helper = self.__dict__.get('_helper')
+        if helper is not None:
+            return helper
+
+        proxy = self.__dict__.get('_helper_proxy')
+        if proxy is None:
+            cls = proxy_class(SharedHelperProxy, type(type(self).get_shared_helper()))
+            proxy = self.__dict__['_helper_proxy'] = cls(self)
+        return proxy
+
+    def _set_helper(self, helper):
+        self.__dict__['_helper'] = helper
+
+    helper = property(_get_helper, _set_helper)
+
+
+class CrispyFormMixin(SharedHelperMixin):
     """
     A mixin that adds a Crispy forms FormHelper object to a form.
     """
@@ -14,12 +262,13 @@ class CrispyFormMixin(object):
     SUBMIT_LABEL = 'Submit'
     HTTP_METHOD = 'post'
 
-    def __init__(self, *args, **kwargs):
-        super(CrispyFormMixin, self).__init__(*args, **kwargs)
-        self.helper = FormHelper()
+    @classmethod
+    def build_helper(cls):
+        helper = FormHelper()
 
-        self.helper.add_input(Submit('submit', self.SUBMIT_LABEL))
-        self.helper.form_method = self.HTTP_METHOD
+        helper.add_input(Submit('submit', cls.SUBMIT_LABEL))
+        helper.form_method = cls.HTTP_METHOD
+        return helper
 
 
 class CrispyForm(CrispyFormMixin, forms.Form):
@@ -51,14 +300,14 @@ class CrispyFormSetHelper(FormHelper):
         self.form_tag = False
 
 
-class CrispyInlineParentForm(forms.ModelForm):
+class CrispyInlineParentForm(SharedHelperMixin, forms.ModelForm):
     """
     Convenience ModelForm base class which uses a Crispy FormHelper
     with disabled form tag. Used for inline formsets in views.py.
     """
 
-    def __init__(self, *args, **kwargs):
-        super(CrispyInlineParentForm, self).__init__(*args, **kwargs)
+    @classmethod
+    def build_helper(cls):
         # Set to false because form set is used.
         # See http://django-crispy-forms.readthedocs.org/en/d-0/tags.html#rendering-several-forms-with-helpers.
-        self.helper = CrispyFormSetHelper()
+        return CrispyFormSetHelper()
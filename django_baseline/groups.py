@@ -0,0 +1,228 @@
+"""
+Cached group membership lookups.
+
+The group names of a user are loaded with a single query and kept on the
+user instance, which lives for the duration of a request.
+If BASELINE_GROUP_CACHE_TIMEOUT is set, the names are also stored in
+Django's cache framework, so subsequent requests do not hit the database.
+
+The cache is invalidated when the groups of a user change (m2m_changed,
+from both user.groups and group.user_set) and when a group is renamed or
+deleted. Changes made from the group side can not be traced to the user
+instances of the running process, so they bump a process wide generation
+which marks all names stored on user instances as stale.
+"""
+
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_save
+
+
+# Attribute used to store the group names on the user instance.
+USER_ATTR = '_baseline_group_names'
+
+CACHE_PREFIX = 'baseline:groups'
+
+# Generation of the names stored on user instances in this process.
+_instance_generation = 0
+
+
+def get_cache_timeout():
+    """
+    Timeout for the Django cache, or None if only per-request caching
+    should be used.
+    """
+
+    return getattr(settings, 'BASELINE_GROUP_CACHE_TIMEOUT', None)
+
+
+def _get_generation():
+    """
+    Renaming or deleting a group changes the membership of an unknown
+    number of users, so instead of deleting single keys a generation
+    counter is bumped which invalidates all cached entries at once.
+    """
+
+    generation = cache.get(CACHE_PREFIX + ':generation')
+    if generation is None:
+        generation = 1
+        cache.add(CACHE_PREFIX + ':generation', generation, None)
+    return generation
+
+
+def _user_key(user_pk, generation):
+    return '{p}:{g}:user:{u}'.format(p=CACHE_PREFIX, g=generation, u=user_pk)
+
+
+def _group_key(name, generation):
+    return '{p}:{g}:group:{n}'.format(p=CACHE_PREFIX, g=generation, n=name)
+
+
+def get_user_group_names(user):
+    """
+    Return a frozenset with the names of all groups the user belongs to.
+    """
+
+    cached = getattr(user, USER_ATTR, None)
+    if cached is not None and cached[0] == _instance_generation:
+        return cached[1]
+
+    names = None
+    if user.pk is None:
+        # Anonymous users never belong to a group.
+        names = frozenset()
+    else:
+        timeout = get_cache_timeout()
+        key = None
+        if timeout is not None:
+            key = _user_key(user.pk, _get_generation())
+            names = cache.get(key)
+
+        if names is None:
+            names = frozenset(Group.objects.filter(user=user.pk)
+                              .values_list('name', flat=True))
+            if key is not None:
+                cache.set(key, names, timeout)
+
+    setattr(user, USER_ATTR, (_instance_generation, names))
+    return names
+
+
+def get_group(name):
+    """
+    Get a django.contrib.auth group model object by group name.
+    """
+
+    timeout = get_cache_timeout()
+    if timeout is None:
+        return Group.objects.filter(name=name).first()
+
+    key = _group_key(name, _get_generation())
+    group = cache.get(key)
+    if group is None:
+        group = Group.objects.filter(name=name).first()
+        if group is not None:
+            cache.set(key, group, timeout)
+    return group
+
+
+def user_has_group(user, group, superuser_skip=True):
+    """
+    Check if a user is in a certaing group.
+    By default, the check is skipped for superusers.
+    """
+
+    if user.is_superuser and superuser_skip:
+        return True
+
+    return group in get_user_group_names(user)
+
+
+def clear_user_groups(user_pk):
+    """
+    Invalidate the cached group names of a user.
+    """
+
+    if get_cache_timeout() is not None:
+        cache.delete(_user_key(user_pk, _get_generation()))
+
+
+def clear_instance_groups():
+    """
+    Invalidate the group names stored on user instances of this process.
+    """
+
+    global _instance_generation
+    _instance_generation += 1
+
+
+def clear_all_groups():
+    """
+    Invalidate all cached group names and groups.
+    """
+
+    clear_instance_groups()
+    if get_cache_timeout() is None:
+        return
+    try:
+        cache.incr(CACHE_PREFIX + ':generation')
+    except ValueError:
+        # Key is missing (evicted or never set), start a new generation.
+        cache.set(CACHE_PREFIX + ':generation', 2, None)
+
+
+###################
+# Signal handlers #
+###################
+
+
+def user_groups_changed(sender, instance, action, reverse, model, pk_set,
+                        **kwargs):
+    if not action.startswith('post_'):
+        return
+
+    user_model = get_user_model()
+
+    if isinstance(instance, Group) and model is user_model:
+        # group.user_set was changed.
+        clear_instance_groups()
+        if pk_set is None:
+            # post_clear: the affected users are not known anymore.
+            clear_all_groups()
+        else:
+            for pk in pk_set:
+                clear_user_groups(pk)
+    elif isinstance(instance, user_model) and model is Group:
+        # user.groups was changed.
+        if hasattr(instance, USER_ATTR):
+            delattr(instance, USER_ATTR)
+        clear_user_groups(instance.pk)
+
+
+def group_pre_save(sender, instance, **kwargs):
+    # Remember the old name to detect renames in post_save.
+    if instance.pk is None or get_cache_timeout() is None:
+        instance._baseline_old_name = None
+    else:
+        instance._baseline_old_name = Group.objects.filter(
+            pk=instance.pk).values_list('name', flat=True).first()
+
+
+def group_post_save(sender, instance, created, **kwargs):
+    if created:
+        return
+    if get_cache_timeout() is None:
+        # Without the Django cache, only names stored on user instances
+        # can be stale, skip the query for the old name.
+        clear_instance_groups()
+    elif getattr(instance, '_baseline_old_name', None) != instance.name:
+        clear_all_groups()
+
+
+def group_post_delete(sender, instance, **kwargs):
+    clear_all_groups()
+
+
+def connect_signals():
+    """
+    Connect the handlers, once the user model is loaded.
+    """
+
+    user_groups = getattr(get_user_model(), 'groups', None)
+    if user_groups is not None:
+        # Only changes of user.groups and group.user_set, not of every m2m
+        # relation of the project.
+        m2m_changed.connect(user_groups_changed, sender=user_groups.through,
+                            dispatch_uid='baseline_user_groups_changed')
+    post_delete.connect(group_post_delete, sender=Group,
+                        dispatch_uid='baseline_group_post_delete')
+    # Connected even without BASELINE_GROUP_CACHE_TIMEOUT, the setting is
+    # read when the signal is sent (it may be changed later, eg. in tests).
+    pre_save.connect(group_pre_save, sender=Group,
+                     dispatch_uid='baseline_group_pre_save')
+    post_save.connect(group_post_save, sender=Group,
+                      dispatch_uid='baseline_group_post_save')
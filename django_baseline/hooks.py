@@ -0,0 +1,203 @@
+"""
+Deferred execution of hooks, eg. the post_save and post_delete hooks of
+views.SaveHookMixin with defer_hooks = True.
+
+defer() runs a function after the current transaction is committed, on a
+pluggable backend. The backend is configured with the BASELINE_HOOK_BACKEND
+setting (a class path) and BASELINE_HOOK_BACKEND_OPTIONS (keyword arguments
+for the class). The default LocalHookBackend runs hooks on a bounded pool of
+worker threads in the current process. Other backends can hand the hooks to
+a task queue by implementing submit().
+
+Django < 1.9 has no transaction.on_commit(). There, hooks deferred inside
+hooks.atomic() are submitted when its outermost block commits, and dropped
+when it rolls back. Inside other atomic blocks (eg. ATOMIC_REQUESTS) the
+commit can not be observed, so hooks run inline in the calling thread,
+where they see the uncommitted data.
+
+Failing hooks are logged to the django_baseline.hooks logger and reported
+with the hook_failed signal.
+"""
+
+from __future__ import unicode_literals
+
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction, close_old_connections
+from django.dispatch import Signal
+from django.utils.six.moves import queue
+
+from django_baseline import get_config, resolve_class
+
+try:
+    from django.core.signals import setting_changed
+except ImportError:
+    # Django < 1.8
+    from django.test.signals import setting_changed
+
+
+logger = logging.getLogger('django_baseline.hooks')
+
+# Sent with hook and exception arguments when a deferred hook fails.
+hook_failed = Signal()
+
+
+def run_hook(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception as e:
+        logger.exception('Deferred hook %r failed.', func)
+        hook_failed.send(sender=None, hook=func, exception=e)
+
+
+class BaseHookBackend(object):
+    """
+    Base class for hook backends.
+    """
+
+    def submit(self, func, *args, **kwargs):
+        raise NotImplementedError()
+
+
+class InlineHookBackend(BaseHookBackend):
+    """
+    Runs hooks right away in the calling thread. Useful for tests.
+    """
+
+    def submit(self, func, *args, **kwargs):
+        run_hook(func, args, kwargs)
+
+
+class LocalHookBackend(BaseHookBackend):
+    """
+    Runs hooks on a bounded pool of worker threads in this process.
+
+    The queue holds at most queue_size hooks. When it is full, the hook runs
+    in the calling thread instead, which slows down the producer rather
+    than dropping work or growing without bounds.
+    """
+
+    def __init__(self, workers=2, queue_size=100):
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work,
+                                          name='baseline-hooks-{0}'.format(i))
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+
+    def _work(self):
+        while True:
+            func, args, kwargs = self.queue.get()
+            try:
+                run_hook(func, args, kwargs)
+            finally:
+                # Worker threads hold their own database connection.
+                close_old_connections()
+                self.queue.task_done()
+
+
+    def submit(self, func, *args, **kwargs):
+        if not self._threads:
+            self._start()
+
+        try:
+            self.queue.put_nowait((func, args, kwargs))
+        except queue.Full:
+            logger.warning('Hook queue is full, running %r inline.', func)
+            run_hook(func, args, kwargs)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend_cls = resolve_class(get_config('BASELINE_HOOK_BACKEND',
+                    'django_baseline.hooks.LocalHookBackend'))
+                _backend = backend_cls(**get_config('BASELINE_HOOK_BACKEND_OPTIONS', {}))
+    return _backend
+
+
+def _setting_changed(sender, setting, **kwargs):
+    global _backend
+    if setting in ('BASELINE_HOOK_BACKEND', 'BASELINE_HOOK_BACKEND_OPTIONS'):
+        _backend = None
+
+setting_changed.connect(_setting_changed,
+                        dispatch_uid='baseline_reset_hook_backend')
+
+
+# Hooks deferred inside hooks.atomic() on Django < 1.9.
+_local = threading.local()
+
+
+@contextmanager
+def atomic(using=None):
+    """
+    transaction.atomic() for code which defers hooks. On Django < 1.9, the
+    outermost block submits the hooks deferred inside it after the commit.
+    """
+
+    if (hasattr(transaction, 'on_commit') or
+            getattr(_local, 'pending', None) is not None or
+            transaction.get_connection(using).in_atomic_block):
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    pending = _local.pending = []
+    try:
+        with transaction.atomic(using=using):
+            yield
+            # Django 1.8: the block can be marked for rollback without an
+            # exception.
+            get_rollback = getattr(transaction, 'get_rollback', None)
+            if get_rollback is not None and get_rollback(using):
+                del pending[:]
+    finally:
+        _local.pending = None
+
+    backend = get_backend()
+    for func, args, kwargs in pending:
+        backend.submit(func, *args, **kwargs)
+
+
+def defer(func, *args, **kwargs):
+    """
+    Run func(*args, **kwargs) on the hook backend once the current
+    transaction is committed. Outside of a transaction, it is submitted
+    right away.
+    """
+
+    on_commit = getattr(transaction, 'on_commit', None)
+    if on_commit is not None:
+        on_commit(lambda: get_backend().submit(func, *args, **kwargs))
+        return
+
+    # Django < 1.9 has no commit hooks.
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        pending.append((func, args, kwargs))
+    elif transaction.get_connection().in_atomic_block:
+        # A worker thread could run the hook before the commit.
+        run_hook(func, args, kwargs)
+    else:
+        get_backend().submit(func, *args, **kwargs)
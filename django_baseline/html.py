@@ -1,6 +1,8 @@
 # Various html helpers.
 from __future__ import unicode_literals
 
+from django.utils.html import conditional_escape
+
 
 def attributes(attr):
     parts = ['{k}="{v}"'.format(k=key, v=val) for key, val in attr.items()]
@@ -13,3 +15,52 @@ def tag(name, content='', attr={}, filter_empty_attr=True):
     attr = ' ' + attributes(attr) if len(attr) else ''
 
     return '<{n}{a}>{c}</{n}>'.format(n=name, c=content, a=attr)
+
+
+def iter_table(rows, header=None, formatters=None, attr={}, chunk_size=500):
+    """
+    Render a table and yield the html in chunks of chunk_size rows.
+
+    rows can be any iterable of row iterables, including generators.
+    Unevaluated querysets are read with iterator().
+    header is an optional list of column titles.
+    formatters maps column indexes to callables which format the cell value.
+    Cell content is escaped unless it is marked safe.
+
+    Usable as content of a StreamingHttpResponse.
+    """
+
+    formatters = formatters or {}
+    attr = {k: conditional_escape(v) for k, v in attr.items() if v}
+
+    start = '<table' + (' ' + attributes(attr) if attr else '') + '>'
+    if header:
+        start += '<thead><tr>' + ''.join(
+            '<th>' + conditional_escape(title) + '</th>'
+            for title in header) + '</tr></thead>'
+    yield start + '<tbody>'
+
+    if getattr(rows, '_result_cache', True) is None:
+        rows = rows.iterator()
+
+    parts = []
+    count = 0
+    for row in rows:
+        parts.append('<tr>')
+        for index, value in enumerate(row):
+            formatter = formatters.get(index)
+            if formatter is not None:
+                value = formatter(value)
+            parts.append('<td>')
+            parts.append(conditional_escape(value))
+            parts.append('</td>')
+        parts.append('</tr>')
+
+        count += 1
+        if count >= chunk_size:
+            yield ''.join(parts)
+            parts = []
+            count = 0
+
+    parts.append('</tbody></table>')
+    yield ''.join(parts)
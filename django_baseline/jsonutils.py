@@ -0,0 +1,90 @@
+"""
+Compact JSON encoding for AJAX responses.
+
+dumps() uses orjson if it is installed, and falls back to the json module
+of the standard library. Set BASELINE_JSON_ENCODER to 'orjson' or 'json'
+to choose explicitly.
+
+Lazy translation strings and form errors (ErrorDict/ErrorList) are
+serialized like regular strings, dicts and lists, as well as everything
+DjangoJSONEncoder handles (dates, decimals, ...). Both encoders produce the
+same output, orjson formats dates with DjangoJSONEncoder and converts non
+string keys like json does.
+"""
+
+from __future__ import unicode_literals
+
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import six
+from django.utils.encoding import force_text
+from django.utils.functional import Promise
+
+from django_baseline import get_config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    ORJSON_OPTIONS = None
+else:
+    ORJSON_OPTIONS = (orjson.OPT_PASSTHROUGH_SUBCLASS | orjson.OPT_PASSTHROUGH_DATETIME |
+                      orjson.OPT_NON_STR_KEYS)
+
+
+_django_encoder = DjangoJSONEncoder()
+
+
+def default(obj):
+    """
+    Convert objects the encoders do not know natively.
+    """
+
+    if isinstance(obj, Promise):
+        return force_text(obj)
+    if isinstance(obj, six.text_type):
+        # str subclasses like SafeText.
+        return six.text_type(obj)
+    if isinstance(obj, six.integer_types) and not isinstance(obj, bool):
+        return int(obj)
+    if isinstance(obj, dict):
+        # dict subclasses like ErrorDict.
+        return dict(obj)
+    if isinstance(obj, (list, tuple)):
+        # list subclasses like ErrorList, which may hold lazy strings.
+        return [force_text(item) if isinstance(item, Promise) else item
+                for item in obj]
+    return _django_encoder.default(obj)
+
+
+class LazyJSONEncoder(DjangoJSONEncoder):
+    """
+    DjangoJSONEncoder that also handles lazy translation strings.
+    """
+
+    def default(self, obj):
+        if isinstance(obj, Promise):
+            return force_text(obj)
+        return super(LazyJSONEncoder, self).default(obj)
+
+
+def get_encoder():
+    name = get_config('BASELINE_JSON_ENCODER', None)
+    if name is None:
+        name = 'orjson' if orjson is not None else 'json'
+    return name
+
+
+def dumps(obj):
+    """
+    Serialize obj to compact JSON and return it as utf-8 encoded bytes.
+    """
+
+    if get_encoder() == 'orjson':
+        # Pass subclasses of dict and list, and dates to default(), see
+        # above.
+        return orjson.dumps(obj, default=default, option=ORJSON_OPTIONS)
+
+    return json.dumps(obj, cls=LazyJSONEncoder,
+                      separators=(',', ':'), ensure_ascii=False).encode('utf-8')
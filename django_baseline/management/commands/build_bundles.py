@@ -0,0 +1,33 @@
+from __future__ import unicode_literals
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_baseline import bundles
+
+
+class Command(BaseCommand):
+    help = ('Concatenate and minify the static bundles into content hashed '
+            'files and write their manifest, see django_baseline.bundles.')
+
+    # Django < 1.8 reads options from option_list.
+    option_list = getattr(BaseCommand, 'option_list', ()) + (
+        make_option('--no-minify', action='store_false', dest='minify', default=True,
+                    help='Only concatenate the files.'),
+    )
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-minify', action='store_false', dest='minify', default=True,
+                            help='Only concatenate the files.')
+
+
+    def handle(self, *args, **options):
+        try:
+            manifest = bundles.build(minify=options.get('minify', True))
+        except ValueError as e:
+            raise CommandError(e)
+
+        for name, path in sorted(manifest.items()):
+            self.stdout.write('{0} -> {1}'.format(name, path))
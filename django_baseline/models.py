@@ -1,9 +1,18 @@
 from __future__ import unicode_literals
 
+import django
 from django.db import models
 from django.contrib.contenttypes.models import ContentType
 from django.utils.translation import ugettext_lazy as _
 
+from . import groups
+
+
+if django.VERSION < (1, 7):
+    # Invalidation of the group membership cache, connected in
+    # apps.BaselineConfig.ready() on newer versions.
+    groups.connect_signals()
+
 
 def get_object_or_none(qs, *args, **kwargs):
     """
@@ -18,15 +27,87 @@ def get_object_or_none(qs, *args, **kwargs):
         return None
 
 
+def get_children(instances):
+    """
+    Resolve the lowest child of a list of ContentTypeInheritanceBase
+    instances, with one query per child model instead of one per instance.
+
+    The order of instances is preserved. Instances whose child is the
+    instance itself (or can not be found) are returned as they are.
+    """
+
+    ids_by_model = {}
+    for instance in instances:
+        model = instance.get_child_model()
+        if model is not None:
+            ids_by_model.setdefault(model, []).append(instance.id)
+
+    children = {}
+    for model, ids in ids_by_model.items():
+        for child in model._base_manager.filter(id__in=ids):
+            children[(model, child.id)] = child
+
+    return [children.get((instance.get_child_model(), instance.id), instance)
+            for instance in instances]
+
+
+class ContentTypeInheritanceQuerySet(models.query.QuerySet):
+    """
+    QuerySet for ContentTypeInheritanceBase models.
+    """
+
+    def as_children(self, chunk_size=None):
+        """
+        Iterate over the lowest children of all instances, see get_children().
+
+        Without chunk_size, the whole queryset is loaded at once.
+        With chunk_size, rows are read with iterator() and resolved
+        chunk_size rows at a time, to keep memory usage low for large sets.
+        """
+
+        if not chunk_size:
+            for child in get_children(list(self)):
+                yield child
+            return
+
+        chunk = []
+        for instance in self.iterator():
+            chunk.append(instance)
+            if len(chunk) >= chunk_size:
+                for child in get_children(chunk):
+                    yield child
+                chunk = []
+
+        for child in get_children(chunk):
+            yield child
+
+
+class ContentTypeInheritanceManager(models.Manager):
+    """
+    Manager for ContentTypeInheritanceBase models, which offers as_children().
+    """
+
+    def get_queryset(self):
+        return ContentTypeInheritanceQuerySet(self.model, using=self._db)
+
+    def as_children(self, chunk_size=None):
+        return self.get_queryset().as_children(chunk_size)
+
+
 class ContentTypeInheritanceBase(models.Model):
     """
     This models allows to easily create a model hierarchy with nested models.
     The lowest model in the hierarchy (the lowest child) can always be
     retrieved with get_child().
+
+    To resolve the children of many instances at once, use
+    Model.objects.as_children() or get_children().
     """
 
     content_type = models.ForeignKey(ContentType, editable=False, null=True)
 
+    objects = ContentTypeInheritanceManager()
+
     @classmethod
     def get_content_type(cls):
         '''
@@ -40,13 +121,31 @@ class ContentTypeInheritanceBase(models.Model):
             self.content_type = contenttype
         self.save_base()
 
-    def get_child(self):
-        content_type = self.content_type
+    def get_child_model(self):
+        """
+        Return the model class of the lowest child, or None if this instance
+        already is the lowest child.
+        The content type is read from the ContentType cache, without a query.
+        """
+
+        if self.content_type_id is None:
+            return None
+
+        content_type = ContentType.objects.get_for_id(self.content_type_id)
         model = content_type.model_class()
-        if model == ContentTypeInheritanceBase or model == self.__class__:
+        if model is None or model == ContentTypeInheritanceBase or model == self.__class__:
+            return None
+
+        return model
+
+    def get_child(self):
+        model = self.get_child_model()
+        if model is None:
             return self
 
-        return model.objects.get(id=self.id)
+        # The base manager, like get_children(): default managers may hide
+        # the child row.
+        return model._base_manager.get(id=self.id)
 
     class Meta:
         abstract = True
@@ -0,0 +1,116 @@
+"""
+Keyset ("seek") pagination helpers.
+
+Instead of OFFSET, the next page is selected with a WHERE clause on an
+indexed ordering column, starting after the last row of the previous page.
+The position is passed around as an opaque, signed cursor.
+Used by views.ListView.
+"""
+
+from __future__ import unicode_literals
+
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from django.http import Http404
+
+
+CURSOR_SALT = 'django_baseline.pagination.cursor'
+
+
+def get_keyset_field(model, ordering):
+    """
+    Return the model field for an ordering like "-created_at" or "pk".
+    """
+
+    name = ordering.lstrip('-')
+    if name == 'pk':
+        return model._meta.pk
+    return model._meta.get_field(name)
+
+
+def keyset_order(queryset, ordering):
+    """
+    Order the queryset by the keyset column, with the primary key as
+    tie breaker for non-unique columns.
+    """
+
+    field = get_keyset_field(queryset.model, ordering)
+    if field.primary_key or field.unique:
+        return queryset.order_by(ordering)
+
+    prefix = '-' if ordering.startswith('-') else ''
+    return queryset.order_by(ordering, prefix + 'pk')
+
+
+def keyset_filter(queryset, ordering, value, pk):
+    """
+    Restrict the queryset to rows after the row with (value, pk).
+    """
+
+    field = get_keyset_field(queryset.model, ordering)
+    op = '__lt' if ordering.startswith('-') else '__gt'
+
+    if field.primary_key:
+        return queryset.filter(**{'pk' + op: pk})
+    if field.unique:
+        return queryset.filter(**{field.name + op: value})
+
+    return queryset.filter(
+        Q(**{field.name + op: value}) | Q(**{field.name: value, 'pk' + op: pk}))
+
+
+def encode_cursor(instance, ordering):
+    """
+    Create an opaque cursor pointing after instance.
+    """
+
+    model = type(instance)
+    field = get_keyset_field(model, ordering)
+    # Both values as strings, so non-JSON types like UUID keys survive.
+    return signing.dumps([field.value_to_string(instance),
+                          model._meta.pk.value_to_string(instance)],
+                         salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor, model, ordering):
+    """
+    Decode a cursor to a (value, pk) tuple.
+    Invalid or tampered cursors raise a 404.
+    """
+
+    try:
+        value, pk = signing.loads(cursor, salt=CURSOR_SALT)
+    except (signing.BadSignature, ValueError, TypeError):
+        raise Http404('Invalid page cursor.')
+
+    field = get_keyset_field(model, ordering)
+    try:
+        return field.to_python(value), model._meta.pk.to_python(pk)
+    except ValidationError:
+        # Signed for another model or ordering.
+        raise Http404('Invalid page cursor.')
+
+
+def estimate_count(queryset):
+    """
+    Return the row count estimate of the query planner, or None if no
+    estimate is available.
+    Only unfiltered querysets on PostgreSQL can be estimated.
+    """
+
+    if queryset.query.where:
+        return None
+
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    cursor = connection.cursor()
+    cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                   [queryset.model._meta.db_table])
+    row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
@@ -0,0 +1,218 @@
+"""
+Records SQL queries made while a baseline generic view handles a request,
+see views.QueryBudgetMixin.
+
+Queries are grouped by their normalized SQL (literals replaced), so the
+same query shape running many times, the typical N+1 problem, shows up
+as one entry with a high count.
+
+Instrumentation is enabled with the BASELINE_QUERY_INSTRUMENTATION setting,
+which defaults to DEBUG. Views over their query_budget are logged to the
+django_baseline.queries logger, or raise QueryBudgetExceeded if
+BASELINE_QUERY_BUDGET_ACTION is 'raise'.
+
+In tests, assert_query_budget() requests a url with the test client and
+fails if a view exceeded its budget.
+"""
+
+from __future__ import unicode_literals
+
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import connections
+from django.dispatch import Signal
+
+from django_baseline import get_config
+
+
+logger = logging.getLogger('django_baseline.queries')
+
+# Sent with report and request arguments after an instrumented request.
+query_report = Signal()
+
+_state = threading.local()
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_RE = re.compile(r'\bIN \((?:\s*\?\s*,)*\s*\?\s*\)', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """
+    Replace literals in sql, so queries differing only by their
+    parameters are equal.
+    """
+
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_RE.sub('IN (...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def instrumentation_enabled():
+    if getattr(_state, 'force', False):
+        return True
+
+    from django.conf import settings
+    return get_config('BASELINE_QUERY_INSTRUMENTATION', settings.DEBUG)
+
+
+class QueryRecorder(object):
+    """
+    Records the queries of all database connections of the current thread
+    between start() and stop().
+
+    Uses execute_wrapper() where available (Django >= 2.0), and the debug
+    cursor (connection.queries) otherwise.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.running = False
+        self._state = []
+
+
+    def _wrapper(self, alias):
+        def wrapper(execute, sql, params, many, context):
+            start = time.time()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                self.queries.append({'sql': sql, 'alias': alias,
+                                     'time': time.time() - start})
+        return wrapper
+
+
+    def start(self):
+        self.running = True
+        for connection in connections.all():
+            if hasattr(connection, 'execute_wrapper'):
+                manager = connection.execute_wrapper(self._wrapper(connection.alias))
+                manager.__enter__()
+                self._state.append((connection, manager, None))
+            else:
+                attr = ('force_debug_cursor' if hasattr(connection, 'force_debug_cursor')
+                        else 'use_debug_cursor')
+                self._state.append((connection, None,
+                    (attr, getattr(connection, attr), len(connection.queries))))
+                setattr(connection, attr, True)
+
+
+    def stop(self):
+        for connection, manager, debug in self._state:
+            if manager is not None:
+                manager.__exit__(None, None, None)
+                continue
+
+            attr, old_value, offset = debug
+            for query in connection.queries[offset:]:
+                self.queries.append({'sql': query['sql'], 'alias': connection.alias,
+                                     'time': float(query['time'])})
+            setattr(connection, attr, old_value)
+
+        self._state = []
+        self.running = False
+
+    # Called when a response holding the recorder is closed.
+    close = stop
+
+
+class QueryReport(object):
+    """
+    Summary of the queries of one request.
+    """
+
+    def __init__(self, view_name, queries, budget=None, repeat_threshold=None):
+        self.view_name = view_name
+        self.queries = queries
+        self.budget = budget
+        self.shapes = Counter(normalize_sql(query['sql']) for query in queries)
+
+        self.repeated = []
+        if repeat_threshold:
+            self.repeated = [(shape, count) for shape, count in self.shapes.most_common()
+                             if count >= repeat_threshold]
+
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.count > self.budget
+
+
+    def describe(self):
+        lines = ['{view}: {count} queries (budget: {budget})'.format(
+            view=self.view_name, count=self.count, budget=self.budget)]
+        for shape, count in self.repeated:
+            lines.append('  {count}x {sql}'.format(count=count, sql=shape))
+        return '\n'.join(lines)
+
+
+def check_report(report, request=None):
+    """
+    Log or raise for a report over budget or with repeated query shapes,
+    and send the query_report signal.
+    """
+
+    query_report.send(sender=None, report=report, request=request)
+
+    if report.repeated:
+        logger.warning('Repeated queries (possible N+1) in %s', report.describe())
+
+    if report.over_budget:
+        if get_config('BASELINE_QUERY_BUDGET_ACTION', 'log') == 'raise':
+            raise QueryBudgetExceeded(report.describe())
+        logger.warning('Query budget exceeded in %s', report.describe())
+
+
+@contextmanager
+def capture_query_reports():
+    """
+    Enable instrumentation and collect the reports of all instrumented
+    requests in the block.
+    """
+
+    reports = []
+
+    def receiver(sender, report, **kwargs):
+        reports.append(report)
+
+    query_report.connect(receiver, weak=False)
+    old_force = getattr(_state, 'force', False)
+    _state.force = True
+    try:
+        yield reports
+    finally:
+        _state.force = old_force
+        query_report.disconnect(receiver)
+
+
+def assert_query_budget(client, path, method='get', **kwargs):
+    """
+    Request path with a Django test client and raise AssertionError if a
+    baseline view exceeded its query_budget. Returns the response.
+    """
+
+    with capture_query_reports() as reports:
+        response = getattr(client, method)(path, **kwargs)
+
+    for report in reports:
+        if report.over_budget:
+            raise AssertionError(report.describe())
+
+    return response
@@ -2,26 +2,147 @@
  * This file provides a $.djAjax function for making ajax requests
  * that containt the csrf token as a header.
  * For this  to  work,  the CSRF token needs to be present on the page,
- * preferrably added in base.html with {{ csrf }}.
+ * preferrably added in base.html with {{ csrf }}, or in the csrftoken cookie.
+ *
+ * $.djGet and $.djPost calls can be batched into one request, see $.djBatch.
  */
 
 (function($) {
 
+    /*
+     * The CSRF token, read on every request from the csrftoken cookie, which
+     * changes on login, or from the page if the cookie is not readable
+     * (CSRF_COOKIE_HTTPONLY).
+     */
+    $.djCsrfToken = function() {
+        var match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+        if (match) {
+            return decodeURIComponent(match[1]);
+        }
+        return $('input[name=csrfmiddlewaretoken]').val() || null;
+    };
+
     $.djAjax = function(settings) {
 
         settings = $.extend(settings, {
             crossDomain: false,
             beforeSend: function(jqXHR, settings) {
-                // Pull the token out of the DOM.
-                jqXHR.setRequestHeader('X-CSRFToken', $('input[name=csrfmiddlewaretoken]').val());
+                jqXHR.setRequestHeader('X-CSRFToken', $.djCsrfToken());
             },
         });
 
         $.ajax(settings);
     };
 
-    $.djGet = function(url, data, success, error) {
+    /**
+     * Batching of $.djGet and $.djPost calls.
+     *
+     * Set $.djBatch.url to the url of a views.BatchView to enable it. Calls
+     * made within $.djBatch.delay milliseconds are then sent as one request,
+     * at most $.djBatch.maxSize at a time.
+     */
+    $.djBatch = {
+        url: null,
+        delay: 10,
+        maxSize: 25,
+        queue: [],
+        timer: null
+    };
+
+    // Minimal jqXHR stand-in for the callbacks of batched calls.
+    function batchXhr(response) {
+        var headers = {};
+        for (var name in response.headers) {
+            headers[name.toLowerCase()] = response.headers[name];
+        }
+
+        var xhr = {
+            status: response.status,
+            responseText: response.body,
+            getResponseHeader: function(name) {
+                var value = headers[name.toLowerCase()];
+                return value === undefined ? null : value;
+            }
+        };
+
+        var type = xhr.getResponseHeader('Content-Type') || '';
+        if (type.indexOf('application/json') === 0 && response.body) {
+            try {
+                xhr.responseJSON = $.parseJSON(response.body);
+            }
+            catch (e) {}
+        }
+        return xhr;
+    }
+
+    function sendBatch(calls) {
+        if (calls.length === 1) {
+            $.djAjax(calls[0]);
+            return;
+        }
+
+        var requests = $.map(calls, function(call) {
+            var data = typeof call.data === 'string' ? call.data : $.param(call.data || {});
+            if (call.type === 'GET') {
+                return {method: 'GET', url: data ? call.url + (call.url.indexOf('?') === -1 ? '?' : '&') + data : call.url};
+            }
+            return {method: call.type, url: call.url, data: data};
+        });
+
         $.djAjax({
+            type: 'POST',
+            url: $.djBatch.url,
+            contentType: 'application/json',
+            data: JSON.stringify({requests: requests}),
+            success: function(data) {
+                $.each(calls, function(index, call) {
+                    var xhr = batchXhr(data.responses[index]);
+                    // Local redirects are followed by the server, others
+                    // can not be followed from here.
+                    if (xhr.status >= 200 && xhr.status < 400) {
+                        if (call.success) {
+                            call.success(xhr.responseJSON !== undefined ? xhr.responseJSON : xhr.responseText, 'success', xhr);
+                        }
+                    }
+                    else if (call.error) {
+                        call.error(xhr, 'error', '');
+                    }
+                });
+            },
+            error: function(xhr, status, error) {
+                $.each(calls, function(index, call) {
+                    if (call.error) {
+                        call.error(xhr, status, error);
+                    }
+                });
+            }
+        });
+    }
+
+    function flushBatch() {
+        $.djBatch.timer = null;
+        var queue = $.djBatch.queue;
+        $.djBatch.queue = [];
+
+        for (var i = 0; i < queue.length; i += $.djBatch.maxSize) {
+            sendBatch(queue.slice(i, i + $.djBatch.maxSize));
+        }
+    }
+
+    function queueCall(call) {
+        if (!$.djBatch.url) {
+            $.djAjax(call);
+            return;
+        }
+
+        $.djBatch.queue.push(call);
+        if (!$.djBatch.timer) {
+            $.djBatch.timer = setTimeout(flushBatch, $.djBatch.delay);
+        }
+    }
+
+    $.djGet = function(url, data, success, error) {
+        queueCall({
             type: 'GET',
             url: url,
             data: data,
@@ -31,7 +152,7 @@
     };
 
     $.djPost = function(url, data, success, error) {
-        $.djAjax({
+        queueCall({
             type: 'POST',
             url: url,
             data: data,
@@ -105,4 +226,41 @@
         });
     };
 
+    /**
+     * "Load more" links for lists with keyset pagination
+     * (views.ListView with keyset_paginate_by).
+     *
+     * The data-dj-load-more attribute holds the selector of the container
+     * the fetched rows are appended to. The url of the next page is read
+     * from the X-Next-Page response header.
+     */
+    $(document).on('click', '[data-dj-load-more]', function(e) {
+        e.preventDefault();
+
+        var link = $(this);
+        if (link.data('loading')) {
+            return;
+        }
+        link.data('loading', true);
+
+        $.ajax({
+            type: 'GET',
+            url: link.attr('href'),
+            success: function(data, status, xhr) {
+                $(link.attr('data-dj-load-more')).append(data);
+
+                var next = xhr.getResponseHeader('X-Next-Page');
+                if (next) {
+                    link.attr('href', next);
+                }
+                else {
+                    link.remove();
+                }
+            },
+            complete: function() {
+                link.data('loading', false);
+            }
+        });
+    });
+
 }(jQuery));
@@ -1,24 +1,337 @@
 from __future__ import unicode_literals
 
+import time
+
+try:
+    from inspect import getfullargspec as getargspec
+except ImportError:
+    # Python 2
+    from inspect import getargspec
+
 from django import template
+from django.conf import settings
+from django.core.urlresolvers import get_urlconf, get_script_prefix
+from django.template.base import token_kwargs
+from django.utils import six
+from django.utils.functional import Promise
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+
+try:
+    from django.core.signals import setting_changed
+except ImportError:
+    # Django < 1.8
+    from django.test.signals import setting_changed
+
+
+# Settings which influence template resolution.
+TEMPLATE_SETTINGS = ('TEMPLATES', 'TEMPLATE_DIRS', 'TEMPLATE_LOADERS',
+    'TEMPLATE_DEBUG', 'INSTALLED_APPS', 'DEBUG', 'BASELINE_TEMPLATE_CACHE')
+
+# Tuple of candidate names -> the compiled template that won.
+_resolved = {}
+# Template names which are known not to exist.
+_missing = set()
+
+# Bumped on every setting change, invalidates the output stored on
+# CompiledTagNode instances.
+_tag_generation = 0
+
+
+def use_template_cache():
+    '''
+    The resolution cache is enabled with the BASELINE_TEMPLATE_CACHE setting,
+    which defaults to True if DEBUG is off, so template changes show up
+    during development.
+    '''
+
+    return getattr(settings, 'BASELINE_TEMPLATE_CACHE', not settings.DEBUG)
+
+
+def clear_template_cache():
+    _resolved.clear()
+    _missing.clear()
+
+
+def clear_tag_cache():
+    '''
+    Discard the output stored on CompiledTagNode instances.
+    '''
+
+    global _tag_generation
+    _tag_generation += 1
+
+
+def _setting_changed(sender, setting, **kwargs):
+    clear_tag_cache()
+    if setting in TEMPLATE_SETTINGS:
+        clear_template_cache()
+
+setting_changed.connect(_setting_changed,
+                        dispatch_uid='baseline_clear_template_cache')
+
+
+def get_template(templates):
+    '''
+    Return the first existing template of a list of candidate names.
+    Resolved templates and misses are cached per process.
+    '''
+
+    cache = use_template_cache()
+    key = tuple(templates)
+
+    if cache:
+        tpl_instance = _resolved.get(key)
+        if tpl_instance is not None:
+            return tpl_instance
+
+    for tpl in templates:
+        if cache and tpl in _missing:
+            continue
+        try:
+            tpl_instance = template.loader.get_template(tpl)
+        except template.TemplateDoesNotExist:
+            if cache:
+                _missing.add(tpl)
+            continue
+
+        if cache:
+            _resolved[key] = tpl_instance
+        return tpl_instance
+
+    raise Exception('Template does not exist: ' + templates[-1])
+
+
+def _render(tpl_instance, context):
+    '''
+    Render a template returned by get_template() with a template.Context.
+    '''
+
+    # The backend wrappers of Django >= 1.8 only accept dicts since 1.10,
+    # their engine level template still renders a Context.
+    engine_template = getattr(tpl_instance, 'template', None)
+    if engine_template is not None:
+        return engine_template.render(context)
+    if isinstance(tpl_instance, template.Template):
+        # Django < 1.8
+        return tpl_instance.render(context)
+    # Templates of other backends.
+    return tpl_instance.render(context.flatten())
+
 
 def render_template(tpl, context):
     '''
     A shortcut function to render a partial template with context and return
     the output.
+
+    context can be a dict or a template.Context. A Context is reused: the
+    fragment gets its own layer on the stack, which is popped afterwards.
     '''
 
     templates = [tpl] if type(tpl) != list else tpl
-    tpl_instance = None
+    tpl_instance = get_template(templates)
 
-    for tpl in templates:
+    if isinstance(context, template.Context):
+        context.push()
         try:
-            tpl_instance = template.loader.get_template(tpl)
-            break
-        except template.TemplateDoesNotExist:
+            return _render(tpl_instance, context)
+        finally:
+            context.pop()
+
+    return _render(tpl_instance, template.Context(context))
+
+
+class FragmentRenderer(object):
+    '''
+    Renders many partial templates with one shared context stack, instead of
+    building a new Context for every fragment.
+
+    renderer = FragmentRenderer({'user': user})
+    html = [renderer.render('item.html', {'item': item}) for item in items]
+    '''
+
+    def __init__(self, context=None):
+        if not isinstance(context, template.Context):
+            context = template.Context(context or {})
+        self.context = context
+
+    def render(self, tpl, extra=None):
+        templates = [tpl] if type(tpl) != list else tpl
+        tpl_instance = get_template(templates)
+
+        self.context.update(extra or {})
+        try:
+            return _render(tpl_instance, self.context)
+        finally:
+            self.context.pop()
+
+
+# Names every context resolves, like literals.
+CONTEXT_BUILTINS = (('True',), ('False',), ('None',))
+
+
+def is_literal(expression):
+    '''
+    True if a compiled FilterExpression is a string or number literal, or
+    True, False or None, without filters.
+    '''
+
+    if expression.filters:
+        return False
+    var = expression.var
+    return (not isinstance(var, template.Variable) or var.literal is not None or
+            var.lookups in CONTEXT_BUILTINS)
+
+
+class CompiledTagNode(template.Node):
+    '''
+    Node of a tag whose output only depends on its arguments and settings,
+    see compiled_tag().
+
+    Literal arguments are resolved (and converted) when the template is
+    compiled, variables on every render. If all arguments are literals, the
+    output is rendered once and stored on the node, for timeout seconds if
+    it is set. Scoped nodes store it per URLconf, script prefix and
+    language, for output with reversed urls.
+
+    Text variables are escaped (unless they are marked safe or autoescape
+    is off), literals are trusted like the rest of the template. With a
+    target_var, the output is stored in the context instead.
+    '''
+
+    def __init__(self, func, args, kwargs, converters=None, cacheable=None,
+                 scoped=False, collect=None, timeout=None, target_var=None):
+        self.func = func
+        self.target_var = target_var
+        self.converters = converters or {}
+        self.cacheable = cacheable
+        self.scoped = scoped
+        self.collect = collect
+        self.timeout = timeout
+
+        params = getargspec(func)[0]
+        if len(args) > len(params):
+            raise template.TemplateSyntaxError(
+                "'{0}' received too many positional arguments".format(func.__name__))
+        arguments = dict(zip(params, args))
+        arguments.update(kwargs)
+
+        self.literals = {}
+        self.variables = {}
+        for name, expression in arguments.items():
+            if is_literal(expression):
+                value = expression.resolve(template.Context())
+                self.literals[name] = self.convert(name, value)
+            else:
+                self.variables[name] = expression
+
+        self._output = {}
+        self._generation = _tag_generation
+
+
+    def convert(self, name, value):
+        converter = self.converters.get(name)
+        return value if converter is None else converter(value)
+
+
+    def render(self, context):
+        output = self.render_output(context)
+        if self.target_var is not None:
+            context[self.target_var] = mark_safe(output)
+            return ''
+        return output
+
+
+    def resolve(self, context):
+        kwargs = dict(self.literals)
+        for name, expression in self.variables.items():
+            value = expression.resolve(context)
+            if context.autoescape and isinstance(value, six.string_types + (Promise,)):
+                value = conditional_escape(value)
+            kwargs[name] = self.convert(name, value)
+        return kwargs
+
+
+    def render_output(self, context):
+        if self.variables:
+            kwargs = self.resolve(context)
+        else:
+            kwargs = self.literals
+
+        if self.collect is not None and self.collect(kwargs):
+            return ''
+
+        if self.variables:
+            return self.func(**kwargs)
+
+        if self.cacheable is not None and not self.cacheable(self.literals):
+            return self.func(**self.literals)
+
+        if self._generation != _tag_generation:
+            # Settings changed.
+            self._output = {}
+            self._generation = _tag_generation
+
+        key = None
+        if self.scoped:
+            key = (get_urlconf(), get_script_prefix(), get_language())
+
+        try:
+            output, expires = self._output[key]
+        except KeyError:
             pass
+        else:
+            if expires is None or time.time() < expires:
+                return output
+
+        output = self.func(**self.literals)
+        expires = None if self.timeout is None else time.time() + self.timeout
+        self._output[key] = (output, expires)
+        return output
+
+
+def compiled_tag(library, name=None, converters=None, cacheable=None, scoped=False,
+                 collect=None, timeout=None):
+    '''
+    Register a function as a tag of library, like simple_tag, which renders
+    with a CompiledTagNode. The function stays callable from Python.
+
+    converters maps argument names to callables applied to the resolved
+    values, once at compile time for literals. cacheable is called with the
+    arguments of an all-literal node and returns False if the output must
+    not be stored, for example if it depends on the current time. collect
+    is called with the arguments on every render and returns True if it
+    took over the output, see assets.py. timeout limits the seconds the
+    output is stored, for output which depends on files.
+
+    Like simple_tag, {% tag ... as var %} stores the output in the context.
+    Text variables are escaped before they are passed to the function,
+    other objects must be escaped by the function.
+    '''
+
+    def decorator(func):
+        def compile_function(parser, token):
+            bits = token.split_contents()[1:]
+            target_var = None
+            if len(bits) >= 2 and bits[-2] == 'as':
+                target_var = bits[-1]
+                bits = bits[:-2]
+
+            args = []
+            kwargs = {}
+            for bit in bits:
+                kwarg = token_kwargs([bit], parser)
+                if kwarg:
+                    kwargs.update(kwarg)
+                else:
+                    args.append(parser.compile_filter(bit))
+            return CompiledTagNode(func, args, kwargs, converters=converters,
+                                   cacheable=cacheable, scoped=scoped,
+                                   collect=collect, timeout=timeout,
+                                   target_var=target_var)
 
-    if not tpl_instance:
-        raise Exception('Template does not exist: ' + templates[-1])
+        library.tag(name or func.__name__, compile_function)
+        return func
 
-    return tpl_instance.render(template.Context(context))
+    return decorator
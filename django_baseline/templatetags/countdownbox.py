@@ -7,27 +7,50 @@ from django import template
 from django.utils import dateformat, dateparse
 
 from django_baseline import html
+from django_baseline.template import compiled_tag
 
 register = template.Library()
 
-@register.simple_tag
+
+def parse_date(value):
+    '''
+    Parse a date or datetime string. Dates and datetimes are returned as
+    datetime.
+    '''
+
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time())
+
+    parsed = dateparse.parse_datetime(value)
+    if parsed is None:
+        date = dateparse.parse_date(value)
+        if date is not None:
+            parsed = datetime.datetime.combine(date, datetime.time())
+    return parsed
+
+
+# Literal dates are parsed once when the template is compiled. Without a
+# progressbar, the output does not depend on the current time and is
+# rendered once.
+@compiled_tag(register, converters={'date': parse_date, 'start': parse_date},
+              cacheable=lambda kwargs: not kwargs.get('progressbar'))
 def countdown(name, date, description='', id='', granularity='sec', start=None,
   progressbar=False, progressbar_inversed=False, showpct=False):
     '''
     Create a countdown.
     '''
 
-    end_date = dateparse.parse_datetime(date)
+    end_date = parse_date(date)
     end = dateformat.format(end_date, 'U')
 
     content = '<div class="name">' + name + '</div>'
     content += '<div class="description">' + description + '</div>'
 
     if progressbar:
-        if not end: raise Exception('For progressbar, start date is requried.')
-        parsed_date = datetime.datetime.combine(
-            dateparse.parse_date(start), datetime.time())
-        start_date = dateparse.parse_datetime(start) or parsed_date
+        start_date = parse_date(start)
+        if not start_date: raise Exception('For progressbar, start date is requried.')
         now = datetime.datetime.now()
 
         pct = (now - start_date).total_seconds() /\
@@ -0,0 +1,17 @@
+from __future__ import unicode_literals
+
+from django import template
+
+from django_baseline import formcache
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def crispy_cached(context, form):
+    '''
+    Render a form like {% crispy form %}. The html of unbound forms is
+    cached, see formcache.py.
+    '''
+
+    return formcache.render_form(form, context)
@@ -7,46 +7,42 @@ from django.db.models import Model
 from django.forms import ModelForm
 
 from django.conf import settings
-from django.core.urlresolvers import reverse
+from django.utils.encoding import force_text
+from django.utils.safestring import mark_safe
 
-from django_baseline import html
+from django_baseline import assets, bundles, get_config, html, thumbnails
+from django_baseline.template import compiled_tag
+from django_baseline.urlresolvers import reverse_cached
 
 register = template.Library()
 
 
 @register.simple_tag
-def table(rows):
+def table(rows, header=None, classes='', formatters=None):
     '''
     Output a simple table with several columns.
+    Cell content is escaped. See html.iter_table().
     '''
 
-    output = '<table>'
+    return mark_safe(''.join(html.iter_table(
+        rows, header, formatters, {'class': classes})))
 
-    for row in rows:
-        output += '<tr>'
-        for column in row:
-            output += '<td>{s}</td>'.format(s=column)
-        output += '</tr>'
-
-    output += '</table>'
-
-    return output
-
-@register.simple_tag
+@compiled_tag(register, scoped=True)
 def link(url, text='', classes='', target='', get="", **kwargs):
     '''
     Output a link tag.
+    With literal arguments, the tag is rendered once per url scope.
     '''
 
     if not (url.startswith('http') or url.startswith('/')):
         # Handle additional reverse args.
-        urlargs = {}
-
-        for arg, val in kwargs.items():
-            if arg[:4] == "url_":
-                urlargs[arg[4:]] = val
+        if len(kwargs) == 1 and 'url_pk' in kwargs:
+            urlargs = {'pk': kwargs['url_pk']}
+        else:
+            urlargs = {arg[4:]: val for arg, val in kwargs.items()
+                       if arg[:4] == "url_"}
 
-        url = reverse(url, kwargs=urlargs)
+        url = reverse_cached(url, kwargs=urlargs)
         if get:
             url += '?' + get
 
@@ -54,50 +50,113 @@ def link(url, text='', classes='', target='', get="", **kwargs):
         'class': classes, 'target': target, 'href': url})
 
 
-@register.simple_tag
+@compiled_tag(register, collect=assets.collect_js)
 def jsfile(url):
     '''
     Output a script tag to a js file.
+    Bundle names are resolved through the manifest, or output one tag per
+    file if the bundles are not built, see bundles.py.
+    Inside {% assets %}, the file is collected instead, see assets.py.
     '''
 
-    if not url.startswith('http://') and not url[:1] == '/':
-        #add media_url for relative paths
-        url = settings.STATIC_URL + url
-
-    return '<script type="text/javascript" src="{src}"></script>'.format(
-        src=url)
+    return ''.join('<script type="text/javascript" src="{src}"></script>'.format(src=src)
+                   for src in bundles.static_urls(url))
 
 
-@register.simple_tag
+@compiled_tag(register, collect=assets.collect_css)
 def cssfile(url):
     '''
     Output a link tag to a css stylesheet.
+    Bundle names are resolved through the manifest, or output one tag per
+    file if the bundles are not built, see bundles.py.
+    Inside {% assets %}, the file is collected instead, see assets.py.
     '''
 
-    if not url.startswith('http://') and not url[:1] == '/':
-        #add media_url for relative paths
-        url = settings.STATIC_URL + url
+    return ''.join('<link href="{src}" rel="stylesheet">'.format(src=src)
+                   for src in bundles.static_urls(url))
+
+
+class AssetsNode(template.Node):
+    def __init__(self, nodelist):
+        self.nodelist = nodelist
 
-    return '<link href="{src}" rel="stylesheet">'.format(src=url)
+    def render(self, context):
+        return assets.render_collected(lambda: self.nodelist.render(context))
+
+
+@register.tag('assets')
+def do_assets(parser, token):
+    '''
+    Collect the files of jsfile and cssfile tags in the block and output
+    them at the assets_css, assets_js and assets_preload placeholders.
+    '''
+
+    nodelist = parser.parse(('endassets',))
+    parser.delete_first_token()
+    return AssetsNode(nodelist)
+
+
+@register.simple_tag
+def assets_css():
+    return mark_safe(assets.CSS_PLACEHOLDER)
 
 
 @register.simple_tag
-def img(url, alt='', classes='', style=''):
+def assets_js(mode=''):
+    '''
+    Placeholder for the collected scripts, with the defer attribute unless
+    mode is "nodefer".
+    '''
+
+    if mode == 'nodefer':
+        return mark_safe(assets.JS_NODEFER_PLACEHOLDER)
+    return mark_safe(assets.JS_PLACEHOLDER)
+
+
+@register.simple_tag
+def assets_preload():
+    return mark_safe(assets.PRELOAD_PLACEHOLDER)
+
+
+# Stored on the node as long as thumbnails.py revalidates the variants.
+@compiled_tag(register, timeout=thumbnails.CHECK_INTERVAL)
+def img(url, alt='', classes='', style='', sizes='', lazy=False):
     '''
     Image tag helper.
+    Local images get a srcset of resized variants and their width and
+    height (with Pillow, see thumbnails.py).
+
+    With lazy=True, the image gets loading="lazy" and the browser loads it
+    when it comes near the viewport. Only use it for images below the
+    fold, lazy images above it load later than eager ones:
+
+        {% img "photos/team.jpg" alt="Team" lazy=True %}
     '''
 
+    src = url
     if not url.startswith('http://') and not url[:1] == '/':
         #add media_url for relative paths
-        url = settings.STATIC_URL + url
+        src = settings.STATIC_URL + url
 
     attr = {
         'class': classes,
         'alt': alt,
         'style': style,
-        'src': url
+        'src': src,
+        'loading': 'lazy' if lazy else '',
     }
 
+    image = thumbnails.get_image(url)
+    if image is not None:
+        attr['width'] = image.width
+        attr['height'] = image.height
+        if image.variants:
+            candidates = [(variant[0], variant[1]) for variant in image.variants]
+            candidates.append((src, image.width))
+            attr['srcset'] = ', '.join('{0} {1}w'.format(candidate, width)
+                                       for candidate, width in candidates)
+            attr['sizes'] = sizes or get_config('BASELINE_IMAGE_SIZES', '100vw')
+
     return html.tag('img', '', attr)
 
 
@@ -175,6 +234,36 @@ def mod(value, arg):
 mod.is_safe = False
 
 
+@register.filter
+def attr(obj, name):
+    """
+    Return the attribute or dict item name of obj, or an empty string.
+    For names held in variables, eg. the table_columns of ListView.
+
+    Like template variables, private names are not looked up, methods are
+    called without arguments and methods with alters_data are not called.
+    """
+
+    name = force_text(name)
+    if name.startswith('_'):
+        return ''
+    if isinstance(obj, dict):
+        return obj.get(name, '')
+
+    value = getattr(obj, name, '')
+    if callable(value):
+        if getattr(value, 'do_not_call_in_templates', False):
+            return value
+        if getattr(value, 'alters_data', False):
+            return ''
+        try:
+            value = value()
+        except TypeError:
+            # Needs arguments.
+            return ''
+    return value
+
+
 # Model related.
 
 @register.filter
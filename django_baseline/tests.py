@@ -1 +1,1541 @@
 from __future__ import unicode_literals
+
+import copy
+import datetime
+import gzip
+import io
+import json
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+import tempfile
+import warnings
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.conf import settings
+from django.conf.urls import include, url
+from django.contrib.auth.models import AnonymousUser, Group, User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.core.urlresolvers import NoReverseMatch, reverse
+from django.db.models.signals import m2m_changed
+from django import forms
+from django.utils.encoding import force_text
+from django.utils.safestring import mark_safe
+from django.utils.timezone import utc
+from django.utils.translation import ugettext_lazy
+from django.http import Http404, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.template import Context, Library, Template
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import override_settings
+from django.views.generic import DetailView
+
+import django
+import django_baseline
+from django_baseline import (assets, bundles, formcache, groups, hooks, html, jsonutils,
+                             pagination, querycount, thumbnails, urlresolvers)
+from django_baseline.template import (CompiledTagNode, FragmentRenderer, clear_template_cache,
+                                      render_template)
+from django_baseline.forms import CrispyForm, SharedHelperMixin
+from django_baseline import views
+from django_baseline.views import AssertUserIsOwnerMixin
+
+from crispy_forms.helper import FormHelper
+from crispy_forms.layout import Layout, Submit
+
+from benchmarks import models as test_models
+from benchmarks.models import (Animal, Bird, Cat, Category, Dog, Note, Order, OrderLine,
+                               Product, Tag)
+from benchmarks.urls import ORDER_FORMSET_ARGS
+
+
+def pk_view(request, pk):
+    return HttpResponse(pk)
+
+
+def private_view(request):
+    if not request.user.is_authenticated():
+        raise PermissionDenied()
+    return HttpResponse(request.user.username)
+
+
+def create_view(request):
+    Category.objects.create(name=request.POST['name'])
+    if request.POST.get('fail') == 'status':
+        return HttpResponse(status=503)
+    if request.POST.get('fail') == 'exception':
+        raise ValueError('failed')
+    if request.POST.get('next'):
+        return HttpResponseRedirect(request.POST['next'])
+    return HttpResponse('created')
+
+
+def stream_view(request):
+    Category.objects.create(name='streamed')
+    return StreamingHttpResponse(['a', 'b'])
+
+
+# Also a template tag library, for the assets tests.
+register = Library()
+
+
+@register.inclusion_tag(Template('{% load helpers %}{% jsfile "/widget.js" %}<widget>'))
+def widget():
+    return {}
+
+
+namespaced_urlpatterns = [
+    url(r'^notes/(?P<pk>[0-9]+)/$', pk_view, name='note'),
+]
+
+# Also the urlconf of the tests, see runtests.py.
+urlpatterns = [
+    url(r'^notes/(?P<pk>\d+)/$', pk_view, name='note'),
+    url(r'^short/(?P<pk>\d{1,2})/$', pk_view, name='short'),
+    url(r'^nonzero/(?P<pk>[1-9][0-9]*)/$', pk_view, name='nonzero'),
+    url(r'^twice/(?P<pk>\d+)/$', pk_view, name='twice'),
+    url(r'^twice/(?P<pk>\d+)/(?P<slug>[a-z]+)/$', pk_view, name='twice'),
+    url(r'^ns/', include((namespaced_urlpatterns, 'ns', 'ns'))),
+    url(r'^batch/$', views.BatchView.as_view()),
+    url(r'^private/$', private_view),
+    url(r'^create/$', create_view),
+    url(r'^stream/$', stream_view),
+]
+
+
+class GroupCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('user', 'user@example.com', 'pw')
+        self.group = Group.objects.create(name='editors')
+
+
+    def assertGroups(self, user, names):
+        self.assertEqual(groups.get_user_group_names(user), frozenset(names))
+
+
+    def test_user_side_change(self):
+        self.assertGroups(self.user, [])
+        self.user.groups.add(self.group)
+        self.assertGroups(self.user, ['editors'])
+        self.user.groups.clear()
+        self.assertGroups(self.user, [])
+
+
+    def test_group_side_change(self):
+        self.assertGroups(self.user, [])
+        self.group.user_set.add(self.user)
+        self.assertGroups(self.user, ['editors'])
+        self.group.user_set.remove(self.user)
+        self.assertGroups(self.user, [])
+
+
+    def test_signal_scoped_to_user_groups(self):
+        self.assertTrue(m2m_changed.has_listeners(User.groups.through))
+        self.assertFalse(m2m_changed.has_listeners(Order.tags.through))
+
+
+    def test_names_are_cached_on_the_instance(self):
+        self.assertGroups(self.user, [])
+        with self.assertNumQueries(0):
+            self.assertGroups(self.user, [])
+
+
+    @override_settings(BASELINE_GROUP_CACHE_TIMEOUT=60)
+    def test_django_cache(self):
+        self.group.user_set.add(self.user)
+        self.assertGroups(User.objects.get(pk=self.user.pk), ['editors'])
+        with self.assertNumQueries(0):
+            self.assertGroups(User(pk=self.user.pk), ['editors'])
+
+        self.group.user_set.clear()
+        self.assertGroups(User.objects.get(pk=self.user.pk), [])
+
+
+    @override_settings(BASELINE_GROUP_CACHE_TIMEOUT=60)
+    def test_rename_with_cache_enabled_later(self):
+        # The handlers are connected although the setting was not set
+        # when the app was loaded.
+        self.user.groups.add(self.group)
+        self.assertGroups(User.objects.get(pk=self.user.pk), ['editors'])
+        self.group.name = 'writers'
+        self.group.save()
+        self.assertGroups(User.objects.get(pk=self.user.pk), ['writers'])
+        self.assertEqual(groups.get_group('editors'), None)
+        self.assertEqual(groups.get_group('writers'), self.group)
+
+
+    def test_rename_without_cache(self):
+        self.user.groups.add(self.group)
+        self.assertGroups(self.user, ['editors'])
+        self.group.name = 'writers'
+        self.group.save()
+        self.assertGroups(self.user, ['writers'])
+
+
+
+class NoteView(AssertUserIsOwnerMixin, DetailView):
+    model = Note
+
+
+class OwnerTest(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'pw')
+        self.other = User.objects.create_user('other', 'other@example.com', 'pw')
+        self.note = Note.objects.create(user=self.owner, text='note')
+
+
+    def get_object(self, user, queryset=None):
+        request = RequestFactory().get('/')
+        request.user = user
+        view = NoteView(request=request, kwargs={'pk': self.note.pk})
+        return view.get_object(queryset)
+
+
+    def test_owner(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_object(self.owner), self.note)
+
+
+    def test_other_user_gets_404(self):
+        self.assertRaises(Http404, self.get_object, self.other)
+
+
+    def test_anonymous_user(self):
+        self.assertRaises(PermissionDenied, self.get_object, AnonymousUser())
+
+
+    def test_superuser(self):
+        self.other.is_superuser = True
+        self.assertEqual(self.get_object(self.other), self.note)
+
+
+    def test_own_queryset_is_checked(self):
+        self.assertRaises(PermissionDenied, self.get_object, self.other,
+                          Note.objects.all())
+
+
+
+class ChildResolutionTest(TestCase):
+    def setUp(self):
+        for i, cls in enumerate((Animal, Dog, Cat, Dog, Cat)):
+            cls(name=str(i)).save()
+        # Resolve the content types before counting queries.
+        for cls in (Animal, Dog, Cat):
+            cls.get_content_type()
+
+
+    def assertChildren(self, children, classes):
+        self.assertEqual([type(child) for child in children], classes)
+        self.assertEqual([child.name for child in children],
+                         [str(i) for i in range(len(classes))])
+
+
+    def test_order_and_models(self):
+        # One query for the animals, one per child model.
+        with self.assertNumQueries(3):
+            children = list(Animal.objects.order_by('pk').as_children())
+        self.assertChildren(children, [Animal, Dog, Cat, Dog, Cat])
+
+        children = list(Animal.objects.order_by('-pk').as_children())
+        self.assertEqual([type(child) for child in children], [Cat, Dog, Cat, Dog, Animal])
+
+
+    def test_chunk_size(self):
+        # Chunks [Animal, Dog], [Cat, Dog] and [Cat].
+        with self.assertNumQueries(5):
+            children = list(Animal.objects.order_by('pk').as_children(chunk_size=2))
+        self.assertChildren(children, [Animal, Dog, Cat, Dog, Cat])
+
+
+    def test_missing_child_row(self):
+        orphan = Animal(name='orphan', content_type=Dog.get_content_type())
+        orphan.save()
+
+        children = list(Animal.objects.filter(name='orphan').as_children())
+        self.assertEqual(children, [orphan])
+        self.assertIs(type(children[0]), Animal)
+
+
+    def test_default_manager_is_bypassed(self):
+        Bird(name='hidden', visible=False).save()
+        animal = Animal.objects.get(name='hidden')
+
+        self.assertIs(type(animal.get_child()), Bird)
+        self.assertIs(type(list(Animal.objects.filter(name='hidden').as_children())[0]), Bird)
+
+
+
+class KeysetCursorTest(TestCase):
+    def walk(self, queryset, ordering, page_size=2):
+        """
+        Return the pks of all pages, following the cursors.
+        """
+
+        pks = []
+        cursor = None
+        while True:
+            page = pagination.keyset_order(queryset, ordering)
+            if cursor:
+                value, pk = pagination.decode_cursor(cursor, queryset.model, ordering)
+                page = pagination.keyset_filter(page, ordering, value, pk)
+            rows = list(page[:page_size])
+            pks.extend(row.pk for row in rows)
+            if len(rows) < page_size:
+                return pks
+            cursor = pagination.encode_cursor(rows[-1], ordering)
+
+
+    def test_non_unique_ordering(self):
+        category = Category.objects.create(name='category')
+        for i in range(7):
+            Product.objects.create(name=str(i), category=category,
+                                   price=i % 3, quantity=1)
+
+        expected = list(Product.objects.order_by('-price', '-pk')
+                        .values_list('pk', flat=True))
+        self.assertEqual(self.walk(Product.objects.all(), '-price'), expected)
+
+
+    @skipUnless(hasattr(test_models, 'Document'), 'Needs UUIDField')
+    def test_uuid_pk(self):
+        Document = test_models.Document
+        for i in range(5):
+            Document.objects.create(title=str(i))
+
+        expected = list(Document.objects.order_by('pk').values_list('pk', flat=True))
+        self.assertEqual(self.walk(Document.objects.all(), 'pk'), expected)
+
+
+    def test_invalid_cursor(self):
+        self.assertRaises(Http404, pagination.decode_cursor, 'invalid', Product, 'pk')
+        cursor = pagination.encode_cursor(Note(pk=1, text='x'), 'text')
+        self.assertRaises(Http404, pagination.decode_cursor, cursor, Product, 'price')
+
+
+
+class ListTemplateTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='category')
+        for i in range(3):
+            Product.objects.create(name=str(i), category=category, price=1, quantity=i)
+
+
+    def get_response(self, template_name, **headers):
+        view = views.ListView.as_view(
+            model=Product, keyset_paginate_by=10, template_name=template_name,
+            extra_context={'editable': True, 'update_uri': 'note'})
+        return view(RequestFactory().get('/', **headers))
+
+
+    def render(self, template_name, **headers):
+        return self.get_response(template_name, **headers).render().content.decode('utf-8')
+
+
+    def assertRowsIncluded(self, template_name):
+        page = self.render(template_name)
+        rows = self.render(template_name, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertIn('href="/notes/1/"', rows)
+        self.assertIn(rows.strip(), page)
+        self.assertNotIn('<html>', rows)
+        self.assertNotIn('load-more', rows)
+
+
+    def test_list(self):
+        self.assertRowsIncluded('generics/list.html')
+
+
+    def test_list_table(self):
+        self.assertRowsIncluded('generics/list_table.html')
+
+
+    def test_actions_override(self):
+        # A page template which overrides the actions block, for full pages
+        # and "load more" fragments.
+        for base in ('generics/list.html', 'generics/list_table.html'):
+            tpl = Template('{% extends "' + base + '" %}'
+                           '{% block actions %}<b>{{ item.quantity }}</b>{% endblock %}')
+            for headers in ({}, {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}):
+                context = self.get_response(base, **headers).context_data
+                output = tpl.render(Context(context))
+                self.assertEqual(output.count('<b>'), 3)
+                self.assertIn('<b>2</b>', output)
+                self.assertNotIn('href="/notes/1/"', output)
+                self.assertEqual('<html>' in output, not headers)
+
+
+
+class ExportViewTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='category')
+        for i in range(5):
+            Product.objects.create(name='product {0}'.format(i), category=category,
+                                   price=i % 2, quantity=i)
+
+
+    def export(self, query='', **kwargs):
+        kwargs.setdefault('export_fields', ['name', 'quantity'])
+        kwargs.setdefault('keyset_ordering', 'pk')
+        view = views.ExportView.as_view(model=Product, **kwargs)
+        response = view(RequestFactory().get('/export/' + query))
+        self.assertIsInstance(response, StreamingHttpResponse)
+        return response, list(response.streaming_content)
+
+
+    def test_csv(self):
+        response, chunks = self.export(export_chunk_size=3)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="product.csv"')
+        # The header, and the rows in chunks of export_chunk_size.
+        self.assertEqual([force_text(chunk) for chunk in chunks], [
+            'Name,Quantity\r\n',
+            'product 0,0\r\nproduct 1,1\r\nproduct 2,2\r\n',
+            'product 3,3\r\nproduct 4,4\r\n',
+        ])
+
+
+    def test_csv_non_ascii(self):
+        Product.objects.filter(quantity=4).update(name='caf\xe9 \u2615')
+        response, chunks = self.export()
+        self.assertEqual(b''.join(chunks).decode('utf-8').splitlines()[-1],
+                         'caf\xe9 \u2615,4')
+
+
+    def test_ndjson(self):
+        response, chunks = self.export('?format=ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        lines = b''.join(chunks).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line) for line in lines],
+                         [{'name': 'product {0}'.format(i), 'quantity': i} for i in range(5)])
+
+
+    def test_unsupported_format(self):
+        view = views.ExportView.as_view(model=Product)
+        self.assertRaises(Http404, view, RequestFactory().get('/export/?format=xml'))
+
+
+    def test_chunk_boundaries(self):
+        def quantities(**kwargs):
+            response, chunks = self.export('?format=ndjson', **kwargs)
+            return [json.loads(line)['quantity']
+                    for line in b''.join(chunks).decode('utf-8').splitlines()]
+
+        for size in (1, 2, 4, 5, 6):
+            self.assertEqual(quantities(export_chunk_size=size), list(range(5)))
+
+        # Non-unique ordering: the pk breaks the ties across chunks.
+        for size in (1, 2, 3):
+            self.assertEqual(quantities(export_chunk_size=size, keyset_ordering='price'),
+                             [0, 2, 4, 1, 3])
+            self.assertEqual(quantities(export_chunk_size=size, keyset_ordering='-price'),
+                             [3, 1, 4, 2, 0])
+
+
+    def test_one_query_per_chunk(self):
+        # Two full chunks, and an empty one which ends the export.
+        with self.assertNumQueries(3):
+            self.export(export_chunk_size=2, queryset=Product.objects.filter(quantity__lt=4))
+
+
+
+class TableTest(TestCase):
+    def render(self, rows, **kwargs):
+        return ''.join(html.iter_table(rows, **kwargs))
+
+
+    def test_escaping(self):
+        output = self.render([['<b>', mark_safe('<i>x</i>'), None, 1]])
+        self.assertEqual(output, '<table><tbody><tr><td>&lt;b&gt;</td><td><i>x</i></td>'
+                                 '<td>None</td><td>1</td></tr></tbody></table>')
+
+
+    def test_header_and_attributes(self):
+        output = self.render([], header=['<a>', mark_safe('<b>B</b>')],
+                             attr={'class': 'x"y', 'id': ''})
+        self.assertEqual(output, '<table class="x&quot;y"><thead><tr><th>&lt;a&gt;</th>'
+                                 '<th><b>B</b></th></tr></thead><tbody></tbody></table>')
+
+
+    def test_formatters(self):
+        output = self.render([(1, 2)], formatters={1: lambda value: '<{0}>'.format(value * 10)})
+        self.assertEqual(output, '<table><tbody><tr><td>1</td><td>&lt;20&gt;</td></tr>'
+                                 '</tbody></table>')
+
+
+    def test_generator_in_chunks(self):
+        chunks = list(html.iter_table(((i, i * 2) for i in range(5)), chunk_size=2))
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(chunks[1], '<tr><td>0</td><td>0</td></tr><tr><td>1</td><td>2</td></tr>')
+        self.assertTrue(chunks[-1].endswith('<tr><td>4</td><td>8</td></tr></tbody></table>'))
+
+
+    def test_unevaluated_queryset(self):
+        category = Category.objects.create(name='category')
+        for i in range(3):
+            Product.objects.create(name='<{0}>'.format(i), category=category,
+                                   price=1, quantity=i)
+
+        rows = Product.objects.order_by('pk').values_list('name', 'quantity')
+        with self.assertNumQueries(1):
+            output = self.render(rows)
+        # Read with iterator(), not cached on the queryset.
+        self.assertIsNone(rows._result_cache)
+        self.assertEqual(output.count('<tr>'), 3)
+        self.assertIn('<td>&lt;2&gt;</td><td>2</td>', output)
+
+
+    def test_tag(self):
+        tpl = Template('{% load helpers %}{% table rows header "list" %}')
+        output = tpl.render(Context({'rows': [('<a>', mark_safe('<b>'))], 'header': ['A', 'B']}))
+        self.assertEqual(output, '<table class="list"><thead><tr><th>A</th><th>B</th></tr>'
+                                 '</thead><tbody><tr><td>&lt;a&gt;</td><td><b></td></tr>'
+                                 '</tbody></table>')
+
+
+
+class ReverseCachedTest(TestCase):
+    def setUp(self):
+        urlresolvers.clear_reverse_cache()
+
+
+    def assertSameAsReverse(self, viewname, pk):
+        try:
+            expected = reverse(viewname, kwargs={'pk': pk})
+        except NoReverseMatch:
+            self.assertRaises(NoReverseMatch, urlresolvers.reverse_cached,
+                              viewname, {'pk': pk})
+        else:
+            self.assertEqual(urlresolvers.reverse_cached(viewname, {'pk': pk}), expected)
+
+
+    def test_equivalence(self):
+        for viewname in ('note', 'short', 'nonzero', 'twice', 'ns:note'):
+            for pk in (0, 7, 123, urlresolvers.PK_SENTINEL, '42', 'abc'):
+                self.assertSameAsReverse(viewname, pk)
+
+
+    def test_fast_path(self):
+        def has_fast_path(viewname):
+            reverse_cached = urlresolvers.reverse_cached
+            reverse_cached(viewname, {'pk': 1})
+            return any(key[1] == viewname and pattern is not None
+                       for key, pattern in urlresolvers._pk_patterns.items())
+
+        self.assertTrue(has_fast_path('note'))
+        self.assertTrue(has_fast_path('ns:note'))
+        self.assertFalse(has_fast_path('short'))
+        self.assertFalse(has_fast_path('nonzero'))
+        self.assertFalse(has_fast_path('twice'))
+
+
+
+class CompiledTagTest(TestCase):
+    def compile(self, source):
+        tpl = Template('{% load helpers countdownbox %}' + source)
+        return tpl, tpl.nodelist.get_nodes_by_type(CompiledTagNode)[0]
+
+
+    def test_literals_resolved_at_compile_time(self):
+        tpl, node = self.compile('{% countdown "Launch" "2030-01-01" description=text %}')
+        self.assertEqual(node.literals['name'], 'Launch')
+        self.assertEqual(node.literals['date'], datetime.datetime(2030, 1, 1))
+        self.assertEqual(list(node.variables), ['description'])
+
+        output = tpl.render(Context({'text': 'Soon'}))
+        self.assertIn('<div class="description">Soon</div>', output)
+        self.assertEqual(node._output, {})
+
+
+    def test_literal_output_stored(self):
+        tpl, node = self.compile('{% countdown "Launch" "2030-01-01" %}')
+        output = tpl.render(Context())
+        self.assertIn('<div class="name">Launch</div>', output)
+        self.assertEqual(list(node._output.values())[0][0], output)
+        self.assertEqual(tpl.render(Context()), output)
+
+
+    def test_progressbar_not_stored(self):
+        tpl, node = self.compile('{% countdown "Launch" "2030-01-01" start="2020-01-01" '
+                                 'progressbar=True %}')
+        self.assertIn('class="progress-bar"', tpl.render(Context()))
+        self.assertEqual(node._output, {})
+
+
+    def test_variables_escaped(self):
+        tpl, node = self.compile('{% countdown name "2030-01-01" %}{% link "/a/" text %}')
+        output = tpl.render(Context({'name': '<script>', 'text': mark_safe('<b>A</b>')}))
+        self.assertIn('<div class="name">&lt;script&gt;</div>', output)
+        self.assertIn('<a href="/a/"><b>A</b></a>', output)
+
+        tpl, node = self.compile('{% link url "A" %}')
+        self.assertEqual(tpl.render(Context({'url': '/a/?b=1&c="2"'})),
+                         '<a href="/a/?b=1&amp;c=&quot;2&quot;">A</a>')
+
+        tpl, node = self.compile('{% autoescape off %}{% link "/a/" text %}{% endautoescape %}')
+        self.assertEqual(tpl.render(Context({'text': '<i>'})), '<a href="/a/"><i></a>')
+
+
+    def test_as_var(self):
+        tpl, node = self.compile('{% link "/a/" text as a %}[{{ a }}]')
+        self.assertEqual(tpl.render(Context({'text': '<i>'})),
+                         '[<a href="/a/">&lt;i&gt;</a>]')
+
+
+class DeprecatedNamesTest(TestCase):
+    def test_url_helpers(self):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            self.assertEqual(django_baseline.reverse('note', kwargs={'pk': 1}),
+                             '/notes/1/')
+            url = django_baseline.reverse_lazy('note', kwargs={'pk': 2})
+            self.assertEqual(force_text(url), '/notes/2/')
+            upper = django_baseline.lazy(lambda value: value.upper(), str)
+            self.assertEqual(upper('a'), 'A')
+        self.assertEqual([w.category for w in caught], [DeprecationWarning] * 3)
+        self.assertEqual(caught[0].filename, __file__.replace('.pyc', '.py'))
+
+
+
+class ClassRegistryTest(TestCase):
+    def setUp(self):
+        django_baseline.clear_class_registry()
+        self.addCleanup(django_baseline.clear_class_registry)
+
+
+    def test_resolve_class_memoized(self):
+        self.assertIs(django_baseline.resolve_class('benchmarks.models.Product'), Product)
+        # Resolved classes are read from the registry.
+        django_baseline._class_registry['benchmarks.models.Product'] = Tag
+        self.assertIs(django_baseline.resolve_class('benchmarks.models.Product'), Tag)
+
+        django_baseline.clear_class_registry()
+        self.assertIs(django_baseline.resolve_class('benchmarks.models.Product'), Product)
+        self.assertRaises(AttributeError, django_baseline.resolve_class, 'benchmarks.models.Missing')
+
+
+    @override_settings(BASELINE_PRELOAD_CLASSES=['benchmarks.models.Product',
+                                                 'django_baseline.views.ListView'])
+    def test_warm_class_registry(self):
+        django_baseline.warm_class_registry()
+        self.assertEqual(django_baseline._class_registry, {
+            'benchmarks.models.Product': Product,
+            'django_baseline.views.ListView': views.ListView,
+        })
+
+        django_baseline.warm_class_registry(['benchmarks.models.Tag'])
+        self.assertIs(django_baseline._class_registry['benchmarks.models.Tag'], Tag)
+
+
+    def test_import_does_not_import_django(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(django_baseline.__file__)))
+        output = subprocess.check_output(
+            [sys.executable, '-c', 'import sys, django_baseline; '
+             'print(sorted(name for name in sys.modules if name.split(".")[0] == "django"))'],
+            cwd=root)
+        self.assertEqual(output.strip(), b'[]')
+
+
+
+class RenderTemplateTest(TestCase):
+    def setUp(self):
+        clear_template_cache()
+
+
+    def test_dict(self):
+        self.assertEqual(render_template('fragment.html', {'user': 'u', 'item': 1}), 'u:1\n')
+
+
+    def test_context_is_reused(self):
+        context = Context({'user': 'u'})
+        context.push(item=1)
+        output = render_template(['missing.html', 'fragment.html'], context)
+        self.assertEqual(output, 'u:1\n')
+        self.assertEqual(context.flatten()['item'], 1)
+        context.pop()
+        self.assertNotIn('item', context)
+
+
+    def test_fragment_renderer(self):
+        renderer = FragmentRenderer({'user': 'u'})
+        output = [renderer.render('fragment.html', {'item': item}) for item in (1, 2)]
+        self.assertEqual(output, ['u:1\n', 'u:2\n'])
+        self.assertEqual(renderer.render('fragment.html'), 'u:\n')
+
+
+
+order_create = views.FormSetCreateView.as_view(
+    model=Order, factory_extra_args=ORDER_FORMSET_ARGS, success_url='/done/')
+order_update = views.FormSetUpdateView.as_view(
+    model=Order, factory_extra_args=ORDER_FORMSET_ARGS, success_url='/done/')
+
+
+class FormSetViewTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='category')
+        self.product = Product.objects.create(name='product', category=category,
+                                              price=1, quantity=1)
+
+
+    def call(self, view, data=None, **kwargs):
+        """
+        Call view without rendering the response, the templates are not
+        under test.
+        """
+
+        factory = RequestFactory()
+        request = factory.post('/', data) if data is not None else factory.get('/')
+        request._messages = CookieStorage(request)
+        return view(request, **kwargs)
+
+
+    def get_prefixes(self, view, **kwargs):
+        response = self.call(view, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return dict((name, formset.prefix)
+                    for name, formset in response.context_data['fieldsets'])
+
+
+    def management_form(self, prefix, total, initial=0):
+        return {
+            prefix + '-TOTAL_FORMS': str(total),
+            prefix + '-INITIAL_FORMS': str(initial),
+            prefix + '-MIN_NUM_FORMS': '0',
+            prefix + '-MAX_NUM_FORMS': '1000',
+        }
+
+
+    def test_create(self):
+        prefixes = self.get_prefixes(order_create)
+        data = {'name': 'order'}
+        data.update(self.management_form(prefixes['tags'], 1))
+        data[prefixes['tags'] + '-0-name'] = 'tag'
+        data.update(self.management_form(prefixes['products'], 1))
+        data[prefixes['products'] + '-0-product'] = str(self.product.pk)
+        data[prefixes['products'] + '-0-quantity'] = '2'
+
+        response = self.call(order_create, data)
+        self.assertEqual(response.status_code, 302)
+        order = Order.objects.get()
+        self.assertEqual([tag.name for tag in order.tags.all()], ['tag'])
+        self.assertEqual(OrderLine.objects.get(order=order).quantity, 2)
+
+
+    def test_update(self):
+        order = Order.objects.create(name='order')
+        tag = Tag.objects.create(name='tag')
+        order.tags.add(tag)
+        line = OrderLine.objects.create(order=order, product=self.product, quantity=1)
+
+        prefixes = self.get_prefixes(order_update, pk=order.pk)
+        tags, products = prefixes['tags'], prefixes['products']
+        data = {'name': 'changed'}
+        data.update(self.management_form(tags, 2, 1))
+        data.update({tags + '-0-id': str(tag.pk), tags + '-0-name': 'renamed',
+                     tags + '-1-name': 'new'})
+        data.update(self.management_form(products, 1, 1))
+        data.update({products + '-0-id': str(line.pk),
+                     products + '-0-order': str(order.pk),
+                     products + '-0-product': str(self.product.pk),
+                     products + '-0-quantity': '5'})
+
+        response = self.call(order_update, data, pk=order.pk)
+        self.assertEqual(response.status_code, 302)
+        order = Order.objects.get()
+        self.assertEqual(order.name, 'changed')
+        self.assertEqual(sorted(tag.name for tag in order.tags.all()), ['new', 'renamed'])
+        self.assertEqual(OrderLine.objects.get().quantity, 5)
+
+
+    def test_form_without_helper_is_rendered(self):
+        response = self.call(order_create).render()
+        content = response.content.decode('utf-8')
+        self.assertIn('name="name"', content)
+        self.assertEqual(content.count('<form'), 1)
+
+
+    def test_default_formset_kwargs(self):
+        request = RequestFactory().post('/', {'name': 'order'})
+        view = views.FormSetCreateView(model=Order, request=request, kwargs={})
+
+        kwargs = views.FormSetMixin.get_formset_kwargs(view, Order._meta.get_field('tags'))
+        self.assertEqual(kwargs['prefix'], 'tags')
+        self.assertIs(kwargs['data'], request.POST)
+        self.assertIs(kwargs['files'], request.FILES)
+
+        kwargs = views.FormSetMixin.get_formset_kwargs(view, Order._meta.get_field('products'))
+        self.assertNotIn('prefix', kwargs)
+        self.assertIs(kwargs['data'], request.POST)
+
+
+    def test_get_queries(self):
+        order = Order.objects.create(name='order')
+        order.tags.add(Tag.objects.create(name='tag'))
+        OrderLine.objects.create(order=order, product=self.product, quantity=1)
+
+        # The order with its tags (prefetched on Django >= 1.9), and the
+        # order lines. The hidden pks and the product text inputs do not load
+        # their tables.
+        with self.assertNumQueries(3):
+            content = self.call(order_update, pk=order.pk).render().content
+        self.assertNotIn(b'<option', content)
+
+        with self.assertNumQueries(0):
+            self.call(order_create).render()
+
+
+    def test_select_choices_queried_once(self):
+        view = views.FormSetCreateView.as_view(
+            model=Order, factory_extra_args={'tags': {'fields': ['name']},
+                                             'products': {'fields': ['product', 'quantity']}})
+        Product.objects.create(name='other', category=self.product.category,
+                               price=1, quantity=1)
+
+        with self.assertNumQueries(1):
+            content = self.call(view).render().content.decode('utf-8')
+        # Three extra rows, each with the empty choice and two products.
+        self.assertEqual(content.count('<option'), 9)
+
+
+    def test_post_queries(self):
+        prefixes = self.get_prefixes(order_create)
+        data = {'name': 'order'}
+        data.update(self.management_form(prefixes['tags'], 2))
+        data.update(self.management_form(prefixes['products'], 2))
+        for i in range(2):
+            data['{0}-{1}-name'.format(prefixes['tags'], i)] = 'tag'
+            data['{0}-{1}-product'.format(prefixes['products'], i)] = str(self.product.pk)
+            data['{0}-{1}-quantity'.format(prefixes['products'], i)] = '2'
+
+        # Validating the two products, and saving the order, the tags, their
+        # m2m rows and the order lines. No choices are loaded.
+        with self.assertNumQueries(12):
+            response = self.call(order_create, data)
+        self.assertEqual(response.status_code, 302)
+
+
+    def test_invalid_formset(self):
+        prefixes = self.get_prefixes(order_create)
+        data = {'name': 'order'}
+        data.update(self.management_form(prefixes['tags'], 0))
+        data.update(self.management_form(prefixes['products'], 1))
+        data[prefixes['products'] + '-0-product'] = str(self.product.pk)
+        data[prefixes['products'] + '-0-quantity'] = 'many'
+
+        response = self.call(order_create, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Order.objects.exists())
+
+
+
+INLINE_HOOKS = 'django_baseline.hooks.InlineHookBackend'
+
+
+class HookedOrderCreateView(views.FormSetCreateView):
+    model = Order
+    factory_extra_args = ORDER_FORMSET_ARGS
+    success_url = '/done/'
+    defer_hooks = True
+
+    saved_tags = []
+
+    def post_save(self, instance):
+        self.saved_tags.append(sorted(tag.name for tag in instance.tags.all()))
+
+
+class HookTest(TransactionTestCase):
+    def test_backend_follows_settings(self):
+        with override_settings(BASELINE_HOOK_BACKEND=INLINE_HOOKS):
+            self.assertIsInstance(hooks.get_backend(), hooks.InlineHookBackend)
+        self.assertIsInstance(hooks.get_backend(), hooks.LocalHookBackend)
+
+
+    @override_settings(BASELINE_HOOK_BACKEND=INLINE_HOOKS)
+    def test_deferred_until_commit(self):
+        calls = []
+        with hooks.atomic():
+            hooks.defer(calls.append, 1)
+            self.assertEqual(calls, [])
+        self.assertEqual(calls, [1])
+
+        try:
+            with hooks.atomic():
+                hooks.defer(calls.append, 2)
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertEqual(calls, [1])
+
+
+    @override_settings(BASELINE_HOOK_BACKEND=INLINE_HOOKS)
+    def test_formset_view_post_save(self):
+        data = {
+            'name': 'order',
+            'tags-TOTAL_FORMS': '1', 'tags-INITIAL_FORMS': '0',
+            'tags-0-name': 'tag',
+            'orderline_set-TOTAL_FORMS': '0', 'orderline_set-INITIAL_FORMS': '0',
+        }
+        request = RequestFactory().post('/', data)
+        request._messages = CookieStorage(request)
+        del HookedOrderCreateView.saved_tags[:]
+
+        response = HookedOrderCreateView.as_view()(request)
+        self.assertEqual(response.status_code, 302)
+        # The formsets are saved before post_save runs.
+        self.assertEqual(HookedOrderCreateView.saved_tags, [['tag']])
+
+
+
+class NameForm(CrispyForm):
+    name = forms.CharField()
+
+    @classmethod
+    def build_helper(cls):
+        helper = super(NameForm, cls).build_helper()
+        helper.layout = Layout('name')
+        return helper
+
+
+class SharedHelperTest(TestCase):
+    def test_changes_do_not_leak(self):
+        form = NameForm()
+        form.helper.form_action = '/changed/'
+        form.helper.add_input(Submit('other', 'Other'))
+        form.helper.layout.append('other')
+
+        shared = NameForm.get_shared_helper()
+        for helper in (shared, NameForm().helper):
+            self.assertNotEqual(helper.form_action, '/changed/')
+            self.assertEqual(len(helper.inputs), 1)
+            self.assertEqual(len(helper.layout.fields), 1)
+
+
+    def test_rendering_does_not_copy(self):
+        form = NameForm()
+        helper = form.helper
+        self.assertIsInstance(helper, FormHelper)
+        self.assertIsInstance(helper.layout, Layout)
+        self.assertEqual(len(helper.layout), 1)
+        self.assertEqual(helper.form_method, 'post')
+
+        html = Template('{% load crispy_forms_tags %}{% crispy form %}').render(
+            Context({'form': form}))
+        self.assertIn('name="name"', html)
+        self.assertIn('name="submit"', html)
+        self.assertFalse(form.has_own_helper())
+
+        views.FormSetCreateView(model=Order).get_form_crispy_helper(form)
+        self.assertFalse(form.has_own_helper())
+
+
+    def test_form_crispy_helper(self):
+        get_helper = views.FormSetCreateView(model=Order).get_form_crispy_helper
+
+        form = NameForm()
+        helper = get_helper(form)
+        self.assertFalse(helper.form_tag)
+        self.assertEqual(len(helper.layout), 1)
+        self.assertTrue(form.helper.form_tag)
+        self.assertFalse(form.has_own_helper())
+
+        # A helper without a layout is falsy, it is still used.
+        form = forms.Form()
+        form.helper = FormHelper()
+        form.helper.form_id = 'plain'
+        helper = get_helper(form)
+        self.assertEqual((helper.form_id, helper.form_tag), ('plain', False))
+        self.assertTrue(form.helper.form_tag)
+
+        form.helper.form_tag = False
+        self.assertIs(get_helper(form), form.helper)
+        self.assertFalse(get_helper(forms.Form()).form_tag)
+
+
+    def test_changes_copy(self):
+        shared = NameForm.get_shared_helper()
+        changes = [
+            lambda helper: setattr(helper, 'form_id', 'changed'),
+            lambda helper: helper.add_input(Submit('other', 'Other')),
+            lambda helper: helper.inputs.append(Submit('other', 'Other')),
+            lambda helper: helper.layout.append('other'),
+            lambda helper: helper.layout.fields.append('other'),
+        ]
+        for change in changes:
+            form = NameForm()
+            helper = form.helper
+            change(helper)
+            self.assertTrue(form.has_own_helper())
+            self.assertIsNot(form.helper, shared)
+            # The proxy follows the copy.
+            self.assertEqual((helper.form_id, len(helper.inputs), len(helper.layout)),
+                             (form.helper.form_id, len(form.helper.inputs),
+                              len(form.helper.layout)))
+        self.assertEqual(shared.form_id, '')
+        self.assertEqual(len(shared.inputs), 1)
+        self.assertEqual(len(shared.layout), 1)
+
+
+    def test_assigned_helper(self):
+        form = NameForm()
+        proxy = form.helper
+        helper = FormHelper()
+        form.helper = helper
+        self.assertIs(form.helper, helper)
+        self.assertTrue(form.has_own_helper())
+        self.assertEqual(proxy.inputs, [])
+
+
+    def test_copy(self):
+        form = NameForm()
+        for copied in (copy.copy(form.helper), copy.deepcopy(form.helper),
+                       pickle.loads(pickle.dumps(form.helper))):
+            self.assertIs(type(copied), FormHelper)
+            self.assertEqual(len(copied.layout), 1)
+            copied.form_id = 'copied'
+            copied.layout.append('other')
+            self.assertFalse(form.has_own_helper())
+
+        self.assertIs(type(copy.deepcopy(form.helper.layout)), Layout)
+        form.helper.form_id = 'changed'
+        self.assertEqual(copy.copy(form.helper).form_id, 'changed')
+        self.assertEqual(len(NameForm.get_shared_helper().layout), 1)
+
+
+    def test_default_helper(self):
+        class PlainForm(SharedHelperMixin, forms.Form):
+            pass
+
+        self.assertIsInstance(PlainForm().helper, FormHelper)
+
+
+    def test_form_cache_key(self):
+        self.assertIsNotNone(formcache.get_cache_key(NameForm()))
+        form = NameForm()
+        form.helper.form_action = '/changed/'
+        self.assertIsNone(formcache.get_cache_key(form))
+
+
+    def test_cached_render_uses_shared_helper(self):
+        form = NameForm()
+        html = formcache.render_form(form, Context({'csrf_token': 'token'}))
+        self.assertIn('name="name"', html)
+        self.assertIn('token', html)
+        self.assertFalse(form.has_own_helper())
+
+
+    def make_form(self, **state):
+        form = NameForm()
+        for name, value in state.items():
+            setattr(form.fields['name'], name, value)
+        return form
+
+
+    def render_form(self, **state):
+        return formcache.render_form(self.make_form(**state), Context({'csrf_token': 'token'}))
+
+
+    def test_per_instance_field_state(self):
+        plain = self.render_form()
+        self.assertNotIn(' required ', self.render_form(required=False))
+        self.assertEqual(self.render_form(), plain)
+
+        key = formcache.get_cache_key(self.make_form())
+        for name, value in (('label_suffix', '!'), ('localize', True),
+                            ('show_hidden_initial', True)):
+            self.assertNotEqual(formcache.get_cache_key(self.make_form(**{name: value})), key)
+        self.assertNotEqual(formcache.get_cache_key(NameForm(label_suffix='?')), key)
+
+
+    @skipUnless(django.VERSION >= (1, 9), 'Field.disabled is new in Django 1.9')
+    def test_disabled_field_state(self):
+        plain = self.render_form()
+        self.assertNotIn('disabled', plain)
+        self.assertIn('disabled', self.render_form(disabled=True))
+        self.assertEqual(self.render_form(), plain)
+
+
+
+class JSONTest(TestCase):
+    def dumps(self):
+        form = NameForm({})
+        self.assertFalse(form.is_valid())
+        data = jsonutils.dumps({'label': ugettext_lazy('Name'), 'errors': form.errors,
+                                'list': form.errors['name'], 'price': Decimal('1.50')})
+        self.assertIsInstance(data, bytes)
+        self.assertNotIn(b' ', data.replace(b'This field is required.', b''))
+        self.assertEqual(json.loads(data.decode('utf-8')), {
+            'label': 'Name',
+            'errors': {'name': ['This field is required.']},
+            'list': ['This field is required.'],
+            'price': '1.50',
+        })
+
+
+    @skipUnless(jsonutils.orjson is not None, 'needs orjson')
+    def test_orjson(self):
+        self.assertEqual(jsonutils.get_encoder(), 'orjson')
+        self.dumps()
+
+
+    @skipUnless(jsonutils.orjson is not None, 'needs orjson')
+    def test_orjson_matches_json(self):
+        when = datetime.datetime(2020, 1, 2, 3, 4, 5, 678901)
+        data = {
+            'datetime': when,
+            'utc': when.replace(tzinfo=utc),
+            'date': when.date(),
+            'time': when.time(),
+            'price': Decimal('1.50'),
+            'safe': mark_safe('<b>'),
+            'keys': {2: 'int', None: 'none', True: 'bool', mark_safe('safe'): 'str'},
+        }
+        with override_settings(BASELINE_JSON_ENCODER='json'):
+            expected = jsonutils.dumps(data)
+        with override_settings(BASELINE_JSON_ENCODER='orjson'):
+            self.assertEqual(json.loads(jsonutils.dumps(data).decode('utf-8')),
+                             json.loads(expected.decode('utf-8')))
+        self.assertIn(b'"2020-01-02T03:04:05.678"', expected)
+
+
+    def test_without_orjson(self):
+        self.addCleanup(setattr, jsonutils, 'orjson', jsonutils.orjson)
+        jsonutils.orjson = None
+        self.assertEqual(jsonutils.get_encoder(), 'json')
+        self.dumps()
+
+
+    @override_settings(BASELINE_JSON_ENCODER='json')
+    def test_forced_stdlib(self):
+        self.assertEqual(jsonutils.get_encoder(), 'json')
+        self.dumps()
+
+
+    def response(self, size, accept=None):
+        headers = {'HTTP_ACCEPT_ENCODING': accept} if accept else {}
+        view = views.JSONResponseMixin()
+        view.json_gzip_min_length = 100
+        view.request = RequestFactory().get('/', **headers)
+        # The encoded list is size bytes long.
+        return view.render_to_json_response(['x' * (size - 4)])
+
+
+    def test_gzip(self):
+        response = self.response(100, 'deflate, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        content = gzip.GzipFile(fileobj=io.BytesIO(response.content)).read()
+        self.assertEqual(json.loads(content.decode('utf-8')), ['x' * 96])
+
+
+    def test_gzip_not_accepted(self):
+        response = self.response(100)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(len(response.content), 100)
+
+
+    def test_below_min_length(self):
+        response = self.response(99, 'gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertFalse(response.has_header('Vary'))
+        self.assertEqual(len(response.content), 99)
+
+
+
+class FieldPlanTest(TestCase):
+    def test_auto_created_fields_are_skipped(self):
+        names = [entry[0] for entry in views.get_field_plan(Dog).entries]
+        self.assertEqual(names, ['content_type', 'name', 'barks'])
+
+
+    def test_values_by_name(self):
+        user = User.objects.create_user('owner', 'owner@example.com', 'pw')
+        note = Note.objects.create(user=user, text='note')
+
+        values = views.get_field_plan(Note).get_values(note)
+        self.assertEqual(list(values), ['user', 'text'])
+        self.assertEqual(values['text'], ('Text', 'note'))
+
+
+
+class ColumnTotalsTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='category')
+        for i in range(1, 4):
+            Product.objects.create(name=str(i), category=category, price=i, quantity=i)
+
+
+    def get_totals(self, queryset):
+        view = views.ListView(model=Product, column_totals={'quantity': 'sum'})
+        return view.get_column_totals(queryset)
+
+
+    def test_whole_queryset(self):
+        self.assertEqual(self.get_totals(Product.objects.order_by('pk')), {'quantity': 6})
+
+
+    def test_sliced_queryset(self):
+        self.assertEqual(self.get_totals(Product.objects.order_by('-pk')[:2]), {'quantity': 5})
+
+
+    def test_list(self):
+        self.assertEqual(self.get_totals(list(Product.objects.all())), None)
+
+
+
+class AttrFilterTest(TestCase):
+    def test_lookup(self):
+        from django_baseline.templatetags.helpers import attr
+
+        product = Product(name='name', price=1, quantity=2)
+        self.assertEqual(attr(product, 'quantity'), 2)
+        self.assertEqual(attr({'quantity': 3}, 'quantity'), 3)
+        self.assertEqual(attr(product, 'missing'), '')
+        self.assertEqual(attr(product, '_meta'), '')
+        self.assertEqual(attr(product, '__class__'), '')
+        # Called like template variables, unless they alter data.
+        self.assertEqual(attr(product, 'clean'), None)
+        self.assertEqual(attr(product, 'serializable_value'), '')
+        self.assertEqual(attr(product, 'delete'), '')
+        self.assertEqual(attr(product, 'save'), '')
+
+
+
+class BundleTest(TestCase):
+    def setUp(self):
+        self.bundle_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.bundle_dir)
+        self.addCleanup(bundles.clear_manifest_cache)
+
+
+    def test_files_without_manifest(self):
+        with override_settings(BASELINE_BUNDLE_DIR=self.bundle_dir):
+            self.assertEqual(bundles.static_urls('baseline.js'), [
+                '/static/baseline/baseline.js',
+                '/static/baseline/js/jquery.serializeobject.js',
+                '/static/baseline/js/django-ajax.js',
+            ])
+            self.assertEqual(bundles.static_urls('baseline/baseline.css'),
+                             ['/static/baseline/baseline.css'])
+            self.assertEqual(bundles.static_urls('//cdn.example.com/a.js'),
+                             ['//cdn.example.com/a.js'])
+
+
+    def test_built_bundle(self):
+        with override_settings(BASELINE_BUNDLE_DIR=self.bundle_dir):
+            manifest = bundles.build()
+            path = manifest['baseline.js']
+            self.assertEqual(bundles.static_urls('baseline.js'), ['/static/' + path])
+
+            with io.open(os.path.join(self.bundle_dir, path), encoding='utf-8') as f:
+                content = f.read()
+        if bundles.rjsmin is None:
+            # Concatenated unchanged.
+            self.assertEqual(content, bundles.build_bundle(
+                'baseline.js', bundles.DEFAULT_BUNDLES['baseline.js'], minify=False))
+
+
+
+class Failing(object):
+    def fail(self):
+        raise ValueError('failed')
+
+
+class AssetsTest(TestCase):
+    def render(self, source, **context):
+        return Template('{% load helpers %}' + source).render(Context(context))
+
+
+    def test_placement_and_deduplication(self):
+        output = self.render(
+            '{% assets %}<head>{% assets_css %}{% assets_preload %}</head>'
+            '{% cssfile "/a.css" %}{% jsfile "/a.js" %}{% jsfile "/b.js" %}'
+            '{% jsfile "/a.js" %}{% cssfile "/a.css" %}<body>{% assets_js %}</body>'
+            '{% endassets %}')
+        self.assertEqual(output,
+            '<head><link href="/a.css" rel="stylesheet">'
+            '<link rel="preload" href="/a.js" as="script">'
+            '<link rel="preload" href="/b.js" as="script"></head>'
+            '<body><script type="text/javascript" src="/a.js" defer></script>'
+            '<script type="text/javascript" src="/b.js" defer></script></body>')
+
+
+    def test_nodefer(self):
+        output = self.render('{% assets %}{% jsfile "/a.js" %}{% assets_js "nodefer" %}{% endassets %}')
+        self.assertEqual(output, '<script type="text/javascript" src="/a.js"></script>')
+
+
+    def test_outside_of_block(self):
+        self.assertEqual(self.render('{% jsfile "/a.js" %}'),
+                         '<script type="text/javascript" src="/a.js"></script>')
+
+
+    def test_include(self):
+        included = Template('{% load helpers %}{% jsfile "/included.js" %}<included>')
+        output = self.render('{% assets %}{% include included %}{% assets_js %}{% endassets %}',
+                             included=included)
+        self.assertEqual(output, '<included><script type="text/javascript" '
+                                 'src="/included.js" defer></script>')
+
+
+    @skipUnless(django.VERSION >= (1, 9), 'needs Engine libraries')
+    def test_inclusion_tag(self):
+        from django.template import Engine
+
+        engine = Engine(libraries={'helpers': 'django_baseline.templatetags.helpers',
+                                   'baseline_tests': 'django_baseline.tests'})
+        tpl = engine.from_string('{% load helpers baseline_tests %}'
+                                 '{% assets %}{% widget %}{% assets_js %}{% endassets %}')
+        self.assertEqual(tpl.render(Context()), '<widget><script type="text/javascript" '
+                                                'src="/widget.js" defer></script>')
+
+
+    def test_nested_blocks(self):
+        output = self.render(
+            '{% assets %}{% jsfile "/a.js" %}'
+            '{% assets %}{% jsfile "/b.js" %}{% jsfile "/a.js" %}{% endassets %}'
+            '{% assets_js %}{% endassets %}')
+        self.assertEqual(output, '<script type="text/javascript" src="/a.js" defer></script>'
+                                 '<script type="text/javascript" src="/b.js" defer></script>')
+
+
+    def test_collector_is_unbound(self):
+        self.render('{% assets %}{% jsfile "/a.js" %}{% endassets %}')
+        self.assertIsNone(assets.get_collector())
+
+        self.assertRaises(ValueError, self.render,
+                          '{% assets %}{% jsfile "/a.js" %}{{ failing.fail }}{% endassets %}',
+                          failing=Failing())
+        self.assertIsNone(assets.get_collector())
+        self.assertEqual(self.render('{% jsfile "/a.js" %}'),
+                         '<script type="text/javascript" src="/a.js"></script>')
+
+
+
+class ThumbnailTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.addCleanup(thumbnails.clear_image_cache)
+
+        self.media = os.path.join(self.root, 'media')
+        os.makedirs(os.path.join(self.media, 'photos'))
+        self.write(os.path.join(self.media, 'photos', 'inside.png'))
+        self.write(os.path.join(self.root, 'secret.png'))
+
+        overrides = override_settings(MEDIA_ROOT=self.media, MEDIA_URL='/media/',
+                                      BASELINE_THUMBNAIL_DIR=os.path.join(self.root, 'thumbnails'),
+                                      BASELINE_THUMBNAIL_WIDTHS=(10,))
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+
+    def write(self, path):
+        if thumbnails.Image is not None:
+            thumbnails.Image.new('RGB', (40, 20)).save(path, 'PNG')
+        else:
+            with open(path, 'wb') as f:
+                f.write(b'png')
+
+
+    def test_find_source(self):
+        self.assertEqual(thumbnails.find_source('/media/photos/inside.png'),
+                         os.path.join(self.media, 'photos', 'inside.png'))
+        self.assertEqual(thumbnails.find_source('/media/photos/missing.png'), None)
+        self.assertEqual(thumbnails.find_source('http://example.com/a.png'), None)
+
+
+    def test_paths_outside_media_root(self):
+        from django.core.exceptions import SuspiciousFileOperation
+
+        self.assertRaises(SuspiciousFileOperation, thumbnails.find_source,
+                          '/media/../secret.png')
+        self.assertRaises(SuspiciousFileOperation, thumbnails.find_source,
+                          '/media/photos/../../secret.png')
+
+
+    @skipUnless(hasattr(os, 'symlink'), 'needs symbolic links')
+    def test_symlink_outside_media_root(self):
+        from django.core.exceptions import SuspiciousFileOperation
+
+        os.symlink(os.path.join(self.root, 'secret.png'),
+                   os.path.join(self.media, 'photos', 'link.png'))
+        self.assertRaises(SuspiciousFileOperation, thumbnails.find_source,
+                          '/media/photos/link.png')
+
+
+    def test_img_outside_media_root(self):
+        self.assertEqual(thumbnails.get_image('/media/../secret.png'), None)
+        output = Template('{% load helpers %}{% img "/media/../secret.png" %}').render(Context())
+        self.assertEqual(output, '<img src="/media/../secret.png"></img>')
+
+
+    def test_lazy_is_opt_in(self):
+        tpl = Template('{% load helpers %}{% img "http://example.com/a.png" %}'
+                       '{% img "http://example.com/b.png" lazy=True %}')
+        eager, lazy = tpl.render(Context()).split('</img>')[:2]
+        self.assertNotIn('loading', eager)
+        self.assertIn('loading="lazy"', lazy)
+
+
+    @skipUnless(thumbnails.Image is not None, 'needs Pillow')
+    def test_decompression_bomb(self):
+        Image = thumbnails.Image
+        self.addCleanup(setattr, Image, 'MAX_IMAGE_PIXELS', Image.MAX_IMAGE_PIXELS)
+        # The 800 pixels of the image are more than twice the limit.
+        Image.MAX_IMAGE_PIXELS = 100
+        # The error is logged.
+        self.addCleanup(setattr, thumbnails.logger, 'disabled', False)
+        thumbnails.logger.disabled = True
+
+        output = Template('{% load helpers %}{% img "/media/photos/inside.png" %}').render(Context())
+        self.assertEqual(output, '<img src="/media/photos/inside.png"></img>')
+
+
+    def test_image_cache_is_bounded(self):
+        self.addCleanup(setattr, thumbnails, 'MAX_ENTRIES', thumbnails.MAX_ENTRIES)
+        thumbnails.MAX_ENTRIES = 3
+        for i in range(10):
+            thumbnails.get_image('http://example.com/{0}.png'.format(i))
+            self.assertLessEqual(len(thumbnails._images), 3)
+
+
+    @skipUnless(thumbnails.Image is not None, 'needs Pillow')
+    def test_srcset_stored_on_node(self):
+        calls = []
+        get_image = thumbnails.get_image
+
+        def counting_get_image(url):
+            calls.append(url)
+            return get_image(url)
+
+        thumbnails.get_image = counting_get_image
+        self.addCleanup(setattr, thumbnails, 'get_image', get_image)
+
+        tpl = Template('{% load helpers %}{% img "/media/photos/inside.png" %}')
+        first = tpl.render(Context())
+        self.assertEqual(tpl.render(Context()), first)
+        self.assertEqual(len(calls), 1)
+        self.assertIn('srcset="/media/thumbnails/', first)
+        self.assertIn('width="40"', first)
+
+
+
+class BatchViewTest(TestCase):
+    # Accepted as cookie and header by all supported Django versions.
+    token = 'a' * 32
+
+
+    def post(self, requests, cookies=None):
+        cookies = dict(cookies or {}, csrftoken=self.token)
+        request = RequestFactory().post(
+            '/batch/', json.dumps({'requests': requests}), content_type='application/json',
+            HTTP_COOKIE='; '.join('{0}={1}'.format(k, v) for k, v in cookies.items()),
+            HTTP_X_CSRFTOKEN=self.token)
+        response = views.BatchView.as_view()(request)
+        return response.status_code, json.loads(response.content.decode('utf-8'))
+
+
+    def batch(self, requests, cookies=None):
+        status, content = self.post(requests, cookies)
+        self.assertEqual(status, 200)
+        return content['responses']
+
+
+    def test_permissions(self):
+        self.assertEqual(self.batch([{'url': '/private/'}])[0]['status'], 403)
+
+        User.objects.create_user('owner', 'owner@example.com', 'pw')
+        self.assertTrue(self.client.login(username='owner', password='pw'))
+        session = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+
+        response = self.batch([{'url': '/private/'}],
+                              {settings.SESSION_COOKIE_NAME: session})[0]
+        self.assertEqual(response['status'], 200)
+        self.assertEqual(response['body'], 'owner')
+
+
+    def test_csrf_checked_per_request(self):
+        request = RequestFactory().post(
+            '/batch/', json.dumps({'requests': []}), content_type='application/json')
+        response = views.BatchView.as_view()(request)
+        self.assertEqual(response.status_code, 403)
+
+
+    def test_rollback(self):
+        responses = self.batch([
+            {'method': 'POST', 'url': '/create/', 'data': 'name=kept'},
+            {'method': 'POST', 'url': '/create/', 'data': 'name=status&fail=status'},
+            {'method': 'POST', 'url': '/create/', 'data': 'name=exception&fail=exception'},
+        ])
+        self.assertEqual([response['status'] for response in responses], [200, 503, 500])
+        self.assertEqual(list(Category.objects.values_list('name', flat=True)), ['kept'])
+
+
+    def test_streaming_rejected(self):
+        response = self.batch([{'url': '/stream/'}])[0]
+        self.assertEqual(response['status'], 501)
+        self.assertFalse(Category.objects.exists())
+
+
+    def test_redirect_followed(self):
+        responses = self.batch([
+            {'method': 'POST', 'url': '/create/', 'data': 'name=new&next=/notes/3/'},
+            {'method': 'POST', 'url': '/create/', 'data': 'name=other&next=http://example.com/'},
+        ])
+        self.assertEqual(responses[0]['status'], 200)
+        self.assertEqual(responses[0]['body'], '3')
+        self.assertEqual(responses[1]['status'], 302)
+        self.assertEqual(Category.objects.count(), 2)
+
+
+    def test_malformed_requests(self):
+        for requests in (['x'], [None], [{'url': '/create/', 'data': 5}],
+                         [{'url': '/create/', 'data': ['a']}], {'url': '/create/'}):
+            self.assertEqual(self.post(requests), (400, {'error': 'invalid_batch'}))
+        self.assertFalse(Category.objects.exists())
+
+        response = self.batch([{'method': 'POST', 'url': '/create/', 'data': {'name': 'dict'}}])
+        self.assertEqual(response[0]['body'], 'created')
+
+
+    def test_nested_batch(self):
+        response = self.batch([{'method': 'POST', 'url': '/batch/', 'data': '{}'}])[0]
+        self.assertEqual(response['status'], 400)
+
+
+
+class QueryBudgetTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='category')
+        for i in range(3):
+            Product.objects.create(name=str(i), category=category, price=1, quantity=1)
+
+
+    def test_reported_after_rendering(self):
+        view = views.ListView.as_view(model=Product)
+        with querycount.capture_query_reports() as reports:
+            response = view(RequestFactory().get('/'))
+            self.assertEqual(reports, [])
+
+            # Like process_template_response middleware.
+            response.context_data['object_list'] = Product.objects.filter(name='1')
+            response.render()
+
+        self.assertEqual(len(reports), 1)
+        # The query of the list runs while rendering.
+        self.assertEqual(reports[0].count, 1)
+        content = response.content.decode('utf-8')
+        self.assertIn('<span class="name">1</span>', content)
+        self.assertNotIn('<span class="name">2</span>', content)
+
+
+    def test_never_rendered(self):
+        view = views.ListView.as_view(model=Product)
+        with querycount.capture_query_reports() as reports:
+            response = view(RequestFactory().get('/'))
+            response.close()
+        self.assertEqual(reports, [])
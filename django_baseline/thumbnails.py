@@ -0,0 +1,304 @@
+"""
+Resized variants of local images for the srcset of the img tag.
+
+get_image() returns the size of an image and urls of variants resized to
+BASELINE_THUMBNAIL_WIDTHS (only the ones smaller than the image). Missing
+variants are created with Pillow on first use and stored in
+BASELINE_THUMBNAIL_DIR (default: MEDIA_ROOT/thumbnails), served from
+BASELINE_THUMBNAIL_URL (default: MEDIA_URL + 'thumbnails/'). File names
+contain a hash of the source path and modification time, so changed
+images get new variants.
+
+The directory is limited to BASELINE_THUMBNAIL_CACHE_SIZE bytes. When it
+is exceeded, the least recently used variants are deleted. Variants in use
+are touched when they are revalidated, at most every CHECK_INTERVAL
+seconds per process.
+
+Source images are only read below MEDIA_ROOT, STATIC_ROOT and the static
+file dirs. Without Pillow, for remote urls and for paths outside of these
+directories, get_image() returns None and the img tag outputs a plain
+image. So does an image which can not be read, like one Pillow refuses
+as a decompression bomb.
+
+Variants are resized outside of any lock. Concurrent renders of a new
+image may resize it more than once, but each variant is written to a
+temporary file and renamed, so no half written file is served.
+"""
+
+from __future__ import unicode_literals
+
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils._os import safe_join
+
+from django_baseline import get_config
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+DEFAULT_WIDTHS = (320, 640, 1024, 1600)
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+
+# Seconds before a process checks again that the source is unchanged and
+# its variants exist.
+CHECK_INTERVAL = 60
+
+# Formats which can be resized without losing anything (like animation).
+RESIZABLE_FORMATS = ('JPEG', 'PNG', 'WEBP')
+
+# Maximum number of urls in _images, it is emptied when exceeded.
+MAX_ENTRIES = 10000
+
+logger = logging.getLogger('django_baseline.thumbnails')
+
+# url -> (ImageInfo or None, time of the last check)
+_images = {}
+# Guards _cache_size and eviction.
+_lock = threading.Lock()
+# Bytes in the thumbnail dir, None until counted.
+_cache_size = None
+
+
+class ImageInfo(object):
+    def __init__(self, path, mtime, width, height, variants):
+        self.path = path
+        self.mtime = mtime
+        self.width = width
+        self.height = height
+        # (url, width, file path) tuples, smallest first.
+        self.variants = variants
+
+
+def get_thumbnail_dir():
+    return (get_config('BASELINE_THUMBNAIL_DIR', None) or
+            os.path.join(settings.MEDIA_ROOT, 'thumbnails'))
+
+
+def get_thumbnail_url():
+    return get_config('BASELINE_THUMBNAIL_URL', None) or settings.MEDIA_URL + 'thumbnails/'
+
+
+def confined_path(root, path):
+    """
+    Join path to root, raise SuspiciousFileOperation if the result, with
+    symbolic links resolved, is outside of root.
+    """
+
+    try:
+        joined = safe_join(root, path)
+    except ValueError:
+        # Django < 1.7
+        raise SuspiciousFileOperation('{0} is outside of {1}'.format(path, root))
+
+    real_root = os.path.realpath(root)
+    real_path = os.path.realpath(joined)
+    if real_path != real_root and not real_path.startswith(os.path.join(real_root, '')):
+        raise SuspiciousFileOperation('{0} is outside of {1}'.format(path, root))
+    return joined
+
+
+def find_source(url):
+    """
+    Return the file path of an image url as given to the img tag: a
+    static file path, or an absolute url below MEDIA_URL or STATIC_URL.
+    None for other urls, SuspiciousFileOperation for paths leaving the
+    media or static directories.
+    """
+
+    if url.startswith(('http://', 'https://', '//')):
+        return None
+
+    if settings.MEDIA_URL and settings.MEDIA_ROOT and url.startswith(settings.MEDIA_URL):
+        path = confined_path(settings.MEDIA_ROOT, url[len(settings.MEDIA_URL):])
+        return path if os.path.isfile(path) else None
+
+    if settings.STATIC_URL and url.startswith(settings.STATIC_URL):
+        url = url[len(settings.STATIC_URL):]
+    elif url[:1] == '/':
+        return None
+
+    from django.contrib.staticfiles import finders
+    path = finders.find(url)
+    if not path and settings.STATIC_ROOT:
+        path = confined_path(settings.STATIC_ROOT, url)
+    return path if path and os.path.isfile(path) else None
+
+
+def _variant_name(path, mtime, width, ext):
+    digest = hashlib.sha1('{0}:{1}'.format(path, mtime).encode('utf-8')).hexdigest()[:16]
+    return '{0}-{1}{2}'.format(digest, width, ext.lower())
+
+
+def _resize(image, width, dest):
+    height = max(1, int(round(image.size[1] * width / float(image.size[0]))))
+    resample = getattr(Image, 'LANCZOS', None) or Image.ANTIALIAS
+    resized = image.resize((width, height), resample)
+
+    options = {'quality': 85, 'optimize': True} if image.format == 'JPEG' else {}
+    # Written under a temporary name, so no half written file is served.
+    tmp = '{0}.{1}.{2}.tmp'.format(dest, os.getpid(), threading.current_thread().ident)
+    resized.save(tmp, image.format, **options)
+    # os.replace overwrites on all platforms (Python 3).
+    getattr(os, 'replace', os.rename)(tmp, dest)
+    return os.path.getsize(dest)
+
+
+def _build(path, widths):
+    directory = get_thumbnail_dir()
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # Created by a concurrent render.
+            if not os.path.isdir(directory):
+                raise
+    base_url = get_thumbnail_url()
+
+    mtime = os.path.getmtime(path)
+    image = Image.open(path)
+    width, height = image.size
+
+    variants = []
+    created = 0
+    try:
+        if image.format in RESIZABLE_FORMATS:
+            ext = os.path.splitext(path)[1]
+            for target in sorted(widths):
+                if target >= width:
+                    break
+                name = _variant_name(path, mtime, target, ext)
+                dest = os.path.join(directory, name)
+                if os.path.exists(dest):
+                    os.utime(dest, None)
+                else:
+                    created += _resize(image, target, dest)
+                variants.append((base_url + name, target, dest))
+    finally:
+        if hasattr(image, 'close'):
+            image.close()
+
+    if created:
+        _account(directory, created)
+    return ImageInfo(path, mtime, width, height, variants)
+
+
+def _is_current(info):
+    """
+    Check that the source is unchanged and the variants exist, and mark
+    the variants as used.
+    """
+
+    try:
+        if os.path.getmtime(info.path) != info.mtime:
+            return False
+        for url, width, dest in info.variants:
+            os.utime(dest, None)
+    except OSError:
+        return False
+    return True
+
+
+def _account(directory, size):
+    global _cache_size
+
+    with _lock:
+        if _cache_size is None:
+            _cache_size = sum(os.path.getsize(os.path.join(directory, name))
+                              for name in os.listdir(directory))
+        else:
+            _cache_size += size
+
+        max_size = get_config('BASELINE_THUMBNAIL_CACHE_SIZE', DEFAULT_CACHE_SIZE)
+        if _cache_size > max_size:
+            _evict(directory, int(max_size * 0.8))
+
+
+def evict(directory, target_size):
+    """
+    Delete the least recently used files in directory until it holds at
+    most target_size bytes.
+    """
+
+    with _lock:
+        _evict(directory, target_size)
+
+
+def _evict(directory, target_size):
+    global _cache_size
+
+    files = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+
+    files.sort()
+    total = sum(size for mtime, size, path in files)
+    for mtime, size, path in files:
+        if total <= target_size:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+
+    _cache_size = total
+    # Revalidate every image on its next use, also in compiled img tags.
+    _images.clear()
+    from django_baseline.template import clear_tag_cache
+    clear_tag_cache()
+
+
+def get_image(url):
+    """
+    Return the ImageInfo of the image at url, creating missing variants,
+    or None.
+    """
+
+    if Image is None:
+        return None
+
+    now = time.time()
+    cached = _images.get(url)
+    if cached is not None and now - cached[1] < CHECK_INTERVAL:
+        return cached[0]
+
+    info = cached[0] if cached is not None else None
+    if info is None or not _is_current(info):
+        info = None
+        try:
+            path = find_source(url)
+            if path is not None:
+                info = _build(path, get_config('BASELINE_THUMBNAIL_WIDTHS', DEFAULT_WIDTHS))
+        except SuspiciousFileOperation:
+            # The img tag outputs the url unchanged.
+            info = None
+        except (IOError, OSError, ValueError):
+            # Not an image, or the thumbnail dir is not writable.
+            info = None
+        except Exception:
+            # Like Pillow's DecompressionBombError, or its warning raised
+            # as an error.
+            logger.exception('Can not create the thumbnails of %s.', url)
+            info = None
+    if len(_images) >= MAX_ENTRIES and url not in _images:
+        _images.clear()
+    _images[url] = (info, now)
+    return info
+
+
+def clear_image_cache():
+    _images.clear()
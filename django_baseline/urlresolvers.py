@@ -0,0 +1,144 @@
+"""
+Memoized URL reversing.
+
+reverse_cached() caches the result of reverse() per URLconf, URL name and
+kwargs. For URL patterns whose only argument is pk, captured with
+(?P<pk>\\d+) or (?P<pk>[0-9]+), the reversed URL is split into a prefix
+and suffix once, so reversing it for another pk is a string
+concatenation. Other patterns are reversed and cached per pk, so values
+the pattern does not accept raise NoReverseMatch.
+
+The cache is cleared when ROOT_URLCONF changes (setting_changed signal)
+or by calling clear_reverse_cache(). URLconfs set per request (for
+example with set_urlconf or request.urlconf), script prefixes and
+languages (i18n_patterns) have their own entries.
+"""
+
+from __future__ import unicode_literals
+
+from django.core.urlresolvers import (reverse, get_resolver, get_urlconf,
+                                      get_script_prefix, NoReverseMatch)
+from django.utils import six
+from django.utils.translation import get_language
+
+try:
+    from django.core.signals import setting_changed
+except ImportError:
+    # Django < 1.8
+    from django.test.signals import setting_changed
+
+
+# Maximum number of cached urls, the cache is emptied when exceeded.
+MAX_ENTRIES = 10000
+
+# Stand-in pk used to find the position of pk in a reversed url.
+PK_SENTINEL = 2718281828459045
+
+# pk groups which match every non-negative integer.
+PK_GROUPS = (r'(?P<pk>\d+)', r'(?P<pk>[0-9]+)')
+
+_cache = {}
+# (scope, viewname) -> (prefix, suffix), or None if there is no fast path.
+_pk_patterns = {}
+
+
+def clear_reverse_cache():
+    _cache.clear()
+    _pk_patterns.clear()
+
+
+def _matches_any_pk(urlconf, viewname):
+    """
+    Check that viewname has a single url pattern, whose only argument is a
+    pk matching every non-negative integer.
+    """
+
+    if not isinstance(viewname, six.string_types):
+        return False
+
+    resolver = get_resolver(urlconf)
+    path = viewname.split(':')
+    for namespace in path[:-1]:
+        try:
+            resolver = resolver.namespace_dict[namespace][1]
+        except KeyError:
+            # Application namespace, resolved per request by reverse().
+            return False
+
+    entries = resolver.reverse_dict.getlist(path[-1])
+    if len(entries) != 1:
+        return False
+    possibilities, pattern = entries[0][:2]
+    if len(possibilities) != 1 or list(possibilities[0][1]) != ['pk']:
+        return False
+
+    pattern = six.text_type(pattern)
+    return (pattern.count('(?P<pk>') == 1 and
+            any(group in pattern for group in PK_GROUPS))
+
+
+def _get_pk_pattern(scope, viewname):
+    key = (scope, viewname)
+    try:
+        return _pk_patterns[key]
+    except KeyError:
+        pass
+
+    if not _matches_any_pk(scope[0], viewname):
+        _pk_patterns[key] = None
+        return None
+
+    try:
+        url = reverse(viewname, urlconf=scope[0], kwargs={'pk': PK_SENTINEL})
+    except NoReverseMatch:
+        pattern = None
+    else:
+        sentinel = six.text_type(PK_SENTINEL)
+        if url.count(sentinel) == 1:
+            pattern = tuple(url.split(sentinel))
+        else:
+            pattern = None
+
+    _pk_patterns[key] = pattern
+    return pattern
+
+
+def reverse_cached(viewname, kwargs=None):
+    """
+    Cached version of reverse() for url names with keyword arguments.
+    """
+
+    urlconf = get_urlconf()
+    # Everything besides the arguments that influences the result.
+    scope = (urlconf, get_script_prefix(), get_language())
+
+    if kwargs and len(kwargs) == 1 and 'pk' in kwargs:
+        pk = kwargs['pk']
+        # Only non-negative integers are guaranteed to match like the sentinel.
+        if isinstance(pk, six.integer_types) and not isinstance(pk, bool) and pk >= 0:
+            pattern = _get_pk_pattern(scope, viewname)
+            if pattern is not None:
+                return pattern[0] + six.text_type(pk) + pattern[1]
+
+    key = (scope, viewname, tuple(sorted(kwargs.items())) if kwargs else ())
+    try:
+        return _cache[key]
+    except KeyError:
+        pass
+    except TypeError:
+        # Unhashable kwargs.
+        return reverse(viewname, urlconf=urlconf, kwargs=kwargs)
+
+    url = reverse(viewname, urlconf=urlconf, kwargs=kwargs)
+    if len(_cache) >= MAX_ENTRIES:
+        _cache.clear()
+    _cache[key] = url
+    return url
+
+
+def _setting_changed(sender, setting, **kwargs):
+    if setting == 'ROOT_URLCONF':
+        clear_reverse_cache()
+
+setting_changed.connect(_setting_changed,
+                        dispatch_uid='baseline_clear_reverse_cache')
@@ -1,36 +1,90 @@
 from __future__ import unicode_literals
 
+import copy
+import csv
 import json
+import logging
+import re
+from collections import OrderedDict
+from operator import attrgetter, methodcaller
 
-from django.shortcuts import render, render_to_response
+import django
+from django.shortcuts import render_to_response
 from django.views.generic import edit
 from django.views.generic import detail
 from django.views import generic
 from django import forms
-from django.forms.models import inlineformset_factory, modelformset_factory
+from django.db import models, connections, router
+from django.db.models import signals
+from django.forms.models import inlineformset_factory, modelformset_factory, BaseInlineFormSet
 from django.utils.decorators import method_decorator
-from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseRedirect, HttpResponse
+from django.http import HttpResponseRedirect, HttpResponse, StreamingHttpResponse, Http404
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.urlresolvers import get_urlconf, set_urlconf
+from django.views.decorators.csrf import csrf_protect
+from django.utils.six.moves.urllib.parse import urlsplit
+from django.utils.http import urlencode
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import six
+from django.utils.encoding import force_text
+from django.utils.text import capfirst, compress_string
+from django.utils.cache import patch_vary_headers
 from django.contrib.messages.views import SuccessMessageMixin
 from django.core.exceptions import PermissionDenied
 
+try:
+    from django.core.signals import setting_changed
+except ImportError:
+    # Django < 1.8
+    from django.test.signals import setting_changed
+
 
 from .forms import CrispyFormSetHelper
+from . import hooks
+from . import jsonutils
+from . import pagination
+from . import querycount
+
+
+logger = logging.getLogger('django_baseline.batch')
 
 #######################
 # Generic view MIXINS #
 #######################
 
-class AjaxableResponseMixin(object):
+class JSONResponseMixin(object):
     """
-    Edit view (create, update) mixin that will return a json object with the
-    errors instead of the rendered content.
+    Mixin for views returning JSON, encoded with jsonutils.dumps().
+
+    Responses of at least json_gzip_min_length bytes are gzipped if the
+    client accepts it. Set it to None to disable compression.
     """
 
+    json_gzip_min_length = 1024
+
+
     def render_to_json_response(self, context, **response_kwargs):
-        data = json.dumps(context)
+        data = jsonutils.dumps(context)
         response_kwargs['content_type'] = 'application/json'
-        return HttpResponse(data, **response_kwargs)
+        response = HttpResponse(data, **response_kwargs)
+
+        min_length = self.json_gzip_min_length
+        if min_length is not None and len(data) >= min_length:
+            accept = self.request.META.get('HTTP_ACCEPT_ENCODING', '')
+            if re.search(r'\bgzip\b', accept):
+                response.content = compress_string(data)
+                response['Content-Encoding'] = 'gzip'
+            patch_vary_headers(response, ('Accept-Encoding',))
+
+        return response
+
+
+class AjaxableResponseMixin(JSONResponseMixin):
+    """
+    Edit view (create, update) mixin that will return a json object with the
+    errors instead of the rendered content.
+    """
 
 
     def form_invalid(self, form):
@@ -52,7 +106,7 @@ class AjaxableResponseMixin(object):
             return response
 
 
-class CrispyFormAjaxResponseMixin(object):
+class CrispyFormAjaxResponseMixin(JSONResponseMixin):
     """
     Edit view (create, update) mixin that will, if it is an AJAX request,
     return just the rendered form(renderd by the crispy_form_raw.html template)
@@ -62,11 +116,6 @@ class CrispyFormAjaxResponseMixin(object):
     Behaves normally for non-ajax requests.
     """
 
-    def render_to_json_response(self, context, **response_kwargs):
-        data = json.dumps(context)
-        response_kwargs['content_type'] = 'application/json'
-        return HttpResponse(data, **response_kwargs)
-
 
     def form_invalid(self, form):
         response = super(AjaxableResponseMixin, self).form_invalid(form)
@@ -85,6 +134,60 @@ class CrispyFormAjaxResponseMixin(object):
             return response
 
 
+class QueryBudgetMixin(object):
+    """
+    Records the SQL queries made while the view handles a request,
+    including rendering the template, if instrumentation is enabled
+    (see querycount.py).
+
+    Repeating query shapes (possible N+1 problems) and requests with
+    more than query_budget queries are reported.
+
+    Template responses are rendered by the handler, after the template
+    response middleware. Recording stops when the rendering is done, in a
+    post render callback. Streaming responses are reported when the view
+    returns, the queries made while their content is iterated are not
+    counted.
+    """
+
+    query_budget = None
+    # Report query shapes which run at least this many times.
+    query_repeat_threshold = 5
+
+
+    def dispatch(self, request, *args, **kwargs):
+        if not querycount.instrumentation_enabled():
+            return super(QueryBudgetMixin, self).dispatch(request, *args, **kwargs)
+
+        recorder = querycount.QueryRecorder()
+        recorder.start()
+        try:
+            response = super(QueryBudgetMixin, self).dispatch(request, *args, **kwargs)
+        except Exception:
+            recorder.stop()
+            raise
+
+        def report(response=None):
+            if not recorder.running:
+                return
+            recorder.stop()
+            querycount.check_report(querycount.QueryReport(
+                type(self).__name__, recorder.queries,
+                self.query_budget, self.query_repeat_threshold), request)
+
+        if getattr(response, 'is_rendered', True):
+            report()
+        else:
+            response.add_post_render_callback(report)
+            # Responses which are never rendered stop recording when they
+            # are closed, without a report.
+            closable = getattr(response, '_closable_objects', None)
+            if closable is not None:
+                closable.append(recorder)
+
+        return response
+
+
 class ExtraContextMixin(object):
     """
     A mixin for Djangos generic views classes that offers an additional
@@ -106,8 +209,15 @@ class SaveHookMixin(object):
     """
     A generic edit view mixin that provides pre_save
     post_save, pre_delete and post_delete hooks.
+
+    With defer_hooks = True, post_save and post_delete run after the
+    transaction is committed, on the hook backend (see hooks.py), so the
+    redirect does not wait for them.
     """
 
+    defer_hooks = False
+
+
     def pre_save(self, object):
         """
         Hook for altering object before save.
@@ -116,6 +226,15 @@ class SaveHookMixin(object):
         pass
 
 
+    def save_related(self, object):
+        """
+        Hook for saving related objects after the object was saved.
+        Always runs before the response, even with defer_hooks.
+        """
+
+        pass
+
+
     def post_save(self, object):
         """
         Hook for altering object after save.
@@ -138,6 +257,13 @@ class SaveHookMixin(object):
         """
 
 
+    def run_post_hook(self, hook, object):
+        if self.defer_hooks:
+            hooks.defer(hook, object)
+        else:
+            hook(object)
+
+
     def form_valid(self, form):
         """
         Calls pre and post save hooks.
@@ -152,7 +278,8 @@ class SaveHookMixin(object):
 
         self.object.save()
         form.save_m2m()
-        self.post_save(self.object)
+        self.save_related(self.object)
+        self.run_post_hook(self.post_save, self.object)
 
         return HttpResponseRedirect(self.get_success_url())
 
@@ -166,7 +293,7 @@ class SaveHookMixin(object):
         success_url = self.get_success_url()
         self.pre_delete(self.object)
         self.object.delete()
-        self.post_delete(self.object)
+        self.run_post_hook(self.post_delete, self.object)
 
         return HttpResponseRedirect(success_url)
 
@@ -178,37 +305,55 @@ class AssertUserIsOwnerMixin(object):
     The owner is determined by a ForeignKey field on the model.
     The name of the filed is specified by owner_field and defaults to user.
 
+    The check is part of the queryset filter, so get_object() does a single
+    query and the owner object is never loaded. Objects not owned by the
+    user result in a 404. get_object() also calls assert_user_is_owner(),
+    which raises PermissionDenied, for querysets not made by get_queryset().
+
     By default, the check is skipped for superusers.
     If you do not want to do this,
     set assert_user_is_owner_skip_superuser = False.
-
-    TODO: rewrite to prevent duplicate calls to get_object().
     """
 
     owner_field = "user"
     assert_user_is_owner_skip_superuser = True
 
 
-    def get(self, request, *args, **kwargs):
-        self.object = self.get_object()
-        self.assert_user_is_owner(self.object, request.user)
+    def get_owner_attname(self, model):
+        """
+        Column name of the owner field, eg. user_id.
+        """
 
-        return super(AssertUserIsOwnerMixin, self).get(request, *args, **kwargs)
+        return model._meta.get_field(self.owner_field).attname
 
-    def post(self, request, *args, **kwargs):
-        self.object = self.get_object()
-        self.assert_user_is_owner(self.object, request.user)
 
-        return super(AssertUserIsOwnerMixin, self).post(
-            request, *args, **kwargs)
+    def get_queryset(self):
+        queryset = super(AssertUserIsOwnerMixin, self).get_queryset()
+        user = self.request.user
+
+        if user.is_superuser and self.assert_user_is_owner_skip_superuser:
+            return queryset
+        if not user.is_authenticated():
+            raise PermissionDenied()
+
+        return queryset.filter(
+            **{self.get_owner_attname(queryset.model): user.pk})
+
+
+    def get_object(self, queryset=None):
+        obj = super(AssertUserIsOwnerMixin, self).get_object(queryset)
+        # Objects of other users are already filtered out by get_queryset(),
+        # but not if a view passes its own queryset.
+        self.assert_user_is_owner(obj, self.request.user)
+        return obj
 
 
     def assert_user_is_owner(self, instance, user):
         if user.is_superuser and self.assert_user_is_owner_skip_superuser:
             return
 
-        instance_user = getattr(instance, self.owner_field)
-        if instance_user != user:
+        owner_id = getattr(instance, self.get_owner_attname(type(instance)))
+        if owner_id is None or owner_id != user.pk:
             raise PermissionDenied()
 
 
@@ -262,30 +407,480 @@ class UserViewMixin(object):
 #############################
 
 
-class ListView(ExtraContextMixin, generic.ListView):
+class ListView(QueryBudgetMixin, ExtraContextMixin, generic.ListView):
+    """
+    ListView that offers extra_context, a default template and an optional
+    keyset ("seek") pagination mode.
+
+    computed_columns are added to the rows with annotate() and column_totals
+    are computed for the whole queryset with one aggregate() query, so
+    derived values and totals come from the database instead of template
+    arithmetic. generics/list_table.html shows table_columns and a footer
+    with the totals.
+
+    Set keyset_paginate_by to enable keyset pagination. Pages are selected
+    with a WHERE clause on keyset_ordering instead of OFFSET, so deep pages
+    are as fast as the first one. keyset_ordering should be an indexed
+    column without NULL values.
+
+    AJAX requests get only the rows of the page, and the url of the next
+    page in the X-Next-Page header. This powers the "Load more" button of
+    the generic list templates. The page template is rendered with
+    list_base_template set to fragment_base_template, which only outputs
+    its items or rows block, so the rows (and overridden actions blocks) of
+    templates extending the generic ones are used as they are.
+    """
+
     template_name = "generics/list.html"
+    fragment_base_template = "generics/list_fragment.html"
+
+    keyset_paginate_by = None
+    # Ordering column, prefix with - for descending order.
+    keyset_ordering = '-pk'
+    cursor_param = 'cursor'
+    # How to count the rows: 'exact' (COUNT(*)), 'estimate' (query planner
+    # statistics, falls back to exact) or None to skip counting.
+    keyset_count = None
+
+    # Column name -> expression added with annotate(), eg.
+    # {'total': F('price') * F('quantity')} (expressions need Django >= 1.8).
+    computed_columns = None
+    # Column name -> aggregate over the whole queryset, eg.
+    # {'total': Sum('total')}, or the name of one of TOTAL_AGGREGATES.
+    column_totals = None
+    # Field or computed column names shown by generics/list_table.html,
+    # or (name, label) tuples.
+    table_columns = None
+
+    TOTAL_AGGREGATES = {
+        'sum': models.Sum,
+        'avg': models.Avg,
+        'min': models.Min,
+        'max': models.Max,
+        'count': models.Count,
+    }
+
+
+    def get_queryset(self):
+        queryset = super(ListView, self).get_queryset()
+        if self.computed_columns:
+            queryset = queryset.annotate(**self.computed_columns)
+        return queryset
+
+
+    def get_table_columns(self, model):
+        """
+        Return (name, label) tuples for table_columns, or None.
+        """
+
+        if not self.table_columns:
+            return None
+
+        columns = []
+        for column in self.table_columns:
+            if isinstance(column, (list, tuple)):
+                columns.append(tuple(column))
+                continue
+            label = column.replace('_', ' ')
+            if model is not None:
+                try:
+                    label = model._meta.get_field(column).verbose_name
+                except models.FieldDoesNotExist:
+                    pass
+            columns.append((column, capfirst(force_text(label))))
+        return columns
+
+
+    def get_column_totals(self, queryset):
+        """
+        Return a dict of column name -> total over the whole queryset,
+        computed with one aggregate query, or None.
+
+        Sliced querysets can not be aggregated, their totals are computed
+        over the rows with the same primary keys.
+        """
+
+        if not self.column_totals or not hasattr(queryset, 'aggregate'):
+            return None
+
+        if not queryset.query.can_filter():
+            pks = list(queryset.values_list('pk', flat=True))
+            queryset = queryset.model._default_manager.filter(pk__in=pks)
+            if self.computed_columns:
+                queryset = queryset.annotate(**self.computed_columns)
+
+        # Prefixed, as aggregate aliases may not clash with annotations.
+        aggregates = {}
+        for name, aggregate in self.column_totals.items():
+            if isinstance(aggregate, six.string_types):
+                aggregate = self.TOTAL_AGGREGATES[aggregate](name)
+            aggregates['baseline_total_' + name] = aggregate
+
+        result = queryset.order_by().aggregate(**aggregates)
+        return {name: result['baseline_total_' + name] for name in self.column_totals}
+
+
+    def is_fragment_request(self):
+        return bool(self.keyset_paginate_by) and self.request.is_ajax()
+
+
+    def get_keyset_count(self, queryset):
+        """
+        Return a (count, is_estimate) tuple.
+        """
+
+        if self.keyset_count == 'estimate':
+            count = pagination.estimate_count(queryset)
+            if count is not None:
+                return count, True
+        if self.keyset_count:
+            return queryset.count(), False
+        return None, False
+
 
+    def keyset_paginate_queryset(self, queryset, page_size):
+        """
+        Return the rows of the current page and the cursor of the next page,
+        or None if this is the last page.
+        """
+
+        ordering = self.keyset_ordering
+        queryset = pagination.keyset_order(queryset, ordering)
+
+        cursor = self.request.GET.get(self.cursor_param)
+        if cursor:
+            value, pk = pagination.decode_cursor(cursor, queryset.model, ordering)
+            queryset = pagination.keyset_filter(queryset, ordering, value, pk)
+
+        # Fetch one extra row to know if there is a next page.
+        rows = list(queryset[:page_size + 1])
+        if len(rows) <= page_size:
+            return rows, None
 
-class DetailView(detail.DetailView):
+        rows = rows[:page_size]
+        return rows, pagination.encode_cursor(rows[-1], ordering)
+
+
+    def get_context_data(self, **kwargs):
+        queryset = kwargs.get('object_list', self.object_list)
+        kwargs['table_columns'] = self.get_table_columns(getattr(queryset, 'model', None))
+        if not self.is_fragment_request():
+            # Totals of all rows, not only of the current page.
+            kwargs['column_totals'] = self.get_column_totals(queryset)
+
+        if self.is_fragment_request():
+            kwargs['list_base_template'] = self.fragment_base_template
+
+        if self.keyset_paginate_by and not self.is_fragment_request():
+            # Count only on full page renders, "load more" does not need it.
+            queryset = kwargs.get('object_list', self.object_list)
+            kwargs['total_count'], kwargs['total_count_estimated'] = \
+                self.get_keyset_count(queryset)
+
+        if self.keyset_paginate_by:
+            queryset = kwargs.pop('object_list', self.object_list)
+            rows, next_cursor = self.keyset_paginate_queryset(
+                queryset, self.keyset_paginate_by)
+
+            next_page_url = None
+            if next_cursor:
+                params = self.request.GET.copy()
+                params[self.cursor_param] = next_cursor
+                next_page_url = '?' + params.urlencode()
+
+            context_object_name = self.get_context_object_name(queryset)
+            if context_object_name is not None:
+                kwargs[context_object_name] = rows
+
+            kwargs.update({
+                'object_list': rows,
+                'is_paginated': bool(next_cursor or
+                    self.request.GET.get(self.cursor_param)),
+                'next_cursor': next_cursor,
+                'next_page_url': next_page_url,
+            })
+
+        return super(ListView, self).get_context_data(**kwargs)
+
+
+    def render_to_response(self, context, **response_kwargs):
+        response = super(ListView, self).render_to_response(
+            context, **response_kwargs)
+        if self.is_fragment_request():
+            response['X-Next-Page'] = context.get('next_page_url') or ''
+        return response
+
+
+class Echo(object):
     """
-    DetailView which tries to show all the fields of a model.
+    File-like object which returns what is written to it.
+    Allows streaming the output of csv.writer.
+    """
+
+    def write(self, value):
+        return value
+
+
+class ExportView(ListView):
+    """
+    Streams the ListView queryset as CSV or NDJSON (one JSON object per line).
+
+    The queryset is configured like for ListView (model, queryset,
+    get_queryset()). Only export_fields are read, with values_list(), in
+    chunks of export_chunk_size rows selected with keyset pagination
+    on keyset_ordering, so memory usage stays flat for any table size.
+
+    The format is taken from the "format" GET parameter and defaults to
+    export_format.
+    """
+
+    export_fields = None
+    export_format = 'csv'
+    export_formats = ('csv', 'ndjson')
+    export_chunk_size = 2000
+    export_filename = None
+    format_param = 'format'
+
+
+    def get_export_fields(self, model):
+        if self.export_fields:
+            return list(self.export_fields)
+        return [field.name for field in model._meta.fields]
+
+
+    def get_export_headers(self, model, fields):
+        headers = []
+        for name in fields:
+            try:
+                headers.append(capfirst(force_text(
+                    model._meta.get_field(name).verbose_name)))
+            except models.FieldDoesNotExist:
+                headers.append(name)
+        return headers
+
+
+    def get_export_filename(self, model, export_format):
+        if self.export_filename:
+            return self.export_filename
+        return '{name}.{ext}'.format(name=model._meta.model_name,
+                                     ext=export_format)
+
+
+    def iter_export_rows(self, queryset, fields):
+        """
+        Yield tuples with the values of fields for every row of the queryset.
+        """
+
+        ordering = self.keyset_ordering
+        queryset = pagination.keyset_order(queryset, ordering)
+        key_field = pagination.get_keyset_field(queryset.model, ordering)
+
+        # Fetch the keyset columns too, to select the next chunk.
+        count = len(fields)
+        queryset = queryset.values_list(*(fields + [key_field.name, 'pk']))
+        size = self.export_chunk_size
+
+        chunk = queryset
+        while True:
+            fetched = 0
+            for row in chunk[:size].iterator():
+                fetched += 1
+                last = row
+                yield row[:count]
+
+            if fetched < size:
+                return
+            chunk = pagination.keyset_filter(
+                queryset, ordering, last[count], last[count + 1])
+
+
+    def iter_csv(self, queryset, fields):
+        writer = csv.writer(Echo())
+
+        def encode(value):
+            if value is None:
+                return ''
+            if six.PY2:
+                return force_text(value).encode('utf-8')
+            return value
+
+        # Send the header right away.
+        yield writer.writerow([encode(h) for h in
+                               self.get_export_headers(queryset.model, fields)])
+
+        # Bytes on Python 2, see encode().
+        lines = []
+        for row in self.iter_export_rows(queryset, fields):
+            lines.append(writer.writerow([encode(value) for value in row]))
+            if len(lines) >= self.export_chunk_size:
+                yield str('').join(lines)
+                lines = []
+        if lines:
+            yield str('').join(lines)
+
+
+    def iter_ndjson(self, queryset, fields):
+        encoder = DjangoJSONEncoder(separators=(',', ':'))
+
+        lines = []
+        for row in self.iter_export_rows(queryset, fields):
+            lines.append(encoder.encode(dict(zip(fields, row))) + '\n')
+            if len(lines) >= self.export_chunk_size:
+                yield ''.join(lines)
+                lines = []
+        if lines:
+            yield ''.join(lines)
+
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get(self.format_param, self.export_format)
+        if export_format not in self.export_formats:
+            raise Http404('Unsupported export format.')
+
+        queryset = self.get_queryset()
+        fields = self.get_export_fields(queryset.model)
+
+        if export_format == 'csv':
+            content = self.iter_csv(queryset, fields)
+            content_type = 'text/csv; charset=utf-8'
+        else:
+            content = self.iter_ndjson(queryset, fields)
+            content_type = 'application/x-ndjson; charset=utf-8'
+
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = 'attachment; filename="{0}"'.format(
+            self.get_export_filename(queryset.model, export_format))
+        return response
+
+
+def get_remote_field(field):
+    """
+    The relation of a field (field.remote_field, field.rel before Django
+    1.9), or None.
+    """
+
+    try:
+        return field.remote_field
+    except AttributeError:
+        # Django < 1.9
+        return field.rel
+
+
+def get_related_model(field):
+    """
+    The model a relation field points to (field.related_model, field.rel.to
+    before Django 1.8).
+    """
+
+    return getattr(field, 'related_model', None) or field.rel.to
+
+
+class FieldPlan(object):
+    """
+    Describes how to display the fields of a model: the name, a label and
+    an accessor function per field, and the relations which should be
+    loaded together with the object. Built once per model, see
+    get_field_plan().
+
+    By default all fields are shown, except auto created ones (the id and
+    the parent links of multi-table inheritance).
+    """
+
+    def __init__(self, model, fields=None):
+        opts = model._meta
+
+        if fields:
+            model_fields = [opts.get_field(name) for name in fields]
+        else:
+            model_fields = [field for field in opts.fields
+                            if not field.auto_created and
+                            not isinstance(field, models.AutoField) and
+                            not getattr(get_remote_field(field), 'parent_link', False)]
+            model_fields += list(opts.many_to_many)
+
+        self.entries = []
+        self.select_related = []
+        self.prefetch_related = []
+
+        for field in model_fields:
+            if field in opts.many_to_many:
+                accessor = self._many_to_many_accessor(field.name)
+                self.prefetch_related.append(field.name)
+            elif field.choices:
+                accessor = methodcaller('get_{0}_display'.format(field.name))
+            elif get_remote_field(field) is not None:
+                accessor = attrgetter(field.name)
+                self.select_related.append(field.name)
+            else:
+                accessor = attrgetter(field.attname)
+
+            self.entries.append((field.name, field.verbose_name, accessor))
+
+
+    @staticmethod
+    def _many_to_many_accessor(name):
+        def accessor(obj):
+            return ', '.join(force_text(related) for related in getattr(obj, name).all())
+        return accessor
+
+
+    def get_values(self, obj):
+        """
+        Return an ordered dict of field name -> (label, display value).
+        Keyed by name, since fields may share a label.
+        """
+
+        return OrderedDict((name, (capfirst(label), accessor(obj)))
+                           for name, label, accessor in self.entries)
+
+
+# (model, fields) -> FieldPlan
+_field_plans = {}
+
+
+def get_field_plan(model, fields=None):
+    key = (model, tuple(fields) if fields else None)
+    plan = _field_plans.get(key)
+    if plan is None:
+        plan = _field_plans[key] = FieldPlan(model, fields)
+    return plan
+
+
+class DetailView(QueryBudgetMixin, detail.DetailView):
+    """
+    DetailView which shows all the fields of a model, or the ones listed
+    in fields.
+
+    Foreign keys are loaded with select_related and many to many fields
+    with prefetch_related, so showing related objects does not cost extra
+    queries per field.
     """
 
     template_name = "generics/detail.html"
     fields = None
 
+
+    def get_queryset(self):
+        queryset = super(DetailView, self).get_queryset()
+
+        plan = get_field_plan(queryset.model, self.fields)
+        if plan.select_related:
+            queryset = queryset.select_related(*plan.select_related)
+        if plan.prefetch_related:
+            queryset = queryset.prefetch_related(*plan.prefetch_related)
+        return queryset
+
+
     def get_context_data(self, **kwargs):
         context = super(DetailView, self).get_context_data(**kwargs)
 
-        #fields = self.fields or self.model._meta.get_all_field_names()
-        #field_data = {name:getattr(self.object, name) for name in fields}
-
-        #context['fields'] = field_data
+        plan = get_field_plan(type(self.object), self.fields)
+        context['fields'] = plan.get_values(self.object)
 
         return context
 
 
-class CreateView(SuccessMessageMixin, ExtraContextMixin, SaveHookMixin, edit.CreateView):
+class CreateView(QueryBudgetMixin, SuccessMessageMixin, ExtraContextMixin, SaveHookMixin, edit.CreateView):
     """
     CreateView that offers extra_context and a default template.
     """
@@ -293,7 +888,7 @@ class CreateView(SuccessMessageMixin, ExtraContextMixin, SaveHookMixin, edit.Cre
     template_name = 'generics/create.html'
 
 
-class UpdateView(SuccessMessageMixin, ExtraContextMixin, SaveHookMixin, edit.UpdateView):
+class UpdateView(QueryBudgetMixin, SuccessMessageMixin, ExtraContextMixin, SaveHookMixin, edit.UpdateView):
     """
     UpdateView that offers extra_context and a default template.
     """
@@ -301,7 +896,7 @@ class UpdateView(SuccessMessageMixin, ExtraContextMixin, SaveHookMixin, edit.Upd
     template_name = 'generics/update.html'
 
 
-class DeleteView(SuccessMessageMixin, ExtraContextMixin, edit.DeleteView):
+class DeleteView(QueryBudgetMixin, SuccessMessageMixin, ExtraContextMixin, edit.DeleteView):
     """
     DeleteView that offers extra_context and a default template.
     """
@@ -309,11 +904,58 @@ class DeleteView(SuccessMessageMixin, ExtraContextMixin, edit.DeleteView):
     template_name = 'generics/delete.html'
 
 
+# Generated formset classes, see FormSetMixin.get_formset_class().
+_formset_class_cache = {}
+
+
+def _freeze(value):
+    """
+    Convert dicts and lists to tuples, to use them in cache keys.
+    """
+
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _func(method):
+    return getattr(method, '__func__', method)
+
+
+def can_bulk_save(model):
+    """
+    Whether objects of a model can be saved with bulk_create, which
+    bypasses save() and the save signals.
+    """
+
+    return (not model._meta.parents and
+            _func(model.save) is _func(models.Model.save) and
+            not signals.pre_save.has_listeners(model) and
+            not signals.post_save.has_listeners(model))
+
+
+def bulk_create_sets_pks(model):
+    """
+    Whether bulk_create sets the primary keys of the created objects.
+    """
+
+    # Django >= 1.10, and only PostgreSQL.
+    features = connections[router.db_for_write(model)].features
+    return getattr(features, 'can_return_ids_from_bulk_insert', False)
+
+
 class FormSetMixin(object):
     """
     A ModelForm mixin that makes creating views with inline
     formsets really easy.
     Used by FormSetCreateView and FormSetUpdateView.
+
+    The formsets are saved in save_related(), in the same transaction as
+    the object. post_save() runs afterwards and no longer saves them, nor
+    saves the object a second time. Overrides which relied on that should
+    override save_related() instead.
     """
 
     # The form class used for the inline items.
@@ -336,6 +978,9 @@ class FormSetMixin(object):
     fieldsets_expanded = True
     fieldset_items_expanded = True
 
+    # Create formset objects with bulk_create where the models allow it.
+    bulk_save = True
+
 
     def __init__(self, *args, **kwargs):
         super(FormSetMixin, self).__init__(*args, **kwargs)
@@ -355,10 +1000,143 @@ class FormSetMixin(object):
         return CrispyFormSetHelper()
 
 
+    def get_form_crispy_helper(self, form):
+        """
+        Helper of the main form, which is rendered inside the form tag of
+        the template. Forms without a helper get one without a form tag,
+        helpers with a form tag are copied without it.
+        """
+
+        helper = getattr(form, 'helper', None)
+        if helper is None:
+            return CrispyFormSetHelper()
+        if not helper.form_tag:
+            return helper
+
+        helper = copy.copy(helper)
+        helper.form_tag = False
+        return helper
+
+
+    def has_through_model(self, field):
+        # For m2m without a through model, use modelformset_factory.
+        # For m2m with a thorough model, inlineformset_factory
+        # saves a bunch of work.
+        #
+        # Determine which one to use by this HACKY method:
+        # Check for underscores in through model name,
+        # since the auto-generated m2m tables have an underscore.
+
+        through = get_remote_field(field).through
+        return through._meta.object_name.find('_') == -1
+
+
+    def get_formset_class(self, field):
+        """
+        Return the formset class for a m2m field.
+        Generated classes are cached per process, since building them with
+        the formset factories is expensive.
+        """
+
+        has_through_model = self.has_through_model(field)
+        factory_kwargs = self.factory_extra_args.get(field.name, {})
+
+        key = (self.model, field.name, has_through_model, self.inline_form_class,
+               self.extra, self.can_delete, _freeze(factory_kwargs))
+        try:
+            fieldset_cls = _formset_class_cache.get(key)
+        except TypeError:
+            # Unhashable factory arguments, do not cache.
+            key = None
+            fieldset_cls = None
+
+        if fieldset_cls is None:
+            if has_through_model:
+                fieldset_cls = inlineformset_factory(self.model, get_remote_field(field).through,
+                    form=self.inline_form_class, extra=self.extra, **factory_kwargs)
+            else:
+                fieldset_cls = modelformset_factory(get_related_model(field),
+                    form=self.inline_form_class, extra=self.extra,
+                    can_delete=self.can_delete, **factory_kwargs)
+
+            if key is not None:
+                _formset_class_cache[key] = fieldset_cls
+
+        return fieldset_cls
+
+
+    def get_formset_kwargs(self, field):
+        """
+        Keyword arguments for the formset of a m2m field: the prefix, and
+        the submitted data on POST. FormSetCreateView and FormSetUpdateView
+        add the queryset or instance.
+        """
+
+        kwargs = {}
+        if not self.has_through_model(field):
+            # Inline formsets of through models keep their default prefix.
+            kwargs['prefix'] = field.name
+        if self.request.method == 'POST':
+            kwargs['data'] = self.request.POST
+            kwargs['files'] = self.request.FILES
+        return kwargs
+
+
+    def share_formset_choices(self, formset):
+        """
+        Let the choice fields of all forms in a formset render from one
+        evaluated list of choices, instead of querying the choices again
+        for every form. Validation still uses the field querysets.
+
+        Only fields with a select widget render their choices. The hidden
+        primary key field of model formsets, and fields with other
+        widgets, are left alone: evaluating their choices would load the
+        whole related table.
+        """
+
+        pk_name = formset.model._meta.pk.name
+        shared = {}
+        for form in formset.forms:
+            for name, field in form.fields.items():
+                if name == pk_name or not isinstance(field, forms.ModelChoiceField):
+                    continue
+                if not isinstance(field.widget, forms.Select):
+                    continue
+                if name not in shared:
+                    # Not list(): ModelChoiceIterator.__len__ runs a query
+                    # of its own before iterating.
+                    shared[name] = [choice for choice in field.choices]
+                field.widget.choices = shared[name]
+
+
+    def get_fieldsets(self):
+        """
+        Build the formsets of all m2m fields.
+        They are built once per request and reused afterwards.
+        """
+
+        if getattr(self, '_fieldsets', None) is not None:
+            return self._fieldsets
+
+        fieldsets = {}
+        for field in self.model._meta.many_to_many:
+            fieldset_cls = self.get_formset_class(field)
+            fieldsets[field.name] = fieldset_cls(**self.get_formset_kwargs(field))
+
+        self._fieldsets = fieldsets
+        return fieldsets
+
+
     def get_context_data(self, **kwargs):
         context = super(FormSetMixin, self).get_context_data(**kwargs)
-        context['fieldsets'] = self.get_fieldsets().items()
+        fieldsets = self.get_fieldsets()
+        # Only needed for rendering: on GET, or for invalid forms on POST.
+        for fieldset in fieldsets.values():
+            self.share_formset_choices(fieldset)
+        context['fieldsets'] = fieldsets.items()
         context['helper'] = self.get_fieldset_crispy_helper()
+        if 'form' in context:
+            context['form_helper'] = self.get_form_crispy_helper(context['form'])
         context['fieldsets_expanded'] = self.fieldsets_expanded
         context['fieldset_items_expanded'] = self.fieldset_items_expanded
 
@@ -373,13 +1151,56 @@ class FormSetMixin(object):
         pass
 
 
-    def post_save(self, instance):
+    def save_formset(self, instance, name, formset):
+        """
+        Save the objects of a formset, in bulk where possible, and add new
+        objects to the m2m relation name of instance with a single add().
+        """
+
+        is_inline = isinstance(formset, BaseInlineFormSet)
+        if is_inline:
+            # On create, the formset was built before instance was saved.
+            formset.instance = instance
+
+        formset.save(commit=False)
+        model = formset.model
+        bulk = self.bulk_save and can_bulk_save(model)
+
+        for obj in formset.deleted_objects:
+            # Older Django versions already delete with commit=False.
+            if obj.pk is not None:
+                obj.delete()
+
+        new_objects = formset.new_objects
+        # Primary keys are needed for m2m.add() and for m2m data of the forms.
+        needs_pks = not is_inline or bool(model._meta.many_to_many)
+        if bulk and new_objects and (not needs_pks or bulk_create_sets_pks(model)):
+            model._default_manager.bulk_create(new_objects)
+        else:
+            for obj in new_objects:
+                obj.save()
+
+        for obj, changed in formset.changed_objects:
+            obj.save()
+
+        formset.save_m2m()
+
+        if not is_inline and new_objects:
+            getattr(instance, name).add(*new_objects)
+
+
+    def save_related(self, instance):
         for name, formset in self.formsets.items():
-            instances = formset.save()
-            for model in instances:
-                getattr(instance, name).add(model)
+            self.save_formset(instance, name, formset)
+
+
+    def form_valid(self, form):
+        """
+        Saves the object and all formsets in one transaction.
+        """
 
-        instance.save()
+        with hooks.atomic():
+            return super(FormSetMixin, self).form_valid(form)
 
 
     def post(self, request, *args, **kwargs):
@@ -389,7 +1210,8 @@ class FormSetMixin(object):
         formsets = self.formsets = self.get_fieldsets()
 
         # Check if both the form and all the fieldsets are valid.
-        valid = form.is_valid() and reduce(lambda x, y: x and y, [f.is_valid() for name, f in formsets.items()])
+        # The list validates every formset, so all of them show their errors.
+        valid = form.is_valid() and all([f.is_valid() for f in formsets.values()])
 
         if valid:
             return self.form_valid(form)
@@ -397,7 +1219,7 @@ class FormSetMixin(object):
             return self.form_invalid(form)
 
 
-class FormSetCreateView(SuccessMessageMixin, ExtraContextMixin, FormSetMixin, SaveHookMixin, edit.CreateView):
+class FormSetCreateView(QueryBudgetMixin, SuccessMessageMixin, ExtraContextMixin, FormSetMixin, SaveHookMixin, edit.CreateView):
     """
     CreateView for a model with inline forms of another model.
     """
@@ -407,101 +1229,308 @@ class FormSetCreateView(SuccessMessageMixin, ExtraContextMixin, FormSetMixin, Sa
     can_delete = False
 
 
-    def get_fieldsets(self):
-        fieldsets = {}
+    def get_formset_kwargs(self, field):
+        kwargs = super(FormSetCreateView, self).get_formset_kwargs(field)
+        if not self.has_through_model(field):
+            kwargs['queryset'] = get_related_model(field)._default_manager.none()
+        return kwargs
 
-        for field in self.model._meta.many_to_many:
 
-            target_model = field.related.parent_model
+    def post(self, request, *args, **kwargs):
+        self.object = None
+        return super(FormSetCreateView, self).post(request, *args, **kwargs)
 
-            # For m2m without a through model, use modelformset_factory.
-            # For m2m with a thorough model, inlineformset_factory
-            # saves a bunch of work.
-            #
-            # Determine which one to use by this HACKY method:
-            # Check for underscores in through model name,
-            # since the auto-generated m2m tables have an underscore.
 
-            has_through_model = field.rel.through._meta.object_name.find('_') == -1
+class FormSetUpdateView(QueryBudgetMixin, SuccessMessageMixin, ExtraContextMixin, FormSetMixin, SaveHookMixin, edit.UpdateView):
+    """
+    UpdateView for a model with inline forms of another model.
+    """
 
-            args = [self.request.POST, self.request.FILES] if self.request.method == 'POST' else []
-            kwargs = {}
+    template_name = 'generics/update_fieldsets.html'
 
-            factory_kwargs = self.factory_extra_args[field.name] if field.name in self.factory_extra_args else {}
 
-            if has_through_model:
-                fieldset_cls = inlineformset_factory(self.model, field.rel.through,
-                    form=self.inline_form_class, extra=self.extra, **factory_kwargs)
-            else:
-                fieldset_cls = modelformset_factory(target_model, form=self.inline_form_class,
-                    extra=self.extra, can_delete = self.can_delete, **factory_kwargs)
+    def get_queryset(self):
+        """
+        Prefetch the related objects of the m2m formsets together with the
+        object.
+        """
 
-                kwargs['prefix'] = field.name
-                kwargs['queryset'] = target_model.objects.none()
+        queryset = super(FormSetUpdateView, self).get_queryset()
 
-            fieldsets[field.name] = fieldset_cls(*args, **kwargs)
+        if django.VERSION < (1, 9):
+            # The formsets of older versions query the related objects
+            # again, the prefetched results would not be used.
+            return queryset
 
-        return fieldsets
+        from django.db.models import Prefetch
+
+        lookups = []
+        for field in self.model._meta.many_to_many:
+            # Inline formsets of through models always filter their own
+            # queryset, prefetching does not help them.
+            if self.has_through_model(field):
+                continue
+
+            # Formsets need ordered querysets, prefetch them ordered so the
+            # prefetched results are used as they are.
+            related = get_related_model(field)._default_manager.all()
+            if not related.ordered:
+                related = related.order_by('pk')
+            lookups.append(Prefetch(field.name, queryset=related))
+
+        return queryset.prefetch_related(*lookups)
+
+
+    def get_object(self, queryset=None):
+        """
+        The object is fetched once per request.
+        """
+
+        if queryset is not None:
+            return super(FormSetUpdateView, self).get_object(queryset)
+
+        if getattr(self, '_object', None) is None:
+            self._object = super(FormSetUpdateView, self).get_object()
+        return self._object
+
+
+    def get_formset_kwargs(self, field):
+        kwargs = super(FormSetUpdateView, self).get_formset_kwargs(field)
+        if self.has_through_model(field):
+            kwargs['instance'] = self.object
+        else:
+            kwargs['queryset'] = getattr(self.object, field.name).all()
+        return kwargs
 
 
     def post(self, request, *args, **kwargs):
-        self.object = None
-        return super(FormSetCreateView, self).post(request, *args, **kwargs)
+        self.object = self.get_object()
+        return super(FormSetUpdateView, self).post(request, *args, **kwargs)
+
+
+##################
+# Batch requests #
+##################
+
+
+# Handler running the middleware for BatchView sub-requests, loaded once.
+_batch_handler = None
+
+
+def get_batch_handler():
+    global _batch_handler
+
+    if _batch_handler is None:
+        handler = BaseHandler()
+        handler.load_middleware()
+        _batch_handler = handler
+    return _batch_handler
 
 
-class FormSetUpdateView(SuccessMessageMixin, ExtraContextMixin, FormSetMixin, SaveHookMixin, edit.UpdateView):
+def _setting_changed(sender, setting, **kwargs):
+    global _batch_handler
+
+    if setting in ('MIDDLEWARE', 'MIDDLEWARE_CLASSES'):
+        _batch_handler = None
+
+setting_changed.connect(_setting_changed, dispatch_uid='baseline_reset_batch_handler')
+
+
+class BatchRollback(Exception):
     """
-    UpdateView for a model with inline forms of another model.
+    Rolls back the transaction of a sub-request which returned response.
     """
 
-    template_name = 'generics/update_fieldsets.html'
+    def __init__(self, response):
+        self.response = response
 
-    def get_fieldsets(self):
-        obj = self.get_object()
 
-        fieldsets = {}
+class BatchView(JSONResponseMixin, generic.View):
+    """
+    Handles several AJAX requests in one POST, see $.djBatch in
+    django-ajax.js.
+
+    The body is a JSON object {"requests": [{"method": "GET", "url": "/a/?x=1"},
+    {"method": "POST", "url": "/b/", "data": "x=1&y=2"}]}. Every sub-request
+    is handled like a request of its own, in order: through the middleware
+    (sessions, authentication, CSRF, ATOMIC_REQUESTS...) and its view. The
+    response is {"responses": [{"status": 200, "headers": {...}, "body": "..."}]}.
+
+    Sub-requests carry the headers and cookies of the batch request,
+    including the CSRF token, and the cookies set by earlier sub-requests.
+    Each one runs in a transaction of the default database, which is rolled
+    back if it fails with an exception or a 5xx response. Redirects to local
+    urls are followed with a GET, up to max_redirects times. Streaming
+    responses are not buffered, they become 501 responses.
+    """
 
-        for field in self.model._meta.many_to_many:
+    max_batch_size = 25
+    max_redirects = 5
+    allowed_methods = ('GET', 'POST')
 
-            target_model = field.related.parent_model
 
-            # For m2m without a through model, use modelformset_factory.
-            # For m2m with a thorough model, inlineformset_factory is
-            # saves a bunch of work.
-            # 
-            # Determine which one to use by this HACKY method:
-            # Check for underscores in through model name, 
-            # since the auto-generated m2m tables have an underscore.
+    @method_decorator(csrf_protect)
+    def dispatch(self, request, *args, **kwargs):
+        return super(BatchView, self).dispatch(request, *args, **kwargs)
 
-            has_through_model = field.rel.through._meta.object_name.find('_') == -1
 
-            args = [self.request.POST, self.request.FILES] if self.request.method == 'POST' else []
-            kwargs = {}
+    def build_request(self, request, method, url, data, cookies):
+        """
+        Return a request like request for a sub-request, with the cookies of
+        the cookies dict (name -> encoded value).
+        """
 
-            factory_kwargs = self.factory_extra_args[field.name] if field.name in self.factory_extra_args else {}
+        parts = urlsplit(url)
+        path = parts.path
+        script_name = request.META.get('SCRIPT_NAME', '')
+        if script_name and path.startswith(script_name):
+            path = path[len(script_name):]
+
+        if isinstance(data, dict):
+            data = urlencode(data, doseq=True)
+        body = (data or '').encode('utf-8')
+        environ = dict(request.META)
+        environ.update({
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': parts.query,
+            'CONTENT_TYPE': 'application/x-www-form-urlencoded; charset=utf-8',
+            'CONTENT_LENGTH': str(len(body)),
+            'HTTP_COOKIE': '; '.join('{0}={1}'.format(name, value)
+                                     for name, value in cookies.items()),
+            'wsgi.input': six.BytesIO(body),
+            'baseline.batch': True,
+        })
+        # The batch response is compressed as a whole, and conditional
+        # headers are meant for the batch url.
+        for header in ('HTTP_ACCEPT_ENCODING', 'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE'):
+            environ.pop(header, None)
+
+        sub_request = WSGIRequest(environ)
+        if getattr(request, '_dont_enforce_csrf_checks', False):
+            # Set by the test client.
+            sub_request._dont_enforce_csrf_checks = True
+        return sub_request
+
+
+    def handle_request(self, sub_request):
+        """
+        Run sub_request through the middleware and its view in a
+        transaction, return the response.
+        """
 
-            if has_through_model:
-                fieldset_cls = inlineformset_factory(self.model, field.rel.through,
-                    form=self.inline_form_class, extra=self.extra, **factory_kwargs)
+        try:
+            with hooks.atomic():
+                response = get_batch_handler().get_response(sub_request)
+                if response.streaming:
+                    response.close()
+                    response = HttpResponse('Streaming responses can not be batched.',
+                                            content_type='text/plain', status=501)
+                if response.status_code >= 500:
+                    raise BatchRollback(response)
+        except BatchRollback as e:
+            response = e.response
+        except Exception:
+            # Raised by the handler with DEBUG_PROPAGATE_EXCEPTIONS.
+            logger.exception('Batched request to %s failed.', sub_request.path)
+            response = HttpResponse(status=500)
+        return response
+
+
+    def get_redirect_url(self, request, response):
+        """
+        Return the local url response redirects to with a GET, or None.
+        """
 
-                kwargs['instance'] = obj
+        if response.status_code not in (301, 302, 303):
+            return None
+        parts = urlsplit(response.get('Location', ''))
+        if parts.scheme not in ('', 'http', 'https') or parts.netloc not in ('', request.get_host()):
+            return None
+        if not parts.path.startswith('/'):
+            return None
+        return parts.path + ('?' + parts.query if parts.query else '')
+
+
+    def update_cookies(self, cookies, response):
+        for name, morsel in response.cookies.items():
+            if morsel['max-age'] in (0, '0'):
+                # Deleted.
+                cookies.pop(name, None)
             else:
-                fieldset_cls = modelformset_factory(target_model,  form=self.inline_form_class,
-                    extra=self.extra, can_delete = self.can_delete, **factory_kwargs)
+                cookies[name] = morsel.coded_value
 
-                kwargs['prefix'] = field.name
-                kwargs['queryset'] = getattr(obj, field.name).all()
 
-            fieldsets[field.name] = fieldset_cls(*args, **kwargs)
+    def run(self, request, method, url, data, cookies, set_cookies):
+        """
+        Handle a sub-request and the redirects it leads to, return the last
+        response. Cookies the responses set are added to cookies and
+        appended to set_cookies.
+        """
 
-        return fieldsets
+        for _ in range(self.max_redirects + 1):
+            sub_request = self.build_request(request, method, url, data, cookies)
+            response = self.handle_request(sub_request)
+            self.update_cookies(cookies, response)
+            set_cookies.append(response.cookies)
 
+            url = self.get_redirect_url(request, response)
+            if url is None:
+                break
+            method, data = 'GET', None
+        return response
 
-    def get(self, request, *args, **kwargs):
-        self.object = self.get_object()
-        return super(FormSetUpdateView, self).get(request, *args, **kwargs)
+
+    def encode_response(self, response):
+        return {
+            'status': response.status_code,
+            'headers': dict(response.items()),
+            'body': response.content.decode(getattr(response, 'charset', None) or 'utf-8', 'replace'),
+        }
 
 
     def post(self, request, *args, **kwargs):
-        self.object = self.get_object()
-        return super(FormSetUpdateView, self).post(request, *args, **kwargs)
+        if request.META.get('baseline.batch'):
+            return self.render_to_json_response({'error': 'nested_batch'}, status=400)
+
+        try:
+            requests = json.loads(request.body.decode('utf-8'))['requests']
+        except (ValueError, KeyError, TypeError):
+            return self.render_to_json_response({'error': 'invalid_batch'}, status=400)
+        if not isinstance(requests, list) or len(requests) > self.max_batch_size:
+            return self.render_to_json_response({'error': 'invalid_batch'}, status=400)
+        for item in requests:
+            # data is sent encoded, or as an object of form fields.
+            if not isinstance(item, dict) or \
+                    not isinstance(item.get('data'), (type(None), six.string_types, dict)):
+                return self.render_to_json_response({'error': 'invalid_batch'}, status=400)
+
+        # The encoded values, as they were sent.
+        cookies = OrderedDict()
+        for cookie in request.META.get('HTTP_COOKIE', '').split(';'):
+            name, sep, value = cookie.strip().partition('=')
+            if sep:
+                cookies[name] = value
+
+        responses = []
+        set_cookies = []
+        # The handler sets the URLconf of the sub-requests.
+        urlconf = get_urlconf()
+        try:
+            for item in requests:
+                method = six.text_type(item.get('method', 'GET')).upper()
+                url = six.text_type(item.get('url', ''))
+                # Only local paths.
+                if method not in self.allowed_methods or not url.startswith('/') or url.startswith('//'):
+                    responses.append({'status': 400, 'headers': {}, 'body': ''})
+                    continue
+
+                response = self.run(request, method, url, item.get('data'), cookies, set_cookies)
+                responses.append(self.encode_response(response))
+        finally:
+            set_urlconf(urlconf)
+
+        response = self.render_to_json_response({'responses': responses})
+        for sub_cookies in set_cookies:
+            response.cookies.update(sub_cookies)
+        return response
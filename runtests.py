@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""
+Run the django_baseline tests, from the repository root:
+
+    python runtests.py [test labels]
+
+The models of the benchmarks app are used as test fixtures.
+"""
+
+import os
+import sys
+
+import django
+from django.conf import settings
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+]
+
+if django.VERSION >= (1, 9):
+    MIGRATION_MODULES = {'django_baseline': None}
+else:
+    # django_baseline ships South migrations, which Django >= 1.7 can not
+    # load. A missing module marks the app as unmigrated.
+    MIGRATION_MODULES = {'django_baseline': 'django_baseline.no_migrations'}
+
+
+def configure():
+    templates = [os.path.join(BASE_DIR, 'benchmarks', 'templates')]
+    options = dict(
+        SECRET_KEY='tests',
+        DATABASES={
+            'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': ':memory:',
+            }
+        },
+        INSTALLED_APPS=[
+            'django.contrib.auth',
+            'django.contrib.contenttypes',
+            'django.contrib.sessions',
+            'django.contrib.messages',
+            'django.contrib.staticfiles',
+            'crispy_forms',
+            'django_baseline',
+            'benchmarks',
+        ],
+        MIGRATION_MODULES=MIGRATION_MODULES,
+        ROOT_URLCONF='django_baseline.tests',
+        TEMPLATES=[{
+            'BACKEND': 'django.template.backends.django.DjangoTemplates',
+            'DIRS': templates,
+            'APP_DIRS': True,
+            'OPTIONS': {
+                'context_processors': [
+                    'django.contrib.auth.context_processors.auth',
+                    'django.contrib.messages.context_processors.messages',
+                ],
+            },
+        }],
+        STATIC_URL='/static/',
+        CRISPY_TEMPLATE_PACK='bootstrap',
+        MEDIA_URL='/media/',
+        PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+        BASELINE_QUERY_INSTRUMENTATION=False,
+    )
+    if django.VERSION < (1, 8):
+        options['TEMPLATE_DIRS'] = templates
+    if django.VERSION >= (1, 10):
+        options['MIDDLEWARE'] = MIDDLEWARE
+    else:
+        options['MIDDLEWARE_CLASSES'] = MIDDLEWARE
+    settings.configure(**options)
+
+
+def main(labels):
+    configure()
+    if hasattr(django, 'setup'):
+        django.setup()
+
+    from django.test.utils import get_runner
+    runner = get_runner(settings)(verbosity=1, interactive=False)
+    failures = runner.run_tests(labels or ['django_baseline'])
+    sys.exit(bool(failures))
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, BASE_DIR)
+    main(sys.argv[1:])
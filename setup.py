@@ -9,10 +9,11 @@ os.chdir(os.path.normpath(os.path.join(os.path.abspath(__file__), os.pardir)))
 setup(
     name = 'django-baseline',
     version = '0.2.2',
-    packages = find_packages(),
+    packages = find_packages(exclude=['benchmarks', 'benchmarks.*']),
     include_package_data = True,
     install_requires = [
-        'Django >= 1.6',
+        # Tested with 1.6 to 1.11, see runtests.py.
+        'Django >= 1.6, < 2.0',
         # Form helper.
         'django-crispy-forms >= 1.4',
         # Needed for address field.